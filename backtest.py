@@ -0,0 +1,276 @@
+import os
+import time
+import json
+import argparse
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from kline_store import KlineStore, OPEN, HIGH, LOW, CLOSE, VOLUME
+from batch_indicators import compute_indicators
+from signal_rules import compile_rules, rules_from_config, CompiledRules, SIGNAL_BUY, SIGNAL_SELL
+
+logger = logging.getLogger(__name__)
+
+# 影响指标计算的参数，其余参数（阈值）作为规则参数覆盖配置文件中的signal_rules.params
+INDICATOR_PARAMS = ('rsi_period', 'ma_short', 'ma_long', 'volume_ma_period')
+SIGNAL_PARAMS = ('min_strength', 'rsi_oversold', 'rsi_overbought', 'volume_multiplier')
+
+DEFAULT_PARAMS = {
+    'rsi_period': 14, 'ma_short': 9, 'ma_long': 21, 'volume_ma_period': 20,
+    'min_strength': 4, 'rsi_oversold': 30, 'rsi_overbought': 70, 'volume_multiplier': 1.5,
+}
+
+DEFAULT_GRID = {
+    'rsi_period': [10, 14, 21],
+    'ma_short': [5, 9, 12],
+    'ma_long': [21, 30, 50],
+    'min_strength': [3, 4, 5, 6],
+    'rsi_oversold': [25, 30],
+    'rsi_overbought': [70, 75],
+    'volume_multiplier': [1.2, 1.5, 2.0],
+}
+
+
+def simulate_trades(signal: np.ndarray, open_: np.ndarray, close: np.ndarray,
+                    fee: float = 0.001) -> Dict:
+    """按should_notify的语义模拟交易：未持仓时BUY建仓，持仓时SELL平仓
+
+    信号出现在K线收盘时，成交价取下一根K线的开盘价；结束时仍持仓的按最后收盘价计算。
+    """
+    trades: List[Tuple[int, int]] = []
+    holding_since = None
+    events = np.flatnonzero(signal != 0)
+    last = len(close) - 1
+    for t in events:
+        if t >= last:
+            break
+        if holding_since is None and signal[t] == SIGNAL_BUY:
+            holding_since = t + 1
+        elif holding_since is not None and signal[t] == SIGNAL_SELL:
+            trades.append((holding_since, t + 1))
+            holding_since = None
+
+    open_trade = holding_since is not None
+    if open_trade:
+        trades.append((holding_since, last))
+
+    # 逐K线的持仓收益，用于计算权益曲线和最大回撤
+    bar_return = np.zeros(len(close))
+    trade_returns = np.empty(len(trades))
+    for i, (entry, exit_) in enumerate(trades):
+        is_open = open_trade and i == len(trades) - 1
+        exit_price = close[exit_] if is_open else open_[exit_]
+        trade_returns[i] = exit_price / open_[entry] * (1 - fee) ** 2 - 1
+
+        bar_return[entry] += close[entry] / open_[entry] - 1 - fee
+        if is_open:
+            bar_return[entry + 1:exit_ + 1] += close[entry + 1:exit_ + 1] / close[entry:exit_] - 1
+        else:
+            bar_return[entry + 1:exit_] += close[entry + 1:exit_] / close[entry:exit_ - 1] - 1
+            bar_return[exit_] += open_[exit_] / close[exit_ - 1] - 1 - fee
+
+    equity = np.cumprod(1 + bar_return)
+    peak = np.maximum.accumulate(equity) if len(equity) else equity
+    drawdown = float(np.max(1 - equity / peak)) if len(equity) else 0.0
+
+    closed = trade_returns[:-1] if open_trade else trade_returns
+    return {
+        'trades': len(closed),
+        'wins': int(np.sum(closed > 0)),
+        'total_return': float(equity[-1] - 1) if len(equity) else 0.0,
+        'avg_trade_return': float(np.mean(closed)) if len(closed) else 0.0,
+        'max_drawdown': drawdown,
+    }
+
+
+def backtest_rows(rows: np.ndarray, params: Dict, fee: float = 0.001, rules: List[Dict] = None,
+                  rule_params: Dict = None) -> Dict:
+    """对单个交易对的K线（KlineStore行格式）运行完整的指标+信号+交易模拟
+
+    rules/rule_params为配置文件中的规则（见rules_from_config），省略时使用默认规则；params中的阈值覆盖rule_params。
+    """
+    params = {**DEFAULT_PARAMS, **params}
+    columns = _indicator_columns(rows, {name: params[name] for name in INDICATOR_PARAMS})
+    compiled = compile_rules(rules, {**(rule_params or {}), **_signal_params(params)})
+    result = compiled.evaluate(columns)
+    return simulate_trades(result['signal'], rows[:, OPEN], rows[:, CLOSE], fee)
+
+
+def _signal_params(params: Dict) -> Dict:
+    return {name: value for name, value in params.items() if name not in INDICATOR_PARAMS}
+
+
+def _indicator_columns(rows: np.ndarray, indicator_params: Dict) -> Dict[str, np.ndarray]:
+    close = np.ascontiguousarray(rows[:, CLOSE])[None, :]
+    high = np.ascontiguousarray(rows[:, HIGH])[None, :]
+    low = np.ascontiguousarray(rows[:, LOW])[None, :]
+    volume = np.ascontiguousarray(rows[:, VOLUME])[None, :]
+    columns = compute_indicators(close, high, low, volume, **indicator_params)
+    columns['close'] = close
+    columns['volume'] = volume
+    return {name: values[0] for name, values in columns.items()}
+
+
+# ---- 进程池：每个子进程只读地内存映射K线文件，多个进程共享同一份页缓存 ----
+
+_worker_data: Dict[str, np.ndarray] = {}
+_worker_rules: Tuple[Optional[List[Dict]], Dict] = (None, {})
+_worker_compiled: Dict[Tuple, CompiledRules] = {}
+
+
+def _init_worker(store_root: str, interval: str, symbols: List[str], start_ms: float,
+                 rules: Optional[List[Dict]] = None, rule_params: Dict = None):
+    global _worker_data, _worker_rules, _worker_compiled
+    store = KlineStore(store_root)
+    _worker_data = {}
+    _worker_rules = (rules, rule_params or {})
+    _worker_compiled = {}
+    for symbol in symbols:
+        rows = store.load(symbol, interval)
+        if start_ms and len(rows):
+            rows = rows[np.searchsorted(rows[:, 0], start_ms):]
+        _worker_data[symbol] = rows
+
+
+def _run_task(task: Tuple[str, Dict, List[Dict], float]) -> List[Tuple[int, str, Dict]]:
+    """一个任务=一个交易对×一组指标参数，复用同一份指标结果评估所有信号参数组合"""
+    symbol, indicator_params, signal_param_sets, fee = task
+    rows = _worker_data[symbol]
+    if len(rows) < 50:
+        return []
+
+    columns = _indicator_columns(rows, indicator_params)
+    results = []
+    for index, signal_params in signal_param_sets:
+        signal = _compiled_rules(signal_params).evaluate(columns)['signal']
+        results.append((index, symbol, simulate_trades(signal, rows[:, OPEN], rows[:, CLOSE], fee)))
+    return results
+
+
+def _compiled_rules(signal_params: Dict) -> CompiledRules:
+    """子进程内按阈值组合缓存编译结果，同一组阈值在各交易对和指标参数之间复用"""
+    key = tuple(sorted(signal_params.items()))
+    compiled = _worker_compiled.get(key)
+    if compiled is None:
+        rules, rule_params = _worker_rules
+        compiled = _worker_compiled[key] = compile_rules(rules, {**rule_params, **signal_params})
+    return compiled
+
+
+def expand_grid(grid: Dict[str, List], base: Dict = None) -> List[Dict]:
+    """展开参数网格；未扫描的参数取base（配置文件中的阈值），再缺省时取DEFAULT_PARAMS"""
+    names = list(grid)
+    combos = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = {**DEFAULT_PARAMS, **(base or {}), **dict(zip(names, values))}
+        if params['ma_short'] >= params['ma_long']:
+            continue
+        combos.append(params)
+    return combos
+
+
+def run_parameter_sweep(symbols: List[str], interval: str = '1h', grid: Dict[str, List] = None,
+                        store_root: str = 'kline_data', processes: int = None,
+                        fee: float = 0.001, start_ms: float = 0, rules: List[Dict] = None,
+                        rule_params: Dict = None) -> List[Dict]:
+    """在进程池中并行评估参数网格，返回按平均收益排序的结果
+
+    rules/rule_params为配置文件中的规则和阈值（见rules_from_config），网格中的阈值覆盖rule_params；
+    省略时使用默认规则。
+    """
+    rule_params = rule_params or {}
+    # 报告中列出实际生效的阈值：未扫描的取配置文件中的值
+    combos = expand_grid(grid or DEFAULT_GRID, {name: rule_params[name] for name in SIGNAL_PARAMS
+                                                if name in rule_params})
+
+    # 按指标参数分组，同一组内只需计算一次指标
+    groups: Dict[Tuple, List] = {}
+    for index, params in enumerate(combos):
+        key = tuple(params[name] for name in INDICATOR_PARAMS)
+        groups.setdefault(key, []).append(
+            (index, _signal_params(params)))
+
+    tasks = [(symbol, dict(zip(INDICATOR_PARAMS, key)), signal_sets, fee)
+             for key, signal_sets in groups.items() for symbol in symbols]
+
+    logger.info(f"回测 {len(combos)} 组参数 × {len(symbols)} 个交易对，共 {len(tasks)} 个任务")
+    started = time.time()
+
+    totals = {index: {'trades': 0, 'wins': 0, 'returns': [], 'max_drawdown': 0.0}
+              for index in range(len(combos))}
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count(), initializer=_init_worker,
+                             initargs=(store_root, interval, symbols, start_ms, rules, rule_params)) as executor:
+        for results in executor.map(_run_task, tasks, chunksize=max(1, len(tasks) // 64)):
+            for index, symbol, stats in results:
+                total = totals[index]
+                total['trades'] += stats['trades']
+                total['wins'] += stats['wins']
+                total['returns'].append(stats['total_return'])
+                total['max_drawdown'] = max(total['max_drawdown'], stats['max_drawdown'])
+
+    report = []
+    for index, params in enumerate(combos):
+        total = totals[index]
+        report.append({
+            'params': params,
+            'trades': total['trades'],
+            'hit_rate': total['wins'] / total['trades'] if total['trades'] else 0.0,
+            # 等权持有各交易对的平均收益
+            'avg_return': float(np.mean(total['returns'])) if total['returns'] else 0.0,
+            'max_drawdown': total['max_drawdown'],
+        })
+    report.sort(key=lambda item: item['avg_return'], reverse=True)
+
+    logger.info(f"回测完成，耗时 {time.time() - started:.1f} 秒")
+    return report
+
+
+def format_report(report: List[Dict], top: int = 10) -> str:
+    lines = []
+    for item in report[:top]:
+        params = ", ".join(f"{name}={value}" for name, value in item['params'].items())
+        lines.append(f"收益 {item['avg_return']:+.2%} | 胜率 {item['hit_rate']:.1%} | "
+                     f"交易 {item['trades']} 笔 | 最大回撤 {item['max_drawdown']:.1%} | {params}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用本地K线回测信号参数")
+    parser.add_argument('--config', default='trading_config.json')
+    parser.add_argument('--symbols', nargs='*', help="默认使用配置文件中的全部交易对")
+    parser.add_argument('--interval', default='1h')
+    parser.add_argument('--data-dir', default='kline_data')
+    parser.add_argument('--grid', help="参数网格JSON文件，格式如 {\"rsi_period\": [10, 14]}")
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--fee', type=float, default=0.001)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    symbols = args.symbols or sorted(set(config.get('holding_list', []) + config.get('watch_list', [])))
+
+    # 与检测程序使用同一套规则；配置有误时直接报错，避免回测与实际检测的规则不一致
+    rules, rule_params = rules_from_config(config)
+    try:
+        compile_rules(rules, rule_params)
+    except ValueError as e:
+        parser.error(f"信号规则配置有误: {e}")
+
+    grid = None
+    if args.grid:
+        with open(args.grid, 'r', encoding='utf-8') as f:
+            grid = json.load(f)
+
+    report = run_parameter_sweep(symbols, args.interval, grid, args.data_dir,
+                                 args.processes, args.fee, rules=rules, rule_params=rule_params)
+    print(format_report(report, args.top))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
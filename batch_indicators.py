@@ -0,0 +1,249 @@
+import time
+import logging
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from live_state import INDICATOR_COLUMNS, PRICE_COLUMNS
+from kline_store import OPEN_TIME, OPEN, CLOSE_TIME
+
+logger = logging.getLogger(__name__)
+
+
+def _rolling(x: np.ndarray, window: int, reducer) -> np.ndarray:
+    """沿时间轴(axis=1)的定长窗口聚合，窗口内有NaN或数据不足时为NaN"""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        with np.errstate(invalid='ignore'):
+            out[:, window - 1:] = reducer(sliding_window_view(x, window, axis=1), axis=-1)
+    return out
+
+
+def _window_sums(x: np.ndarray, window: int):
+    """用累加和求窗口和，同时统计窗口内NaN的个数"""
+    nan = np.isnan(x)
+    filled = np.where(nan, 0.0, x)
+    zero = np.zeros((x.shape[0], 1))
+    total = np.concatenate([zero, np.cumsum(filled, axis=1)], axis=1)
+    total_sq = np.concatenate([zero, np.cumsum(filled * filled, axis=1)], axis=1)
+    nans = np.concatenate([zero, np.cumsum(nan, axis=1)], axis=1)
+    return (total[:, window:] - total[:, :-window],
+            total_sq[:, window:] - total_sq[:, :-window],
+            nans[:, window:] - nans[:, :-window])
+
+
+def _centered(x: np.ndarray) -> (np.ndarray, np.ndarray):
+    # 减去每行均值再累加，降低平方和相减时的精度损失
+    with np.errstate(invalid='ignore'):
+        center = np.nanmean(x, axis=1, keepdims=True) if x.size else np.zeros((x.shape[0], 1))
+    center = np.where(np.isnan(center), 0.0, center)
+    return x - center, center
+
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        shifted, center = _centered(x)
+        total, _, nans = _window_sums(shifted, window)
+        out[:, window - 1:] = np.where(nans > 0, np.nan, total / window + center)
+    return out
+
+
+def rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    """与ta的布林带一致，使用总体标准差(ddof=0)"""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        shifted, _ = _centered(x)
+        total, total_sq, nans = _window_sums(shifted, window)
+        mean = total / window
+        variance = np.maximum(total_sq / window - mean * mean, 0.0)
+        out[:, window - 1:] = np.where(nans > 0, np.nan, np.sqrt(variance))
+    return out
+
+
+def rolling_max(x: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(x, window, np.max)
+
+
+def rolling_min(x: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(x, window, np.min)
+
+
+def ewm_mean(x: np.ndarray, alpha: float, min_periods: int) -> np.ndarray:
+    """adjust=False的指数移动平均，每行以第一个非NaN值为初值；对全部交易对同时递推"""
+    if x.shape[0] < 16 or x.shape[1] > 256:
+        # 交易对少、K线长（如回测）时逐列递推的Python开销太大，改用pandas的编译实现
+        return pd.DataFrame(x.T).ewm(alpha=alpha, min_periods=min_periods,
+                                     adjust=False).mean().to_numpy().T
+
+    out = np.full(x.shape, np.nan)
+    state = np.full(x.shape[0], np.nan)
+    count = np.zeros(x.shape[0], dtype=np.int64)
+    for t in range(x.shape[1]):
+        column = x[:, t]
+        valid = ~np.isnan(column)
+        state = np.where(np.isnan(state), column,
+                         np.where(valid, state + alpha * (column - state), state))
+        count += valid
+        out[:, t] = np.where(count >= min_periods, state, np.nan)
+    return out
+
+
+def compute_indicators(close: np.ndarray, high: np.ndarray, low: np.ndarray,
+                       volume: np.ndarray, rsi_period: int = 14, ma_short: int = 9,
+                       ma_long: int = 21, volume_ma_period: int = 20) -> Dict[str, np.ndarray]:
+    """一次性计算所有交易对的技术指标，输入输出均为(交易对数, K线数)的二维数组"""
+    padding = np.isnan(close)
+
+    # RSI（与ta一致：第一根K线的涨跌幅按0处理）
+    diff = np.empty_like(close)
+    diff[:, 0] = np.nan
+    diff[:, 1:] = close[:, 1:] - close[:, :-1]
+    up = np.where(diff > 0, diff, 0.0)
+    down = np.where(diff < 0, -diff, 0.0)
+    up[padding] = np.nan
+    down[padding] = np.nan
+    ema_up = ewm_mean(up, 1.0 / rsi_period, rsi_period)
+    ema_down = ewm_mean(down, 1.0 / rsi_period, rsi_period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(ema_down == 0, 100.0, 100.0 - 100.0 / (1.0 + ema_up / ema_down))
+
+    # MACD
+    macd = ewm_mean(close, 2.0 / 13, 12) - ewm_mean(close, 2.0 / 27, 26)
+    macd_signal = ewm_mean(macd, 2.0 / 10, 9)
+
+    # 布林带
+    bb_middle = rolling_mean(close, 20)
+    bb_std = rolling_std(close, 20)
+
+    # 随机指标
+    lowest = rolling_min(low, 14)
+    highest = rolling_max(high, 14)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stoch_k = 100.0 * (close - lowest) / (highest - lowest)
+    stoch_k[~np.isfinite(stoch_k)] = np.nan
+
+    return {
+        'rsi': rsi,
+        'ma_short': rolling_mean(close, ma_short),
+        'ma_long': rolling_mean(close, ma_long),
+        'macd': macd,
+        'macd_signal': macd_signal,
+        'macd_histogram': macd - macd_signal,
+        'bb_upper': bb_middle + 2 * bb_std,
+        'bb_lower': bb_middle - 2 * bb_std,
+        'bb_middle': bb_middle,
+        'volume_ma': rolling_mean(volume, volume_ma_period),
+        'stoch_k': stoch_k,
+        'stoch_d': rolling_mean(stoch_k, 3),
+    }
+
+
+class BatchIndicatorResult:
+    """批量指标结果 - 按交易对取出一维视图，供detect_trend_reversal直接使用"""
+
+    def __init__(self, symbols: List[str], open_times: np.ndarray,
+                 columns: Dict[str, np.ndarray], start: np.ndarray, end: np.ndarray):
+        self.symbols = symbols
+        self.open_times = open_times
+        self.columns = columns
+        self._row = {symbol: i for i, symbol in enumerate(symbols)}
+        # 每个交易对有效K线的范围[start, end)，范围之外是对齐时补的NaN
+        self._start = start
+        self._end = end
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._row
+
+    def for_symbol(self, symbol: str) -> Dict[str, np.ndarray]:
+        """返回该交易对各列的一维视图（不复制数据）"""
+        row = self._row[symbol]
+        start, end = self._start[row], self._end[row]
+        return {name: values[row, start:end] for name, values in self.columns.items()}
+
+
+def align_rows(rows: Dict[str, np.ndarray], interval_ms: int):
+    """按开盘时间把各交易对的K线（KlineStore的行格式）对齐到同一时间轴，缺失部分为NaN"""
+    symbols = [symbol for symbol, data in rows.items() if len(data)]
+    empty = np.empty(0, dtype=np.int64)
+    if not symbols:
+        return symbols, empty, {}, empty, empty
+
+    latest = max(rows[symbol][-1, OPEN_TIME] for symbol in symbols)
+    length = max(len(rows[symbol]) for symbol in symbols)
+    open_times = (latest - (length - 1 - np.arange(length)) * interval_ms).astype(np.int64)
+
+    matrix = np.full((len(PRICE_COLUMNS), len(symbols), length), np.nan)
+    start = np.full(len(symbols), length, dtype=np.int64)
+    end = np.full(len(symbols), length, dtype=np.int64)
+    for row, symbol in enumerate(symbols):
+        data = rows[symbol]
+        positions = (length - 1 - (latest - data[:, OPEN_TIME]) // interval_ms).astype(np.int64)
+        keep = positions >= 0
+        positions = positions[keep]
+        if not len(positions):
+            continue
+        matrix[:, row, positions] = data[keep, OPEN:CLOSE_TIME].T
+        start[row] = positions[0]
+        end[row] = positions[-1] + 1
+    arrays = {name: matrix[i] for i, name in enumerate(PRICE_COLUMNS)}
+    return symbols, open_times, arrays, start, end
+
+
+def frame_to_rows(df: pd.DataFrame) -> np.ndarray:
+    """把get_klines返回的DataFrame转换为KlineStore的行格式"""
+    rows = np.empty((len(df), 7))
+    rows[:, OPEN_TIME] = df.index.values.astype('datetime64[ms]').astype(np.int64)
+    rows[:, OPEN:CLOSE_TIME] = df[PRICE_COLUMNS].to_numpy(dtype=np.float64)
+    rows[:, CLOSE_TIME] = np.nan
+    return rows
+
+
+def compute_batch(rows: Dict[str, np.ndarray], interval_ms: int,
+                  **params) -> BatchIndicatorResult:
+    """对齐全部交易对后一次性计算指标"""
+    symbols, open_times, arrays, start, end = align_rows(rows, interval_ms)
+    if not symbols:
+        return BatchIndicatorResult([], open_times, {}, start, end)
+
+    columns = dict(arrays)
+    columns.update(compute_indicators(arrays['close'], arrays['high'], arrays['low'],
+                                      arrays['volume'], **params))
+    return BatchIndicatorResult(symbols, open_times, columns, start, end)
+
+
+# 与ta库逐个计算的结果比对，并测量500个交易对的计算耗时
+if __name__ == "__main__":
+    from binance_trend_detector import BinanceTrendDetector
+
+    rng = np.random.default_rng(3)
+    hour = 3_600_000
+    frames = {}
+    for i in range(500):
+        bars = 100 - (i % 7) * 5  # 不同交易对的K线数量不同
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+        first = 1_700_000_000_000 // hour * hour + (100 - bars) * hour
+        index = pd.to_datetime(first + np.arange(bars) * hour, unit='ms')
+        frames[f"SYM{i}USDT"] = pd.DataFrame({
+            'open': close, 'high': close * 1.005, 'low': close * 0.995, 'close': close,
+            'volume': rng.uniform(100, 1000, bars)}, index=index)
+
+    rows = {symbol: frame_to_rows(df) for symbol, df in frames.items()}
+    started = time.perf_counter()
+    result = compute_batch(rows, hour)
+    print(f"500个交易对批量计算耗时: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    detector = BinanceTrendDetector()
+    worst = 0.0
+    for symbol in list(frames)[:20]:
+        expected = detector.calculate_technical_indicators(frames[symbol].copy())
+        actual = result.for_symbol(symbol)
+        for column in INDICATOR_COLUMNS:
+            a, b = actual[column], expected[column].to_numpy()
+            assert np.array_equal(np.isnan(a), np.isnan(b)), column
+            mask = ~np.isnan(b)
+            if mask.any():
+                worst = max(worst, float(np.max(np.abs(a[mask] - b[mask]))))
+    print(f"与ta结果的最大误差: {worst:.3e}")
@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import tracemalloc
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from binance_trend_detector import BinanceTrendDetector  # noqa: E402
+from batch_indicators import compute_batch  # noqa: E402
+from notification_dispatcher import LocalSmtpServer  # noqa: E402
+from rate_limiter import RequestWeightLimiter  # noqa: E402
+from signal_state import SignalStateStore  # noqa: E402
+from streaming_indicators import StreamingIndicators  # noqa: E402
+from wechat_notifier import WeChatNotifier  # noqa: E402
+from synthetic_data import HOUR_MS, symbol_names, generate_rows, to_api_klines  # noqa: E402
+from replay_server import ReplayServer  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [10, 100, 1000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+BARS = 100  # 与get_klines默认的limit一致
+
+# 耗时或内存的绝对变化小于这些值时不算退化，避免小数据量下的计时噪声
+MIN_SECONDS_DELTA = 0.002
+MIN_MEMORY_DELTA_MB = 1.0
+
+
+class BenchContext:
+    """一个规模下的全部基准数据：替身服务、检测器和预先生成的输入"""
+
+    def __init__(self, size: int, seed: int = 42):
+        self.size = size
+        self.symbols = symbol_names(size)
+        end_ms = int(time.time() * 1000)
+        self.server = ReplayServer(self.symbols, bars=1000, seed=seed, end_ms=end_ms).start()
+        self.smtp = LocalSmtpServer().start()
+
+        rows = {symbol: generate_rows(i, BARS, HOUR_MS, end_ms, seed) for i, symbol in enumerate(self.symbols)}
+        self.rows = rows
+        self.payloads = {symbol: json.dumps(to_api_klines(data), separators=(',', ':')).encode()
+                         for symbol, data in rows.items()}
+        self.frames = {symbol: pd.DataFrame(data[:, 1:6], columns=['open', 'high', 'low', 'close', 'volume'],
+                                            index=pd.to_datetime(data[:, 0], unit='ms'))
+                       for symbol, data in rows.items()}
+        self.detector = self.make_detector()
+        self.indicator_frames = {symbol: self.detector.calculate_technical_indicators(df.copy())
+                                 for symbol, df in self.frames.items()}
+        self.engines: Dict[str, StreamingIndicators] = {}
+
+    def make_detector(self) -> BinanceTrendDetector:
+        detector = BinanceTrendDetector()
+        detector.base_url = self.server.url
+        detector.kline_store = None
+        detector.holding_list = self.symbols[::2]
+        detector.watch_list = self.symbols
+        detector.symbols = list(self.symbols)
+        # 替身服务不限频，基准测试中不让权重预算成为瓶颈
+        detector.rate_limiter = RequestWeightLimiter(weight_limit=10 ** 9)
+        detector.signal_state = SignalStateStore(path=None, only_on_transition=False, cooldown_seconds=0)
+        detector.notification_config.update({
+            'email': 'bench@example.com', 'password': '', 'to_email': 'bench@example.com',
+            'smtp_server': '127.0.0.1', 'smtp_port': self.smtp.port, 'use_tls': False,
+        })
+        detector.dispatcher.dead_letter_file = os.devnull
+        detector.dispatcher.wechat_notifier = WeChatNotifier({
+            'corp_id': 'bench', 'corp_secret': 'bench', 'agent_id': 1, 'api_base': self.server.url,
+            'token_cache_file': None,
+        }, detector.transport)
+        return detector
+
+    def close(self):
+        self.detector.dispatcher.stop()
+        self.server.close()
+        self.smtp.close()
+
+
+# ---- 各阶段 ----
+
+def stage_fetch(ctx: BenchContext):
+    """并发请求K线（HTTP往返 + 解析），与run_detection的抓取方式相同"""
+    with ThreadPoolExecutor(max_workers=ctx.detector.max_workers) as executor:
+        list(executor.map(ctx.detector.get_klines, ctx.symbols))
+
+
+def stage_parse(ctx: BenchContext):
+    """只测get_klines中K线解析和DataFrame构建的部分"""
+    detector = ctx.detector
+    original = detector.request_api
+    detector.request_api = lambda path, params=None, weight=1, raw=False: ctx.payloads[params['symbol']]
+    try:
+        for symbol in ctx.symbols:
+            detector.get_klines(symbol)
+    finally:
+        detector.request_api = original
+
+
+def stage_indicators_ta(ctx: BenchContext):
+    for df in ctx.frames.values():
+        ctx.detector.calculate_technical_indicators(df.copy())
+
+
+def stage_indicators_streaming(ctx: BenchContext):
+    """流式指标的稳态开销：每个交易对更新一根未收盘K线并取出检测用的最近30根指标"""
+    if not ctx.engines:
+        for symbol, df in ctx.frames.items():
+            engine = StreamingIndicators()
+            engine.feed_frame(df)
+            ctx.engines[symbol] = engine
+    for symbol, engine in ctx.engines.items():
+        last = ctx.rows[symbol][-1]
+        engine.update(int(last[0]), last[1], last[2], last[3], last[4] * 1.001, last[5], closed=False)
+        ctx.detector.detect_trend_reversal(engine.state, symbol)
+
+
+def stage_indicators_batch(ctx: BenchContext):
+    compute_batch(ctx.rows, HOUR_MS)
+
+
+def stage_detect(ctx: BenchContext):
+    for symbol, df in ctx.indicator_frames.items():
+        ctx.detector.detect_trend_reversal(df, symbol)
+
+
+def stage_notify(ctx: BenchContext):
+    """每个交易对一条信号通知：入队并等待后台队列经企业微信替身服务全部发出"""
+    signal_data = {'signal': 'BUY', 'price': 1.0, 'strength': 6, 'reasons': ['RSI从超卖区反弹', 'MACD金叉'],
+                   'rsi': 28.5, 'volume_ratio': 1.8}
+    for symbol in ctx.symbols:
+        ctx.detector.send_notification(symbol, signal_data)
+    ctx.detector.dispatcher.stop()
+
+
+def stage_cycle(ctx: BenchContext):
+    """端到端的一轮run_detection（抓取、流式指标、信号判断、通知入队）"""
+    ctx.detector.run_detection()
+
+
+STAGES: Dict[str, Callable[[BenchContext], None]] = {
+    'fetch': stage_fetch,
+    'parse': stage_parse,
+    'indicators_ta': stage_indicators_ta,
+    'indicators_streaming': stage_indicators_streaming,
+    'indicators_batch': stage_indicators_batch,
+    'detect': stage_detect,
+    'notify': stage_notify,
+    'cycle': stage_cycle,
+}
+
+
+def measure(fn: Callable[[BenchContext], None], ctx: BenchContext, repeat: int) -> Dict:
+    """预热一次后计时repeat次取中位数，再单独运行一次用tracemalloc统计峰值内存"""
+    fn(ctx)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(ctx)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        fn(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': statistics.median(timings), 'min_seconds': min(timings),
+            'peak_mb': peak / 1024 / 1024}
+
+
+def run_benchmarks(sizes: List[int], stages: List[str], repeat: int = 3, seed: int = 42) -> Dict[str, Dict]:
+    results = {}
+    for size in sizes:
+        ctx = BenchContext(size, seed)
+        try:
+            for name in stages:
+                result = measure(STAGES[name], ctx, repeat)
+                results[f"{name}/{size}"] = result
+                print(f"{name:22s} {size:5d} 个交易对  {result['seconds'] * 1000:10.1f} ms  "
+                      f"峰值内存 {result['peak_mb']:8.1f} MB", flush=True)
+        finally:
+            ctx.close()
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float,
+            memory_threshold: float) -> List[str]:
+    """与基线比较，返回退化项的说明"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        seconds, base_seconds = result['seconds'], base['seconds']
+        if seconds > base_seconds * (1 + threshold) and seconds - base_seconds > MIN_SECONDS_DELTA:
+            regressions.append(f"{key}: 耗时 {base_seconds * 1000:.1f}ms -> {seconds * 1000:.1f}ms "
+                               f"(+{seconds / base_seconds - 1:.0%})")
+        memory, base_memory = result['peak_mb'], base['peak_mb']
+        if memory > base_memory * (1 + memory_threshold) and memory - base_memory > MIN_MEMORY_DELTA_MB:
+            regressions.append(f"{key}: 峰值内存 {base_memory:.1f}MB -> {memory:.1f}MB "
+                               f"(+{memory / base_memory - 1:.0%})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="检测流程各阶段的基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果写为新的基线")
+    parser.add_argument('--threshold', type=float, default=0.3, help="耗时允许的相对增幅")
+    parser.add_argument('--memory-threshold', type=float, default=0.2, help="峰值内存允许的相对增幅")
+    parser.add_argument('--output', help="把本次结果写入JSON文件")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    results = run_benchmarks(args.sizes, args.stages, args.repeat, args.seed)
+    report = {
+        'meta': {'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+                 'machine': platform.machine(), 'cpus': os.cpu_count(), 'numpy': np.__version__,
+                 'pandas': pd.__version__, 'repeat': args.repeat, 'seed': args.seed},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"已保存基线: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"没有基线文件 {args.baseline}，使用 --save-baseline 生成")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+    if regressions:
+        print("性能退化:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("与基线相比没有超出阈值的退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kline_store import rows_from_api  # noqa: E402
+from kline_parser import parse_klines, parse_kline_columns, rows_to_frame, _loads  # noqa: E402
+from streaming_indicators import StreamingIndicators  # noqa: E402
+from synthetic_data import HOUR_MS, generate_rows, to_api_klines  # noqa: E402
+
+NUMERIC_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def make_payloads(symbols: int, bars: int, seed: int = 42) -> List[bytes]:
+    """与币安响应体格式相同的K线JSON（紧凑格式，价格为字符串）"""
+    return [json.dumps(to_api_klines(generate_rows(i, bars, HOUR_MS, seed=seed)),
+                       separators=(',', ':')).encode() for i in range(symbols)]
+
+
+# ---- 各解析路径 ----
+
+def original_path(payload: bytes) -> pd.DataFrame:
+    """最初的get_klines：12列字符串DataFrame，逐列pd.to_numeric后丢弃7列"""
+    df = pd.DataFrame(json.loads(payload), columns=[
+        'timestamp', 'open', 'high', 'low', 'close', 'volume',
+        'close_time', 'quote_asset_volume', 'number_of_trades',
+        'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+    ])
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df.set_index('timestamp', inplace=True)
+    return df[NUMERIC_COLUMNS]
+
+
+def list_path(payload: bytes) -> pd.DataFrame:
+    """上一版：标准库解码为字符串列表，rows_from_api逐行转换，再构建DataFrame"""
+    return rows_to_frame(rows_from_api(json.loads(payload)))
+
+
+def parser_frame_path(payload: bytes) -> pd.DataFrame:
+    """新解析路径，调用方仍需要DataFrame时（get_klines）"""
+    return rows_to_frame(parse_klines(payload))
+
+
+def parser_rows_path(payload: bytes) -> np.ndarray:
+    """新解析路径，只要数组时（fetch_klines、流式指标、批量指标）"""
+    return parse_klines(payload)
+
+
+def parser_float32_path(payload: bytes):
+    return parse_kline_columns(payload, np.float32)
+
+
+PATHS: Dict[str, Callable[[bytes], object]] = {
+    'original': original_path,
+    'list': list_path,
+    'parser_frame': parser_frame_path,
+    'parser_rows': parser_rows_path,
+    'parser_float32': parser_float32_path,
+}
+
+
+def check_parity(payloads: List[bytes]):
+    for payload in payloads:
+        expected = original_path(payload)
+        frame = parser_frame_path(payload)
+        if not (np.array_equal(expected.to_numpy(), frame.to_numpy()) and expected.index.equals(frame.index)):
+            raise AssertionError("新解析路径与原路径的结果不一致")
+        _, values = parser_float32_path(payload)
+        if not np.allclose(values, expected.to_numpy(), rtol=1e-6):
+            raise AssertionError("float32解析结果超出精度范围")
+
+
+def bench_path(fn: Callable[[bytes], object], payloads: List[bytes], repeat: int) -> Dict:
+    for payload in payloads:
+        fn(payload)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for payload in payloads:
+            fn(payload)
+        timings.append(time.perf_counter() - started)
+
+    # 保留全部结果，统计这一轮解析结果占用的峰值内存
+    tracemalloc.start()
+    try:
+        results = [fn(payload) for payload in payloads]
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del results
+    return {'seconds': min(timings), 'peak_mb': peak / 1024 / 1024}
+
+
+def bench_analyze(payloads: List[bytes], repeat: int) -> Dict[str, float]:
+    """一轮流式检测里每个交易对的“解析 + 指标更新”：经K线DataFrame（feed_frame返回指标DataFrame）与直接输入数组"""
+    def via_frame():
+        for engine, payload in zip(engines, payloads):
+            engine.feed_frame(list_path(payload))
+
+    def via_rows():
+        for engine, payload in zip(engines, payloads):
+            engine.feed_rows(parse_klines(payload))
+
+    results = {}
+    for name, fn in (('analyze_via_frame', via_frame), ('analyze_via_rows', via_rows)):
+        engines = [StreamingIndicators() for _ in payloads]
+        fn()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        results[name] = min(timings)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="K线解析路径的基准测试")
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--bars', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"解码器: {'orjson' if _loads is not json.loads else 'json（未安装orjson）'}，"
+          f"{args.symbols} 个交易对")
+    for bars in args.bars:
+        payloads = make_payloads(args.symbols, bars)
+        check_parity(payloads[:5])
+        print(f"\n每个交易对 {bars} 根K线:")
+        baseline = None
+        for name, fn in PATHS.items():
+            result = bench_path(fn, payloads, args.repeat)
+            baseline = baseline or result['seconds']
+            print(f"  {name:16s} {result['seconds'] * 1000:9.1f} ms  {baseline / result['seconds']:5.1f}x  "
+                  f"结果内存 {result['peak_mb']:7.2f} MB")
+        for name, seconds in bench_analyze(payloads, args.repeat).items():
+            print(f"  {name:16s} {seconds * 1000:9.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notification_dispatcher import LocalSmtpServer  # noqa: E402
+from synthetic_data import symbol_names  # noqa: E402
+from replay_server import ReplayServer  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, 'cli.py')
+
+# 单次检测不应加载的模块
+HEAVY_MODULES = ['pandas', 'ta', 'smtplib', 'email.mime.multipart', 'websocket', 'pstats']
+
+
+def run_python(args: List[str], cwd: str = ROOT) -> Dict:
+    """在新进程中运行一次，返回总耗时、导入耗时（-X importtime中顶层模块累计耗时之和）和加载过的模块"""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} 退出码 {result.returncode}:\n{result.stderr[-2000:]}")
+
+    import_us = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        if not name[1:].startswith(' '):  # 没有缩进的是顶层导入
+            import_us += int(cumulative)
+    return {'wall': wall, 'imports': import_us / 1e6, 'modules': modules}
+
+
+def best_of(args: List[str], repeat: int, cwd: str = ROOT) -> Dict:
+    runs = [run_python(args, cwd) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run['wall'])
+    best['imports'] = min(run['imports'] for run in runs)
+    return best
+
+
+def write_config(directory: str, symbols: List[str], smtp_port: int) -> str:
+    path = os.path.join(directory, 'trading_config.json')
+    config = {
+        'holding_list': symbols[::2],
+        'watch_list': symbols,
+        'data_dir': None,
+        'notification_settings': {'check_interval': 300},
+        'email_config': {'smtp_server': '127.0.0.1', 'smtp_port': smtp_port, 'use_tls': False,
+                         'from_email': 'bench@example.com', 'from_password': '',
+                         'to_email': 'bench@example.com'},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    return path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="启动耗时基准测试：导入开销与一次完整的单次检测")
+    parser.add_argument('--symbols', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    symbols = symbol_names(args.symbols)
+    server = ReplayServer(symbols, bars=200).start()
+    smtp = LocalSmtpServer().start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            config = write_config(workdir, symbols, smtp.port)
+            cases = {
+                'python（空进程）': (['-c', 'pass'], ROOT),
+                'pandas+ta+smtplib+email（原先的启动导入）':
+                    (['-c', 'import pandas, ta, smtplib, email.mime.multipart, email.mime.text'], ROOT),
+                'import binance_trend_detector': (['-c', 'import binance_trend_detector'], ROOT),
+                'cli.py --help': ([CLI, '--help'], ROOT),
+                f'cli.py once（{args.symbols}个交易对，本地替身服务）':
+                    ([CLI, '--config', config, '--base-url', server.url, 'once'], workdir),
+            }
+            print(f"Python {sys.version.split()[0]}，每项取 {args.repeat} 次中最快的一次")
+            for name, (command, cwd) in cases.items():
+                result = best_of(command, args.repeat, cwd)
+                loaded = [module for module in HEAVY_MODULES if module in result['modules']]
+                print(f"  {name:40s} 总耗时 {result['wall'] * 1000:7.0f} ms  导入 {result['imports'] * 1000:6.0f} ms"
+                      f"  {'加载了: ' + ', '.join(loaded) if loaded else ''}")
+    finally:
+        server.close()
+        smtp.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
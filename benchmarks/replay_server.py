@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kline_store import interval_to_ms, OPEN_TIME  # noqa: E402
+from synthetic_data import generate_rows, to_api_klines, generate_tickers  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 录制的接口：文件名 -> (方法, 地址)
+RECORDED_ENDPOINTS = {
+    'binance_klines': ('GET', "https://api.binance.com/api/v3/klines?symbol=BTCUSDT&interval=1h&limit=2"),
+    'binance_time': ('GET', "https://api.binance.com/api/v3/time"),
+    'binance_ticker_24hr': ('GET', "https://api.binance.com/api/v3/ticker/24hr?symbol=BTCUSDT"),
+}
+
+
+def load_fixture(name: str) -> Dict:
+    with open(os.path.join(FIXTURE_DIR, f"{name}.json"), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """本地替身服务 - 按录制的响应头/格式回放币安和企业微信接口，K线和行情数据由合成数据生成器提供"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, symbols: List[str], bars: int = 1000, interval: str = '1h', seed: int = 42,
+                 end_ms: int = None, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _ReplayHandler)
+        self.symbols = symbols
+        self.bars = bars
+        self.interval = interval
+        self.seed = seed
+        self.end_ms = end_ms or int(time.time() * 1000)
+        self.fixtures = {name: load_fixture(name) for name in
+                         ('binance_klines', 'binance_time', 'binance_ticker_24hr',
+                          'wechat_gettoken', 'wechat_message_send')}
+        self._check_fixture_shape()
+
+        self._rows: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.request_counts: Dict[str, int] = {}
+        self.messages: List[Dict] = []
+
+    def _check_fixture_shape(self):
+        # 合成的K线必须与录制的真实响应字段数一致
+        sample = self.fixtures['binance_klines']['body'][0]
+        synthetic = to_api_klines(generate_rows(0, 1, seed=self.seed))[0]
+        if len(sample) != len(synthetic):
+            raise ValueError(f"合成K线字段数({len(synthetic)})与录制数据({len(sample)})不一致")
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+    def rows(self, symbol: str) -> Optional[np.ndarray]:
+        with self._lock:
+            if symbol not in self._rows:
+                if symbol not in self.symbols:
+                    return None
+                self._rows[symbol] = generate_rows(self.symbols.index(symbol), self.bars,
+                                                   interval_to_ms(self.interval), self.end_ms, self.seed)
+            return self._rows[symbol]
+
+    def count(self, route: str):
+        with self._lock:
+            self.request_counts[route] = self.request_counts.get(route, 0) + 1
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，不关闭Nagle算法会与客户端的延迟确认叠加出约40ms的等待
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, fixture: Dict, body=None, status: int = None):
+        payload = json.dumps(fixture['body'] if body is None else body).encode()
+        self.send_response(status or fixture['status'])
+        for key, value in fixture['headers'].items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server: ReplayServer = self.server
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        server.count(parts.path)
+
+        if parts.path == '/api/v3/klines':
+            fixture = server.fixtures['binance_klines']
+            rows = server.rows(query.get('symbol', ''))
+            if rows is None:
+                return self._send(fixture, {'code': -1121, 'msg': 'Invalid symbol.'}, 400)
+            if query.get('interval', server.interval) != server.interval:
+                return self._send(fixture, {'code': -1120, 'msg': 'Invalid interval.'}, 400)
+            limit = min(int(query.get('limit', 500)), 1000)
+            if 'startTime' in query:
+                rows = rows[rows[:, OPEN_TIME] >= int(query['startTime'])]
+                if 'endTime' in query:
+                    rows = rows[rows[:, OPEN_TIME] <= int(query['endTime'])]
+                rows = rows[:limit]
+            else:
+                if 'endTime' in query:
+                    rows = rows[rows[:, OPEN_TIME] <= int(query['endTime'])]
+                rows = rows[-limit:]
+            return self._send(fixture, to_api_klines(rows))
+
+        if parts.path == '/api/v3/ticker/24hr':
+            return self._send(server.fixtures['binance_ticker_24hr'],
+                              generate_tickers(server.symbols, server.seed))
+
+        if parts.path == '/api/v3/exchangeInfo':
+            return self._send(server.fixtures['binance_time'], {'symbols': [
+                {'symbol': symbol, 'status': 'TRADING', 'quoteAsset': 'USDT'} for symbol in server.symbols]})
+
+        if parts.path == '/api/v3/time':
+            return self._send(server.fixtures['binance_time'], {'serverTime': int(time.time() * 1000)})
+
+        if parts.path == '/cgi-bin/gettoken':
+            return self._send(server.fixtures['wechat_gettoken'])
+
+        self.send_error(404)
+
+    def do_POST(self):
+        server: ReplayServer = self.server
+        parts = urlsplit(self.path)
+        server.count(parts.path)
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+
+        if parts.path == '/cgi-bin/message/send':
+            with server._lock:
+                server.messages.append(json.loads(body or b'{}'))
+            return self._send(server.fixtures['wechat_message_send'])
+
+        self.send_error(404)
+
+
+def record_fixtures(wechat_config: Dict = None):
+    """从真实接口录制响应（状态码、响应头、响应体），企业微信的令牌和消息ID会被脱敏"""
+    import requests
+
+    def save(name: str, method: str, url: str, response, redact: tuple = ()):
+        body = response.json()
+        if isinstance(body, list):
+            body = body[:2]
+        for key in redact:
+            if key in body:
+                body[key] = '<redacted>'
+        headers = {key: value for key, value in response.headers.items()
+                   if key.lower() in ('content-type', 'x-mbx-used-weight', 'x-mbx-used-weight-1m',
+                                      'error-code', 'error-msg')}
+        with open(os.path.join(FIXTURE_DIR, f"{name}.json"), 'w', encoding='utf-8') as f:
+            json.dump({'request': f"{method} {url.split('?')[0]}", 'status': response.status_code,
+                       'headers': headers, 'body': body}, f, ensure_ascii=False, indent=2)
+        logger.info(f"已录制 {name}")
+
+    for name, (method, url) in RECORDED_ENDPOINTS.items():
+        response = requests.request(method, url, timeout=10)
+        if name == 'binance_ticker_24hr':
+            # 与不带symbol参数时的列表格式保持一致
+            response._content = json.dumps([response.json()]).encode()
+        save(name, method, url, response)
+
+    if wechat_config and wechat_config.get('corp_id'):
+        base = "https://qyapi.weixin.qq.com/cgi-bin"
+        response = requests.get(f"{base}/gettoken", params={
+            'corpid': wechat_config['corp_id'], 'corpsecret': wechat_config['corp_secret']}, timeout=10)
+        save('wechat_gettoken', 'GET', f"{base}/gettoken", response, ('access_token',))
+        token = response.json().get('access_token')
+        response = requests.post(f"{base}/message/send?access_token={token}", json={
+            'touser': wechat_config.get('to_user', '@all'), 'msgtype': 'text',
+            'agentid': wechat_config.get('agent_id'), 'text': {'content': "基准测试录制"}}, timeout=10)
+        save('wechat_message_send', 'POST', f"{base}/message/send", response, ('msgid',))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="录制真实接口响应，或启动本地回放服务")
+    parser.add_argument('command', choices=['record', 'serve'])
+    parser.add_argument('--config', default='trading_config.json', help="录制企业微信接口时读取wechat_config")
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        wechat_config = None
+        if os.path.exists(args.config):
+            with open(args.config, 'r', encoding='utf-8') as f:
+                wechat_config = json.load(f).get('wechat_config')
+        record_fixtures(wechat_config)
+    else:
+        from synthetic_data import symbol_names
+        server = ReplayServer(symbol_names(args.symbols), port=args.port).start()
+        print(f"回放服务已启动: {server.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.close()
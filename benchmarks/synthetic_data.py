@@ -0,0 +1,62 @@
+import numpy as np
+from typing import Dict, List
+
+HOUR_MS = 3_600_000
+
+
+def symbol_names(count: int, quote: str = 'USDT') -> List[str]:
+    """生成count个交易对名称：SYM0000USDT, SYM0001USDT..."""
+    return [f"SYM{i:04d}{quote}" for i in range(count)]
+
+
+def generate_rows(index: int, bars: int, interval_ms: int = HOUR_MS, end_ms: int = 1_700_000_000_000,
+                  seed: int = 42) -> np.ndarray:
+    """可复现的合成K线（KlineStore行格式），价格为带趋势切换的几何布朗运动，保证能触发买卖信号"""
+    rng = np.random.default_rng([seed, index])
+    end_ms = end_ms - end_ms % interval_ms
+    open_time = end_ms - (bars - 1 - np.arange(bars)) * interval_ms
+
+    # 每隔40~120根K线切换一次趋势方向
+    drift = np.empty(bars)
+    position = 0
+    direction = rng.choice([-1.0, 1.0])
+    while position < bars:
+        length = int(rng.integers(40, 120))
+        drift[position:position + length] = direction * rng.uniform(0.0005, 0.003)
+        direction = -direction
+        position += length
+
+    returns = drift + rng.normal(0, 0.01, bars)
+    close = 10 ** rng.uniform(-2, 4) * np.exp(np.cumsum(returns))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 0.005, bars))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.lognormal(8, 0.6, bars) * (1 + 3 * (rng.random(bars) < 0.05))
+    return np.column_stack([open_time, open_, high, low, close, volume, open_time + interval_ms - 1])
+
+
+def to_api_klines(rows: np.ndarray) -> list:
+    """转换为/api/v3/klines的返回格式（12个字段，价格和成交量为字符串）"""
+    return [[int(r[0]), f"{r[1]:.8f}", f"{r[2]:.8f}", f"{r[3]:.8f}", f"{r[4]:.8f}", f"{r[5]:.8f}",
+             int(r[6]), f"{r[4] * r[5]:.8f}", 100, f"{r[5] / 2:.8f}", f"{r[4] * r[5] / 2:.8f}", "0"]
+            for r in rows]
+
+
+def generate_tickers(symbols: List[str], seed: int = 42) -> List[Dict]:
+    """/api/v3/ticker/24hr（不带symbol参数）格式的合成行情"""
+    rng = np.random.default_rng(seed)
+    tickers = []
+    for symbol in symbols:
+        price = 10 ** rng.uniform(-2, 4)
+        bid = price * (1 - rng.uniform(0, 0.002))
+        tickers.append({
+            'symbol': symbol,
+            'priceChangePercent': f"{rng.normal(0, 8):.3f}",
+            'lastPrice': f"{price:.8f}",
+            'bidPrice': f"{bid:.8f}",
+            'askPrice': f"{price:.8f}",
+            'quoteVolume': f"{10 ** rng.uniform(5, 9):.8f}",
+            'count': int(rng.integers(0, 500000)),
+        })
+    return tickers
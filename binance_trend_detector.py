@@ -1,15 +1,33 @@
-import requests
-import pandas as pd
 import numpy as np
 import time
 import json
+import threading
 from datetime import datetime, timedelta
-import ta
 import logging
-from typing import List, Dict, Tuple
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from typing import List, Dict, Tuple, Optional, Union, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rate_limiter import RequestWeightLimiter, KLINES_WEIGHT
+from http_transport import get_transport, configure_transport
+from kline_store import KlineStore, rows_from_api, interval_to_ms, OPEN_TIME, OPEN, CLOSE_TIME
+from kline_parser import parse_klines, rows_to_frame
+from streaming_indicators import StreamingIndicators
+from live_state import LiveState, LIVE_COLUMNS
+from kline_stream import KlineStreamClient, STREAM_BASE_URL, kline_to_row
+from config_watcher import ConfigWatcher, CONFIG_RELOADS, diff_symbols
+from query_api import SignalBoard, QueryServer
+from signal_rules import compile_rules, rules_from_config, trend_direction, confirm_signal, SIGNAL_NAMES, SIGNAL_BUY, SIGNAL_SELL
+from notification_dispatcher import NotificationDispatcher
+from wechat_notifier import WeChatNotifier
+from signal_state import SignalStateStore
+from market_screener import MarketScreener
+from timeframe_resampler import IncrementalResampler, resample_rows
+from metrics import (timed_stage, record_cycle, stage_totals, format_stage_delta, CycleProfiler, MetricsServer,
+                     STAGE_ERRORS, REQUEST_WEIGHT, REQUEST_WEIGHT_USED, REQUEST_WEIGHT_BUDGET, RATE_LIMITED, NOTIFICATION_QUEUE)
+
+# pandas、ta和批量指标只在DataFrame路径（get_klines、批量模式、回测）中按需导入，
+# 单次检测（流式指标）不需要为它们支付启动时间
+if TYPE_CHECKING:
+    import pandas as pd
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,12 +40,54 @@ class BinanceTrendDetector:
         self.holding_list = []  # 持仓列表
         self.watch_list = []    # 观察列表
         
+        # 配置热加载：持续监控时每轮检测前检查配置文件，变化后在两轮之间应用
+        self.config_file: Optional[str] = None
+        self.config_watcher: Optional[ConfigWatcher] = None
+        self.hot_reload = True
+        self._config: Optional[Dict] = None
+        
         # 技术指标参数
         self.rsi_period = 14
         self.ma_short = 9
         self.ma_long = 21
         self.volume_ma_period = 20
         
+        # 信号规则：条件、权重和阈值来自配置（signal_rules、notification_settings），加载时编译一次
+        self.signal_rules = compile_rules()
+        
+        # 流式指标：每个交易对/周期保留指标状态，每轮只处理新增或更新的K线
+        self.use_streaming_indicators = True
+        self.indicator_engines = {}
+        
+        # 批量模式：全部交易对对齐成二维数组后一次性计算指标，适合大量交易对
+        self.use_batch_indicators = False
+        
+        # 多周期模式：只拉取/订阅基础周期K线，本地增量汇总为timeframes中的各周期分别检测（为空则只检测1h）
+        self.base_interval = '5m'
+        self.timeframes: List[str] = []
+        self.confirm_timeframe: Optional[str] = None  # 信号方向不能与该周期的趋势相反
+        self.timeframe_warmup_bars = 60               # 预热时最大周期需要的K线根数
+        self.resamplers: Dict[str, IncrementalResampler] = {}
+        
+        # K线收盘对齐调度：按交易所服务器时间在各周期收盘后settle_seconds秒检测，
+        # 这一轮只使用bar_close_ms之前收盘的K线（由调度器设置，None表示包含未收盘K线）
+        self.settle_seconds = 2.0
+        self.clock_sync_seconds = 900
+        self.bar_close_ms: Optional[int] = None
+        
+        # 并发抓取配置
+        self.max_workers = 8
+        self.max_fetch_attempts = 3
+        self.rate_limiter = RequestWeightLimiter()
+        self.transport = get_transport()
+        
+        # 全市场初筛（配置文件中screener.enabled为true时启用）
+        self.screener: Optional[MarketScreener] = None
+        self.screened_symbols = frozenset()
+        
+        # 本地K线存储（设为None则每次全量拉取）
+        self.kline_store = KlineStore()
+        
         # 微信通知配置（这里使用邮件作为替代，因为微信需要企业微信API）
         self.notification_config = {
             'email': 'your_email@example.com',
@@ -36,48 +96,143 @@ class BinanceTrendDetector:
             'smtp_server': 'smtp.gmail.com',
             'smtp_port': 587
         }
+        
+        # 通知在后台队列中发送，检测流程只负责入队
+        self.dispatcher = NotificationDispatcher(self.notification_config)
+        
+        # 信号状态：只在信号变化时通知，同一信号冷却期内不重复通知；同一轮的多个信号合并为一条消息
+        self.signal_state = SignalStateStore()
+        self.digest_notifications = True
+        self.digest_window = 2.0
+        self._pending_alerts: List[Tuple[str, Dict]] = []
+        self._alert_lock = threading.Lock()
+        self._flush_timer = None
+        
+        # 运行指标：检测间隔用于计算每轮耗时占比；profiler被请求时剖析下一轮检测
+        self.cycle_interval: Optional[float] = None
+        self.profiler = CycleProfiler()
+        self.metrics_server: Optional[MetricsServer] = None
+        self._register_metrics()
+        
+        # 最近一次检测结果的内存看板；query_api.enabled为true时通过本地只读接口提供给看板和脚本，
+        # 它们不必再自己请求币安
+        self.signal_board = SignalBoard()
+        self.query_server: Optional[QueryServer] = None
+    
+    def _register_metrics(self):
+        """把权重预算和通知队列的当前值接入指标（抓取/metrics时读取）"""
+        REQUEST_WEIGHT_USED.set_function(lambda: self.rate_limiter.used_weight)
+        REQUEST_WEIGHT_BUDGET.set_function(lambda: self.rate_limiter.budget)
+        for field in ('queue_depth', 'sent', 'retries', 'dead_lettered', 'dropped'):
+            NOTIFICATION_QUEUE.set_function(lambda field=field: self.dispatcher.metrics()[field], field=field)
+    
+    # 列表保留配置中的顺序，同时维护一份集合供成员判断使用
+    @property
+    def holding_list(self) -> List[str]:
+        return self._holding_list
+    
+    @holding_list.setter
+    def holding_list(self, symbols: List[str]):
+        self._holding_list = list(symbols)
+        self._holding_set = frozenset(self._holding_list)
+    
+    @property
+    def watch_list(self) -> List[str]:
+        return self._watch_list
+    
+    @watch_list.setter
+    def watch_list(self, symbols: List[str]):
+        self._watch_list = list(symbols)
+        self._watch_set = frozenset(self._watch_list)
+    
+    def request_api(self, path: str, params: Dict = None, weight: int = 1, raw: bool = False):
+        """请求币安公开接口，按权重预算节流，限频时退避重试；raw=True时返回未解码的响应体"""
+        url = f"{self.base_url}{path}"
+        
+        for attempt in range(self.max_fetch_attempts):
+            with timed_stage('throttle'):
+                self.rate_limiter.acquire(weight)
+            with timed_stage('fetch'):
+                response = self.transport.get(url, params=params)
+            REQUEST_WEIGHT.inc(weight, path=path)
+            self.rate_limiter.update_from_headers(response.headers)
+            
+            # 429: 超出限频；418: IP被临时封禁
+            if response.status_code in (429, 418):
+                RATE_LIMITED.inc(status=str(response.status_code))
+                self.rate_limiter.on_rate_limited(response.status_code,
+                                                  response.headers.get('Retry-After'))
+                continue
+            break
+        
+        if not response.ok:
+            STAGE_ERRORS.inc(stage='fetch')
+        response.raise_for_status()
+        if raw:
+            return response.content
+        with timed_stage('parse'):
+            return response.json()
+    
+    def request_klines(self, params: Dict) -> list:
+        """请求/api/v3/klines"""
+        return self.request_api("/api/v3/klines", params, KLINES_WEIGHT)
+    
+    def request_kline_rows(self, params: Dict) -> np.ndarray:
+        """请求/api/v3/klines并直接解析为行格式数组，不经过字符串列表"""
+        payload = self.request_api("/api/v3/klines", params, KLINES_WEIGHT, raw=True)
+        with timed_stage('parse'):
+            return parse_klines(payload)
+    
+    def fetch_klines(self, symbol: str, interval: str = '1h', limit: int = 100) -> np.ndarray:
+        """获取K线原始数组，形状(n, 7)，列顺序见kline_store.KLINE_FIELDS（有本地存储时只增量拉取）"""
+        params = {
+            'symbol': symbol,
+            'interval': interval,
+            'limit': limit
+        }
+        
+        last = self.kline_store.last_row(symbol, interval) if self.kline_store else None
+        if last is not None:
+            # 从最后一根已存K线开始请求：它保存时可能尚未收盘，需要重新获取并覆盖
+            missing = (time.time() * 1000 - last[OPEN_TIME]) // interval_to_ms(interval) + 1
+            if missing < limit:
+                params['startTime'] = int(last[OPEN_TIME])
+        if self.bar_close_ms is not None:
+            params['endTime'] = self.bar_close_ms - 1
+        
+        rows = self.request_kline_rows(params)
+        
+        if self.kline_store:
+            with timed_stage('store'):
+                self.kline_store.upsert(symbol, interval, rows)
+                rows = self.kline_store.load(symbol, interval, tail=limit)
+        if self.bar_close_ms is not None:
+            # endTime按开盘时间过滤，刚开始的新K线仍可能在内（本地存储中也可能有）
+            rows = rows[rows[:, CLOSE_TIME] < self.bar_close_ms]
+        
+        return rows
     
-    def get_klines(self, symbol: str, interval: str = '1h', limit: int = 100) -> pd.DataFrame:
+    def get_klines(self, symbol: str, interval: str = '1h', limit: int = 100) -> 'pd.DataFrame':
         """获取K线数据"""
         try:
-            url = f"{self.base_url}/api/v3/klines"
-            params = {
-                'symbol': symbol,
-                'interval': interval,
-                'limit': limit
-            }
+            rows = self.fetch_klines(symbol, interval, limit)
             
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            df = pd.DataFrame(data, columns=[
-                'timestamp', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_asset_volume', 'number_of_trades',
-                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-            ])
-            
-            # 转换数据类型
-            numeric_columns = ['open', 'high', 'low', 'close', 'volume']
-            for col in numeric_columns:
-                df[col] = pd.to_numeric(df[col])
-            
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            df.set_index('timestamp', inplace=True)
-            
-            return df[numeric_columns]
+            with timed_stage('parse'):
+                return rows_to_frame(rows)
             
         except Exception as e:
             logger.error(f"获取{symbol}数据失败: {e}")
+            import pandas as pd
             return pd.DataFrame()
     
-    def calculate_technical_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
+    def calculate_technical_indicators(self, df: 'pd.DataFrame') -> 'pd.DataFrame':
         """计算技术指标"""
         if df.empty:
             return df
         
         try:
+            import ta
+            
             # RSI
             df['rsi'] = ta.momentum.RSIIndicator(df['close'], window=self.rsi_period).rsi()
             
@@ -97,9 +252,8 @@ class BinanceTrendDetector:
             df['bb_lower'] = bollinger.bollinger_lband()
             df['bb_middle'] = bollinger.bollinger_mavg()
             
-            # 成交量移动平均
-            df['volume_ma'] = ta.volume.VolumeSMAIndicator(df['close'], df['volume'], 
-                                                         window=self.volume_ma_period).volume_sma()
+            # 成交量移动平均（ta库没有成交量SMA指标，直接用滚动均值）
+            df['volume_ma'] = df['volume'].rolling(window=self.volume_ma_period).mean()
             
             # 随机指标
             stoch = ta.momentum.StochasticOscillator(df['high'], df['low'], df['close'])
@@ -112,109 +266,52 @@ class BinanceTrendDetector:
             logger.error(f"计算技术指标失败: {e}")
             return df
     
-    def detect_trend_reversal(self, df: pd.DataFrame, symbol: str) -> Dict:
-        """检测趋势反转信号"""
-        if len(df) < 30:  # 需要足够的数据点
+    def get_indicator_engine(self, symbol: str, interval: str = '1h') -> StreamingIndicators:
+        """获取（或创建）交易对/周期的流式指标状态"""
+        key = (symbol, interval)
+        engine = self.indicator_engines.get(key)
+        if engine is None:
+            engine = StreamingIndicators(rsi_period=self.rsi_period, ma_short=self.ma_short,
+                                         ma_long=self.ma_long,
+                                         volume_ma_period=self.volume_ma_period)
+            self.indicator_engines[key] = engine
+        return engine
+    
+    def detect_trend_reversal(self, df: Union['pd.DataFrame', LiveState, Dict[str, np.ndarray]], symbol: str) -> Dict:
+        """检测趋势反转信号（df也可以是列名到一维数组的映射，如流式指标的LiveState或批量指标的结果）"""
+        if len(df['close']) < 30:  # 需要足够的数据点
             return {'signal': 'HOLD', 'strength': 0, 'reasons': []}
         
-        latest = df.iloc[-1]
-        prev = df.iloc[-2]
-        prev2 = df.iloc[-3]
-        
-        buy_signals = []
-        sell_signals = []
-        signal_strength = 0
-        
-        # 1. RSI信号
-        if latest['rsi'] < 30 and prev['rsi'] >= 30:
-            buy_signals.append("RSI从超卖区反弹")
-            signal_strength += 2
-        elif latest['rsi'] > 70 and prev['rsi'] <= 70:
-            sell_signals.append("RSI进入超买区")
-            signal_strength += 2
-        
-        # 2. 移动平均线交叉
-        if (latest['ma_short'] > latest['ma_long'] and 
-            prev['ma_short'] <= prev['ma_long']):
-            buy_signals.append("短期均线上穿长期均线(金叉)")
-            signal_strength += 3
-        elif (latest['ma_short'] < latest['ma_long'] and 
-              prev['ma_short'] >= prev['ma_long']):
-            sell_signals.append("短期均线下穿长期均线(死叉)")
-            signal_strength += 3
-        
-        # 3. MACD信号
-        if (latest['macd'] > latest['macd_signal'] and 
-            prev['macd'] <= prev['macd_signal']):
-            buy_signals.append("MACD金叉")
-            signal_strength += 2
-        elif (latest['macd'] < latest['macd_signal'] and 
-              prev['macd'] >= prev['macd_signal']):
-            sell_signals.append("MACD死叉")
-            signal_strength += 2
-        
-        # 4. 布林带信号
-        if (latest['close'] < latest['bb_lower'] and 
-            prev['close'] >= prev['bb_lower']):
-            buy_signals.append("价格触及布林带下轨")
-            signal_strength += 1
-        elif (latest['close'] > latest['bb_upper'] and 
-              prev['close'] <= prev['bb_upper']):
-            sell_signals.append("价格触及布林带上轨")
-            signal_strength += 1
-        
-        # 5. 成交量确认
-        volume_spike = latest['volume'] > latest['volume_ma'] * 1.5
-        if volume_spike:
-            if buy_signals:
-                buy_signals.append("成交量放大确认")
-                signal_strength += 1
-            elif sell_signals:
-                sell_signals.append("成交量放大确认")
-                signal_strength += 1
-        
-        # 6. 随机指标
-        if (latest['stoch_k'] > latest['stoch_d'] and 
-            prev['stoch_k'] <= prev['stoch_d'] and 
-            latest['stoch_k'] < 20):
-            buy_signals.append("随机指标低位金叉")
-            signal_strength += 1
-        elif (latest['stoch_k'] < latest['stoch_d'] and 
-              prev['stoch_k'] >= prev['stoch_d'] and 
-              latest['stoch_k'] > 80):
-            sell_signals.append("随机指标高位死叉")
-            signal_strength += 1
-        
-        # 7. 价格动量
-        price_change = (latest['close'] - prev2['close']) / prev2['close']
-        if abs(price_change) > 0.03:  # 3%以上变动
-            if price_change > 0 and buy_signals:
-                buy_signals.append(f"价格强势上涨 {price_change:.2%}")
-                signal_strength += 1
-            elif price_change < 0 and sell_signals:
-                sell_signals.append(f"价格快速下跌 {price_change:.2%}")
-                signal_strength += 1
-        
-        # 决定信号
-        signal = 'HOLD'
-        reasons = []
-        
-        if len(buy_signals) >= 2 and signal_strength >= 4:
-            signal = 'BUY'
-            reasons = buy_signals
-        elif len(sell_signals) >= 2 and signal_strength >= 4:
-            signal = 'SELL'
-            reasons = sell_signals
+        # 只评估最后一根K线，与detect_trend_reversal_series是同一套编译后的规则
+        result = self.signal_rules.evaluate_last(df)
         
+        # 最新一根K线的价格和全部指标，供消息和查询接口使用
+        if isinstance(df, LiveState):
+            latest = df.latest()
+        else:
+            latest = {name: float(np.asarray(df[name][-1:], dtype=np.float64)[0])
+                      for name in LIVE_COLUMNS[1:] if name in df}
         return {
-            'signal': signal,
-            'strength': signal_strength,
-            'reasons': reasons,
+            'signal': SIGNAL_NAMES[result['signal']],
+            'strength': result['strength'],
+            'reasons': self.signal_rules.describe(result['reasons'], result['price_change']),
             'price': latest['close'],
             'rsi': latest['rsi'],
-            'volume_ratio': latest['volume'] / latest['volume_ma']
+            'volume_ratio': latest['volume'] / latest['volume_ma'] if latest['volume_ma'] else float('nan'),
+            'indicators': latest,
         }
     
+    def detect_trend_reversal_series(self, df: 'pd.DataFrame') -> 'pd.DataFrame':
+        """对每根K线评估信号，返回signal(1/-1/0)、strength和reasons(原因位掩码)列"""
+        import pandas as pd
+        
+        result = self.signal_rules.evaluate({name: df[name].to_numpy() for name in self.signal_rules.columns})
+        return pd.DataFrame({
+            'signal': result['signal'],
+            'strength': result['strength'],
+            'reasons': result['reasons'],
+        }, index=df.index)
+    
     def should_notify(self, symbol: str, signal: str) -> bool:
         """判断是否应该发送通知"""
         if signal == 'HOLD':
@@ -222,28 +319,33 @@ class BinanceTrendDetector:
         
         if signal == 'BUY':
             # 买入信号：币种不在持仓列表但在观察列表
-            return symbol not in self.holding_list and symbol in self.watch_list
+            if symbol in self._holding_set:
+                return False
+            return symbol in self._watch_set or (
+                self.screener is not None and self.screener.watch_shortlist
+                and symbol in self.screened_symbols)
         
         elif signal == 'SELL':
             # 卖出信号：币种在持仓列表
-            return symbol in self.holding_list
+            return symbol in self._holding_set
         
         return False
     
-    def send_notification(self, symbol: str, signal_data: Dict):
-        """发送微信通知（这里使用邮件模拟）"""
-        try:
-            signal = signal_data['signal']
-            price = signal_data['price']
-            reasons = signal_data['reasons']
-            strength = signal_data['strength']
-            rsi = signal_data['rsi']
-            volume_ratio = signal_data['volume_ratio']
-            
-            # 构建消息
-            action = "🟢 买入信号" if signal == 'BUY' else "🔴 卖出信号"
-            
-            message = f"""
+    def format_signal_message(self, symbol: str, signal_data: Dict) -> Tuple[str, str]:
+        """构建通知的标题和正文"""
+        signal = signal_data['signal']
+        price = signal_data['price']
+        reasons = signal_data['reasons']
+        strength = signal_data['strength']
+        rsi = signal_data['rsi']
+        volume_ratio = signal_data['volume_ratio']
+        
+        # 构建消息
+        action = "🟢 买入信号" if signal == 'BUY' else "🔴 卖出信号"
+        if signal_data.get('timeframe'):
+            action += f"({signal_data['timeframe']})"
+        
+        message = f"""
 {action} - {symbol}
 
 💰 当前价格: ${price:.6f}
@@ -253,42 +355,79 @@ class BinanceTrendDetector:
 
 🎯 触发原因:
 """
-            for i, reason in enumerate(reasons, 1):
-                message += f"{i}. {reason}\n"
-            
-            message += f"\n⏰ 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        for i, reason in enumerate(reasons, 1):
+            message += f"{i}. {reason}\n"
+        
+        message += f"\n⏰ 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        return f"{symbol} {action}", message
+    
+    def send_notification(self, symbol: str, signal_data: Dict):
+        """发送微信通知（未配置微信时使用邮件）"""
+        try:
+            subject, message = self.format_signal_message(symbol, signal_data)
             
-            # 发送邮件（作为微信通知的替代）
-            self.send_email(f"{symbol} {action}", message)
+            # 入队后立即返回：优先企业微信，未配置或失败时发送邮件
+            self.dispatcher.enqueue_signal(symbol, signal_data, subject, message)
             
-            logger.info(f"已发送{symbol}的{signal}信号通知")
+            logger.info(f"已提交{symbol}的{signal_data['signal']}信号通知")
             
         except Exception as e:
             logger.error(f"发送通知失败: {e}")
     
-    def send_email(self, subject: str, body: str):
-        """发送邮件通知"""
+    def send_digest(self, alerts: List[Tuple[str, Dict]]):
+        """把同一轮的多个信号合并为一条通知"""
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.notification_config['email']
-            msg['To'] = self.notification_config['to_email']
-            msg['Subject'] = subject
+            messages = [self.format_signal_message(symbol, signal_data)[1]
+                        for symbol, signal_data in alerts]
+            buy_count = sum(1 for _, signal_data in alerts if signal_data['signal'] == 'BUY')
+            subject = f"交易信号汇总: 买入 {buy_count} 个, 卖出 {len(alerts) - buy_count} 个"
             
-            msg.attach(MIMEText(body, 'plain', 'utf-8'))
-            
-            server = smtplib.SMTP(self.notification_config['smtp_server'], 
-                                self.notification_config['smtp_port'])
-            server.starttls()
-            server.login(self.notification_config['email'], 
-                        self.notification_config['password'])
-            
-            text = msg.as_string()
-            server.sendmail(self.notification_config['email'], 
-                          self.notification_config['to_email'], text)
-            server.quit()
+            self.dispatcher.enqueue_digest(alerts, subject, "\n".join(messages))
+            logger.info(f"已提交 {len(alerts)} 个信号的汇总通知")
             
         except Exception as e:
-            logger.error(f"发送邮件失败: {e}")
+            logger.error(f"发送汇总通知失败: {e}")
+    
+    def flush_notifications(self):
+        """发送本轮累积的信号通知并保存信号状态"""
+        with self._alert_lock:
+            alerts, self._pending_alerts = self._pending_alerts, []
+            self._flush_timer = None
+        
+        if len(alerts) == 1 or (alerts and not self.digest_notifications):
+            for symbol, signal_data in alerts:
+                self.send_notification(symbol, signal_data)
+        elif alerts:
+            self.send_digest(alerts)
+        
+        self._check_daily_summary()
+        self.signal_state.save()
+    
+    def _schedule_flush(self):
+        """推送模式下K线收盘后各交易对的推送陆续到达，等待digest_window秒后合并发送"""
+        with self._alert_lock:
+            if self._flush_timer is None and self._pending_alerts:
+                self._flush_timer = threading.Timer(self.digest_window, self.flush_notifications)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def _check_daily_summary(self):
+        """日期变化后，用信号状态存储中的统计发送前一天的总结（cron单次运行同样适用）"""
+        date = self.signal_state.pending_summary()
+        if date is not None:
+            self.send_daily_summary(date)
+            self.signal_state.mark_summary_sent(date)
+    
+    def send_daily_summary(self, date: str = None):
+        """发送每日信号总结（默认当天）"""
+        if self.dispatcher.wechat_notifier is None:
+            logger.info("未配置微信通知，跳过每日总结")
+            return
+        self.dispatcher.enqueue_summary(self.signal_state.daily_summary(date))
+    
+    def send_email(self, subject: str, body: str):
+        """发送邮件通知（后台队列复用SMTP连接）"""
+        self.dispatcher.enqueue_email(subject, body)
     
     def load_config(self, config_file: str = 'trading_config.json'):
         """加载配置文件"""
@@ -296,10 +435,9 @@ class BinanceTrendDetector:
             with open(config_file, 'r', encoding='utf-8') as f:
                 config = json.load(f)
             
-            self.holding_list = config.get('holding_list', [])
-            self.watch_list = config.get('watch_list', [])
-            self.symbols = list(set(self.holding_list + self.watch_list))
-            
+            self.apply_config(config)
+            self.config_file = config_file
+            self.config_watcher = ConfigWatcher(config_file) if self.hot_reload else None
             logger.info(f"加载配置: 持仓{len(self.holding_list)}个, 观察{len(self.watch_list)}个")
             
         except FileNotFoundError:
@@ -319,37 +457,435 @@ class BinanceTrendDetector:
             logger.info("已创建默认配置文件")
             self.load_config(config_file)
     
-    def run_detection(self):
-        """执行检测"""
-        logger.info(f"开始检测 {len(self.symbols)} 个交易对")
+    def apply_config(self, config: Dict):
+        """应用一份配置：先构建所有可能出错的对象，全部成功后才一起替换，出错时当前配置保持不变
+        
+        与上一次应用的配置相同的部分（本地存储、HTTP连接池、全市场初筛、微信通知）不重建，
+        不再监控的交易对的指标状态和信号状态被丢弃，其余交易对保留。
+        """
+        previous = self._config
+        
+        def changed(key: str) -> bool:
+            return previous is None or config.get(key) != previous.get(key)
+        
+        holding_list = config.get('holding_list', [])
+        watch_list = config.get('watch_list', [])
+        
+        kline_store = self.kline_store
+        if 'data_dir' in config and changed('data_dir'):
+            kline_store = KlineStore(config['data_dir']) if config['data_dir'] else None
+        
+        settings = config.get('notification_settings', {})
+        
+        signal_rules = self.signal_rules
+        try:
+            signal_rules = compile_rules(*rules_from_config(config))
+        except ValueError as e:
+            logger.error(f"信号规则配置有误，继续使用当前规则: {e}")
+        
+        timeframe_settings = config.get('timeframes', {})
+        base_interval, confirm_timeframe = self.base_interval, self.confirm_timeframe
+        warmup_bars = self.timeframe_warmup_bars
+        if timeframe_settings.get('enabled', False):
+            base_interval = timeframe_settings.get('base_interval', base_interval)
+            timeframes = list(timeframe_settings.get('intervals', []))
+            confirm_timeframe = timeframe_settings.get('confirm_interval')
+            warmup_bars = timeframe_settings.get('warmup_bars', warmup_bars)
+            for interval in [base_interval] + timeframes + ([confirm_timeframe] if confirm_timeframe else []):
+                interval_to_ms(interval)  # 不支持的周期在这里报错，而不是在检测中途
+            if confirm_timeframe and confirm_timeframe not in timeframes:
+                # 不在intervals中的周期没有K线汇总，确认会静默失效
+                raise ValueError(f"确认周期{confirm_timeframe}不在intervals {timeframes}中")
+        else:
+            timeframes = []
+        
+        screener = self.screener
+        if changed('screener'):
+            screener = MarketScreener.from_settings(self, config.get('screener', {}))
+        
+        # ---- 以下只做赋值，不会失败 ----
+        removed = set(self.symbols) - set(holding_list) - set(watch_list) - self.screened_symbols
+        self.holding_list = holding_list
+        self.watch_list = watch_list
+        self.symbols = list(set(self.holding_list + self.watch_list))
+        self.kline_store = kline_store
         
-        for symbol in self.symbols:
+        if 'cooldown_minutes' in settings:
+            self.signal_state.cooldown_seconds = settings['cooldown_minutes'] * 60
+        if 'notify_on_transition_only' in settings:
+            self.signal_state.only_on_transition = settings['notify_on_transition_only']
+        if 'digest' in settings:
+            self.digest_notifications = settings['digest']
+        if 'check_interval' in settings:
+            self.cycle_interval = settings['check_interval']
+        self.signal_rules = signal_rules
+        self.hot_reload = config.get('hot_reload', True)
+        
+        if 'http_settings' in config and changed('http_settings'):
+            self.transport = configure_transport(config['http_settings'])
+        
+        if previous is not None and (base_interval != self.base_interval or timeframes != self.timeframes):
+            # 周期变化后原有的增量汇总不再适用，下一轮重新预热；仍在使用的周期保留指标状态
+            self.resamplers.clear()
+            intervals = set(timeframes or ['1h'])
+            for key in [key for key in self.indicator_engines if key[1] not in intervals]:
+                del self.indicator_engines[key]
+        self.base_interval = base_interval
+        self.timeframes = timeframes
+        self.confirm_timeframe = confirm_timeframe
+        self.timeframe_warmup_bars = warmup_bars
+        
+        scheduler_settings = config.get('scheduler', {})
+        self.settle_seconds = scheduler_settings.get('settle_seconds', self.settle_seconds)
+        self.clock_sync_seconds = scheduler_settings.get('clock_sync_seconds', self.clock_sync_seconds)
+        
+        self.screener = screener
+        
+        email_config = config.get('email_config')
+        if email_config:
+            self.notification_config.update({
+                'email': email_config.get('from_email', self.notification_config['email']),
+                'password': email_config.get('from_password', self.notification_config['password']),
+                'to_email': email_config.get('to_email', self.notification_config['to_email']),
+                'smtp_server': email_config.get('smtp_server', self.notification_config['smtp_server']),
+                'smtp_port': email_config.get('smtp_port', self.notification_config['smtp_port']),
+                'use_tls': email_config.get('use_tls', True),
+            })
+        
+        metrics_settings = config.get('metrics', {})
+        self.profiler.output_dir = metrics_settings.get('profile_dir', self.profiler.output_dir)
+        if metrics_settings.get('enabled', False) and self.metrics_server is None:
             try:
-                # 获取数据
-                df = self.get_klines(symbol)
-                if df.empty:
-                    continue
-                
-                # 计算技术指标
+                self.metrics_server = MetricsServer(profiler=self.profiler,
+                                                    host=metrics_settings.get('host', '127.0.0.1'),
+                                                    port=metrics_settings.get('port', 9108)).start()
+            except OSError as e:
+                # 同一台机器上的多个工作进程（cluster.py）只有第一个能占用端口
+                logger.error(f"指标服务启动失败: {e}")
+        
+        query_settings = config.get('query_api', {})
+        if query_settings.get('enabled', False) and self.query_server is None:
+            try:
+                self.query_server = QueryServer(self.signal_board, host=query_settings.get('host', '127.0.0.1'),
+                                                port=query_settings.get('port', 9109)).start()
+            except OSError as e:
+                logger.error(f"查询接口启动失败: {e}")
+        
+        if changed('wechat_config') or changed('http_settings'):
+            wechat_config = config.get('wechat_config')
+            if wechat_config and (wechat_config.get('corp_id') or wechat_config.get('server_chan_key')):
+                self.dispatcher.wechat_notifier = WeChatNotifier(wechat_config, self.transport)
+            elif previous is not None:
+                self.dispatcher.wechat_notifier = None
+        
+        if removed:
+            self.evict_symbols(removed)
+            self.signal_state.forget(sorted(removed))
+            self.signal_board.forget(removed)
+        self._config = config
+    
+    def evict_symbols(self, symbols):
+        """丢弃交易对的流式指标状态和增量汇总（不再监控或不再由本进程负责时）"""
+        symbols = set(symbols)
+        for key in [key for key in self.indicator_engines if key[0] in symbols]:
+            del self.indicator_engines[key]
+        for symbol in symbols:
+            self.resamplers.pop(symbol, None)
+    
+    def reload_config_if_changed(self) -> bool:
+        """配置文件变化时应用新配置（在每轮检测开始前调用，即两轮检测之间），返回是否应用了新配置
+        
+        只有新增的交易对需要预热（在这一轮中按需拉取），其余交易对的指标状态保持不变。
+        """
+        if self.config_watcher is None:
+            return False
+        config = self.config_watcher.poll()
+        if config is None:
+            return False
+        
+        before = list(self.symbols)
+        try:
+            self.apply_config(config)
+        except Exception as e:
+            CONFIG_RELOADS.inc(result='failed')
+            logger.error(f"应用新配置失败，继续使用当前配置: {e}")
+            return False
+        
+        CONFIG_RELOADS.inc(result='applied')
+        if not self.hot_reload:
+            self.config_watcher = None
+        added, removed = diff_symbols(before, self.symbols)
+        logger.info(f"配置已热加载: 持仓{len(self.holding_list)}个, 观察{len(self.watch_list)}个；"
+                    f"新增{len(added)}个交易对{added if added else ''}，移除{len(removed)}个{removed if removed else ''}")
+        return True
+    
+    def analyze_symbol(self, symbol: str) -> Optional[Dict]:
+        """获取数据并检测单个交易对的信号（流式指标直接使用K线数组，不构建K线DataFrame）"""
+        if self.use_streaming_indicators:
+            try:
+                rows = self.fetch_klines(symbol)
+            except Exception as e:
+                logger.error(f"获取{symbol}数据失败: {e}")
+                return None
+            if len(rows) == 0:
+                return None
+            
+            engine = self.get_indicator_engine(symbol)
+            with timed_stage('indicators'):
+                engine.feed_rows(rows, last_closed=self.bar_close_ms is not None)
+            df = engine.state
+        else:
+            df = self.get_klines(symbol)
+            if df.empty:
+                return None
+            
+            # 计算技术指标
+            with timed_stage('indicators'):
                 df = self.calculate_technical_indicators(df)
-                
-                # 检测信号
-                signal_data = self.detect_trend_reversal(df, symbol)
-                
-                logger.info(f"{symbol}: {signal_data['signal']} (强度: {signal_data['strength']})")
-                
-                # 判断是否需要通知
-                if self.should_notify(symbol, signal_data['signal']):
-                    self.send_notification(symbol, signal_data)
-                
-                time.sleep(0.5)  # 避免API限制
-                
+        
+        # 检测信号
+        with timed_stage('detect'):
+            return self.detect_trend_reversal(df, symbol)
+    
+    def handle_signal(self, symbol: str, signal_data: Dict, interval: str = '1h'):
+        """记录检测结果，符合条件且信号发生变化（不在冷却期内）时加入本轮待发送通知"""
+        logger.info(f"{symbol}: {signal_data['signal']} (强度: {signal_data['strength']})")
+        
+        self.signal_board.publish(symbol, interval, signal_data)
+        
+        # 判断是否需要通知
+        eligible = self.should_notify(symbol, signal_data['signal'])
+        if self.signal_state.update(symbol, interval, signal_data, eligible):
+            with self._alert_lock:
+                self._pending_alerts.append((symbol, signal_data))
+    
+    def select_symbols(self) -> List[str]:
+        """本轮需要拉取K线的交易对：配置的持仓/观察列表，加上全市场初筛的候选"""
+        if self.screener is None:
+            return self.symbols
+        
+        shortlist = self.screener.run()
+        self.screened_symbols = frozenset(shortlist)
+        return list(dict.fromkeys(self.symbols + shortlist))
+    
+    def run_batch_detection(self, interval: str = '1h', limit: int = 100):
+        """批量检测：并发抓取后对全部交易对一次向量化计算指标"""
+        from batch_indicators import compute_batch
+        
+        symbols = self.select_symbols()
+        logger.info(f"开始批量检测 {len(symbols)} 个交易对")
+        started = time.time()
+        stages_before = stage_totals()
+        
+        rows = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.profiler.wrap(self.fetch_klines), symbol, interval, limit): symbol
+                       for symbol in symbols}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    rows[symbol] = future.result()
+                except Exception as e:
+                    logger.error(f"获取{symbol}数据失败: {e}")
+        fetched = time.time()
+        
+        with timed_stage('indicators'):
+            result = compute_batch(rows, interval_to_ms(interval), rsi_period=self.rsi_period,
+                                   ma_short=self.ma_short, ma_long=self.ma_long,
+                                   volume_ma_period=self.volume_ma_period)
+        computed = time.time()
+        
+        for symbol in result.symbols:
+            try:
+                with timed_stage('detect'):
+                    signal_data = self.detect_trend_reversal(result.for_symbol(symbol), symbol)
+                self.handle_signal(symbol, signal_data, interval)
             except Exception as e:
                 logger.error(f"处理{symbol}时出错: {e}")
+        self.flush_notifications()
+        
+        elapsed = time.time() - started
+        record_cycle('batch', elapsed, len(symbols), self.cycle_interval)
+        logger.info(f"批量检测完成：抓取 {fetched - started:.2f} 秒，"
+                    f"指标计算 {(computed - fetched) * 1000:.1f} 毫秒，共 {elapsed:.2f} 秒")
+        logger.info(f"各阶段累计耗时: {format_stage_delta(stages_before)}")
+        logger.info(f"本轮请求延迟: {self.transport.stats.format_summary(reset=True)}")
+        logger.info(f"通知队列: {self.dispatcher.format_metrics()}")
+    
+    def _base_history(self, symbol: str) -> np.ndarray:
+        """本地存储中预热所需的基础周期K线"""
+        if not self.kline_store:
+            return np.empty((0, 7))
+        start_ms = time.time() * 1000 - self.timeframe_warmup_bars * max(map(interval_to_ms, self.timeframes))
+        rows = self.kline_store.load(symbol, self.base_interval)
+        return np.array(rows[np.searchsorted(rows[:, OPEN_TIME], start_ms):])
+    
+    def _seed_timeframes(self, symbol: str, rows: np.ndarray):
+        """用基础周期K线一次性汇总出各周期K线并预热指标，之后由增量汇总接手"""
+        now_ms = time.time() * 1000
+        for interval in self.timeframes:
+            bars = resample_rows(rows, interval)
+            engine = self.get_indicator_engine(symbol, interval)
+            engine.reset()
+            last = len(bars) - 1
+            for i, bar in enumerate(bars):
+                # 最后一根大周期K线的时间段走完才算收盘
+                closed = i < last or bar[OPEN_TIME] + interval_to_ms(interval) <= now_ms
+                engine.update(int(bar[OPEN_TIME]), *map(float, bar[OPEN:CLOSE_TIME]), closed=closed)
+        
+        resampler = IncrementalResampler(self.base_interval, self.timeframes)
+        resampler.seed(rows, now_ms)
+        self.resamplers[symbol] = resampler
+    
+    def _warm_up_timeframes(self, symbols: List[str]):
+        """补齐基础周期历史K线（有本地存储时按需分页下载），重新汇总各周期并预热指标"""
+        if self.kline_store:
+            from history_downloader import HistoryDownloader
+            
+            start_ms = int(time.time() * 1000 - self.timeframe_warmup_bars
+                           * max(map(interval_to_ms, self.timeframes)))
+            HistoryDownloader(self, self.kline_store, self.max_workers).download(
+                symbols, self.base_interval, start_ms)
+        
+        for symbol in symbols:
+            try:
+                # 没有本地存储时只能用单次请求的1000根K线预热
+                rows = self._base_history(symbol) if self.kline_store else \
+                    np.array(self.fetch_klines(symbol, self.base_interval, 1000))
+                if len(rows):
+                    self._seed_timeframes(symbol, rows)
+            except Exception as e:
+                logger.error(f"预热{symbol}多周期数据出错: {e}")
+    
+    def _feed_base_rows(self, symbol: str, rows: np.ndarray):
+        """把新的基础周期K线交给增量汇总，并更新各周期的流式指标"""
+        resampler = self.resamplers[symbol]
+        base_ms = interval_to_ms(self.base_interval)
+        if len(rows) and rows[0, OPEN_TIME] > resampler.last_open_time + base_ms:
+            # 数据断档，重新汇总
+            self._seed_timeframes(symbol, self._base_history(symbol) if self.kline_store else rows)
+            return
+        
+        now_ms = time.time() * 1000
+        # 最后一根已汇总的基础K线若已收盘则不再重复输入
+        new_rows = rows[:, OPEN_TIME] > resampler.last_open_time if resampler.last_closed \
+            else rows[:, OPEN_TIME] >= resampler.last_open_time
+        for row in rows[new_rows]:
+            events = resampler.update(int(row[OPEN_TIME]), *map(float, row[OPEN:CLOSE_TIME]),
+                                      closed=row[OPEN_TIME] + base_ms <= now_ms)
+            for interval, bar, closed in events:
+                self.get_indicator_engine(symbol, interval).update(*bar, closed=closed)
+    
+    def detect_timeframe(self, symbol: str, interval: str) -> Dict:
+        """检测某个周期的信号，并按confirm_timeframe做跨周期确认"""
+        signal_data = self.detect_trend_reversal(self.get_indicator_engine(symbol, interval).state, symbol)
+        signal_data['timeframe'] = interval
+        
+        if (self.confirm_timeframe and interval != self.confirm_timeframe
+                and signal_data['signal'] in ('BUY', 'SELL')):
+            latest = self.get_indicator_engine(symbol, self.confirm_timeframe).latest()
+            direction = trend_direction(latest) if latest else 0
+            code = SIGNAL_BUY if signal_data['signal'] == 'BUY' else SIGNAL_SELL
+            if not confirm_signal(code, direction):
+                logger.info(f"{symbol} {interval}的{signal_data['signal']}信号与{self.confirm_timeframe}趋势相反，忽略")
+                signal_data['signal'] = 'HOLD'
+            elif direction == code:
+                signal_data['reasons'].append(f"{self.confirm_timeframe}趋势同向确认")
+        return signal_data
+    
+    def analyze_symbol_timeframes(self, symbol: str, intervals: List[str] = None) -> Dict[str, Dict]:
+        """拉取基础周期K线（有本地存储时只增量拉取），返回各周期（默认全部timeframes）的检测结果"""
+        rows = self.fetch_klines(symbol, self.base_interval, 100 if self.kline_store else 1000)
+        with timed_stage('indicators'):
+            self._feed_base_rows(symbol, np.asarray(rows))
+        with timed_stage('detect'):
+            return {interval: self.detect_timeframe(symbol, interval) for interval in intervals or self.timeframes}
+    
+    def run_multi_timeframe_detection(self, intervals: List[str] = None):
+        """多周期检测：每个交易对只请求一次基础周期K线，各周期由本地汇总得到；intervals限定本轮检测的周期"""
+        symbols = self.select_symbols()
+        intervals = intervals or self.timeframes
+        logger.info(f"开始多周期检测 {len(symbols)} 个交易对，基础周期 {self.base_interval}，"
+                    f"检测周期 {', '.join(intervals)}")
+        started = time.time()
+        stages_before = stage_totals()
+        
+        new_symbols = [symbol for symbol in symbols if symbol not in self.resamplers]
+        if new_symbols:
+            self._warm_up_timeframes(new_symbols)
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.profiler.wrap(self.analyze_symbol_timeframes), symbol, intervals): symbol
+                       for symbol in symbols if symbol in self.resamplers}
+            
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    for interval, signal_data in future.result().items():
+                        self.handle_signal(symbol, signal_data, interval)
+                except Exception as e:
+                    logger.error(f"处理{symbol}时出错: {e}")
+        
+        self.flush_notifications()
+        
+        elapsed = time.time() - started
+        record_cycle('multi_timeframe', elapsed, len(symbols), self.cycle_interval)
+        logger.info(f"多周期检测完成，耗时 {elapsed:.1f} 秒，"
+                    f"已用权重 {self.rate_limiter.used_weight}/{self.rate_limiter.budget}")
+        logger.info(f"各阶段累计耗时: {format_stage_delta(stages_before)}")
+        logger.info(f"本轮请求延迟: {self.transport.stats.format_summary(reset=True)}")
+        logger.info(f"通知队列: {self.dispatcher.format_metrics()}")
+    
+    def run_detection(self, intervals: List[str] = None):
+        """执行检测（并发抓取，请求节奏由权重预算器控制）；请求了性能剖析时剖析这一轮"""
+        if self.reload_config_if_changed() and intervals:
+            # 调度器的周期来自启动时的配置，热加载后只检测仍在配置中的周期
+            intervals = [interval for interval in intervals if interval in self.timeframes] or None
+        with self.profiler.profile():
+            if self.timeframes:
+                return self.run_multi_timeframe_detection(intervals)
+            if self.use_batch_indicators:
+                return self.run_batch_detection()
+            return self.run_single_detection()
+    
+    def run_single_detection(self):
+        """单周期检测：每个交易对各自拉取K线并计算指标"""
+        symbols = self.select_symbols()
+        logger.info(f"开始检测 {len(symbols)} 个交易对")
+        started = time.time()
+        stages_before = stage_totals()
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.profiler.wrap(self.analyze_symbol), symbol): symbol
+                       for symbol in symbols}
+            
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    signal_data = future.result()
+                    if signal_data is None:
+                        continue
+                    
+                    self.handle_signal(symbol, signal_data)
+                    
+                except Exception as e:
+                    logger.error(f"处理{symbol}时出错: {e}")
+        
+        # 本轮的多个信号合并为一条通知
+        self.flush_notifications()
+        
+        elapsed = time.time() - started
+        record_cycle('single', elapsed, len(symbols), self.cycle_interval)
+        logger.info(f"检测完成，耗时 {elapsed:.1f} 秒，"
+                    f"已用权重 {self.rate_limiter.used_weight}/{self.rate_limiter.budget}")
+        logger.info(f"各阶段累计耗时: {format_stage_delta(stages_before)}")
+        logger.info(f"本轮请求延迟: {self.transport.stats.format_summary(reset=True)}")
+        logger.info(f"通知队列: {self.dispatcher.format_metrics()}")
     
     def start_monitoring(self, interval: int = 300):
         """开始监控"""
         logger.info(f"开始监控，检测间隔: {interval}秒")
+        self.cycle_interval = interval
         
         while True:
             try:
@@ -359,13 +895,129 @@ class BinanceTrendDetector:
                 
             except KeyboardInterrupt:
                 logger.info("监控已停止")
+                self.dispatcher.stop()
                 break
             except Exception as e:
                 logger.error(f"监控过程出错: {e}")
                 time.sleep(60)  # 出错后等待1分钟再继续
 
+    def run_closed_detection(self, close_ms: int, intervals: List[str] = None):
+        """只用close_ms之前收盘的K线检测一轮，刚开始的新K线不参与（K线收盘对齐调度调用）"""
+        self.bar_close_ms = close_ms
+        try:
+            self.run_detection(intervals)
+        finally:
+            self.bar_close_ms = None
+    
+    def start_scheduled(self):
+        """K线收盘对齐监控：按交易所服务器时间在每根K线收盘后settle_seconds秒检测一轮
+        
+        多周期模式下各周期按各自的节奏检测，同时收盘的周期合并为一轮（只拉取一次基础周期K线）。
+        """
+        from candle_scheduler import ServerClock, CandleScheduler
+        
+        clock = ServerClock(self.request_api, sync_seconds=self.clock_sync_seconds)
+        scheduler = CandleScheduler(clock, self.settle_seconds)
+        intervals = self.timeframes or ['1h']
+        scheduler.add_job('detection', intervals,
+                          lambda closed, close_ms: self.run_closed_detection(close_ms, closed))
+        self.cycle_interval = min(map(interval_to_ms, intervals)) / 1000
+        
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            logger.info("监控已停止")
+        finally:
+            scheduler.stop()
+            self.dispatcher.stop()
+        return scheduler
+    
+    def _warm_up(self, symbols: List[str], interval: str):
+        """通过REST补齐K线并更新流式指标状态"""
+        def warm(symbol):
+            self.get_indicator_engine(symbol, interval).feed_rows(self.fetch_klines(symbol, interval))
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for future in as_completed([executor.submit(warm, symbol) for symbol in symbols]):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"补齐K线数据出错: {e}")
+    
+    def _on_stream_kline(self, symbol: str, kline: Dict, interval: str, intrabar: bool):
+        """处理一条K线推送：更新存储和指标，K线收盘时（或intrabar模式下每次更新）检测信号"""
+        closed = kline['x']
+        row = kline_to_row(kline)
+        
+        if self.kline_store:
+            self.kline_store.upsert(symbol, interval, rows_from_api([row]))
+        
+        engine = self.get_indicator_engine(symbol, interval)
+        with timed_stage('indicators'):
+            engine.update(int(row[0]), float(row[1]), float(row[2]), float(row[3]),
+                          float(row[4]), float(row[5]), closed=closed)
+        
+        if closed or intrabar:
+            with timed_stage('detect'):
+                signal_data = self.detect_trend_reversal(engine.state, symbol)
+            self.handle_signal(symbol, signal_data, interval)
+            self._schedule_flush()
+    
+    def _on_stream_base_kline(self, symbol: str, kline: Dict, intrabar: bool):
+        """多周期推送模式：基础周期K线增量汇总到各周期，某个周期K线收盘时检测该周期"""
+        row = kline_to_row(kline)
+        if self.kline_store:
+            self.kline_store.upsert(symbol, self.base_interval, rows_from_api([row]))
+        
+        resampler = self.resamplers.get(symbol)
+        if resampler is None:
+            return
+        
+        events = resampler.update(int(row[0]), float(row[1]), float(row[2]), float(row[3]),
+                                  float(row[4]), float(row[5]), closed=kline['x'])
+        for interval, bar, closed in events:
+            self.get_indicator_engine(symbol, interval).update(*bar, closed=closed)
+            if closed or intrabar:
+                self.handle_signal(symbol, self.detect_timeframe(symbol, interval), interval)
+        self._schedule_flush()
+    
+    def start_streaming(self, interval: str = '1h', intrabar: bool = False,
+                        stream_url: str = STREAM_BASE_URL):
+        """事件驱动监控：订阅币安组合K线流，K线收盘时立即检测（多周期模式下只订阅基础周期）"""
+        if self.timeframes:
+            interval = self.base_interval
+            warm_up = self._warm_up_timeframes
+            on_kline = lambda symbol, kline: self._on_stream_base_kline(symbol, kline, intrabar)
+        else:
+            warm_up = lambda symbols: self._warm_up(symbols, interval)
+            on_kline = lambda symbol, kline: self._on_stream_kline(symbol, kline, interval, intrabar)
+        logger.info(f"开始推送模式监控 {len(self.symbols)} 个交易对，周期 {interval}")
+        
+        # 先用REST预热指标状态，之后全部由推送驱动
+        warm_up(self.symbols)
+        
+        client = KlineStreamClient(
+            self.symbols, interval,
+            on_kline=on_kline,
+            on_reconnect=warm_up,
+            base_url=stream_url)
+        client.start()
+        
+        try:
+            client.wait()
+        except KeyboardInterrupt:
+            logger.info("监控已停止")
+        finally:
+            client.stop()
+            self.flush_notifications()
+            self.dispatcher.stop()
+        return client
+
 # 使用示例
 if __name__ == "__main__":
+    # 非交互使用（cron等）请用 python cli.py once|monitor|stream|backfill|backtest
+    from cli import interactive
+    
     # 创建检测器实例
     detector = BinanceTrendDetector()
     
@@ -377,16 +1029,4 @@ if __name__ == "__main__":
     # detector.watch_list = ["BTCUSDT", "ETHUSDT", "ADAUSDT", "DOTUSDT"]
     # detector.symbols = list(set(detector.holding_list + detector.watch_list))
     
-    print("币安趋势反转检测系统")
-    print("=" * 50)
-    
-    choice = input("选择运行模式:\n1. 单次检测\n2. 持续监控\n请输入选择 (1/2): ")
-    
-    if choice == "1":
-        detector.run_detection()
-    elif choice == "2":
-        interval = input("输入检测间隔(秒，默认300): ")
-        interval = int(interval) if interval.isdigit() else 300
-        detector.start_monitoring(interval)
-    else:
-        print("无效选择")
\ No newline at end of file
+    interactive(detector)
@@ -0,0 +1,206 @@
+import time
+import threading
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+from kline_store import interval_to_ms
+from metrics import REGISTRY
+from rate_limiter import SERVER_TIME_WEIGHT
+from timeframe_resampler import bucket_start
+
+logger = logging.getLogger(__name__)
+
+CLOCK_OFFSET = REGISTRY.gauge('binance_clock_offset_seconds', "交易所服务器时间减去本机时间")
+CLOSE_LAG = REGISTRY.histogram('scheduler_close_lag_seconds', "K线收盘到该轮检测完成的时间", ['job'])
+COALESCED = REGISTRY.counter('scheduler_coalesced_total', "上一轮尚未完成、被合并到下一轮的收盘次数", ['job'])
+SKIPPED = REGISTRY.counter('scheduler_skipped_total', "调度线程错过（未触发）的收盘次数", ['job'])
+
+
+def next_close_ms(now_ms: float, interval: str) -> int:
+    """now_ms之后最近的一次K线收盘时间（即下一根K线的开盘时间）"""
+    return int(bucket_start(int(now_ms), interval)) + interval_to_ms(interval)
+
+
+class ServerClock:
+    """以交易所服务器时间为准的时钟
+
+    通过/api/v3/time测量本机时钟的偏差，多次采样取往返时间最短的一次（假设去程和回程耗时相同），
+    每隔sync_seconds秒重新测量一次。
+    """
+
+    def __init__(self, request_api: Callable, samples: int = 3, sync_seconds: float = 900):
+        # request_api与BinanceTrendDetector.request_api的签名相同（按权重预算节流）
+        self.request_api = request_api
+        self.samples = samples
+        self.sync_seconds = sync_seconds
+        self.offset_ms = 0.0
+        self.rtt_ms: Optional[float] = None
+        self.synced_at: Optional[float] = None
+
+    def sync(self) -> float:
+        """测量并返回服务器时间减去本机时间的毫秒数，全部失败时保留上一次的结果"""
+        best = None
+        for _ in range(self.samples):
+            try:
+                sent = time.time()
+                server_ms = self.request_api("/api/v3/time", weight=SERVER_TIME_WEIGHT)['serverTime']
+                received = time.time()
+            except Exception as e:
+                logger.error(f"获取服务器时间失败: {e}")
+                continue
+            rtt_ms = (received - sent) * 1000
+            if best is None or rtt_ms < best[0]:
+                best = (rtt_ms, server_ms - (sent + received) * 500)
+
+        self.synced_at = time.time()
+        if best is None:
+            return self.offset_ms
+        self.rtt_ms, self.offset_ms = best
+        CLOCK_OFFSET.set(self.offset_ms / 1000)
+        if abs(self.offset_ms) > 1000:
+            logger.warning(f"本机时钟与服务器相差 {self.offset_ms / 1000:+.2f} 秒，已按服务器时间调度")
+        return self.offset_ms
+
+    def maybe_sync(self):
+        if self.synced_at is None or time.time() - self.synced_at >= self.sync_seconds:
+            self.sync()
+
+    def now_ms(self) -> float:
+        return time.time() * 1000 + self.offset_ms
+
+
+class _Job:
+    __slots__ = ('name', 'intervals', 'fn', 'next_close', 'running', 'pending', 'pending_close')
+
+    def __init__(self, name: str, intervals: Sequence[str], fn: Callable[[List[str], int], None]):
+        self.name = name
+        self.intervals = list(intervals)
+        self.fn = fn
+        self.next_close: Dict[str, int] = {}
+        self.running = False
+        self.pending: set = set()
+        self.pending_close = 0
+
+
+class CandleScheduler:
+    """在各周期K线收盘（按服务器时间）后settle_seconds秒运行任务
+
+    一个任务可以对应多个周期，同一时刻收盘的周期合并为一次调用fn(收盘的周期列表, 收盘时间毫秒)。
+    任务还在运行时到达的收盘不会另起一轮，而是合并起来，在当前这一轮结束后立即补跑一次（最多排队一次），
+    耗时超过周期的任务因此不会堆积。
+    """
+
+    def __init__(self, clock: ServerClock, settle_seconds: float = 2.0):
+        self.clock = clock
+        self.settle_seconds = settle_seconds
+        self._jobs: List[_Job] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def add_job(self, name: str, intervals: Sequence[str], fn: Callable[[List[str], int], None]):
+        for interval in intervals:
+            interval_to_ms(interval)  # 不支持的周期立即报错
+        self._jobs.append(_Job(name, intervals, fn))
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        """阻塞运行直到stop()；第一次运行在下一次收盘之后"""
+        self.clock.maybe_sync()
+        now = self.clock.now_ms()
+        for job in self._jobs:
+            job.next_close = {interval: next_close_ms(now, interval) for interval in job.intervals}
+        logger.info("K线收盘对齐调度: " + "; ".join(
+            f"{job.name}({', '.join(job.intervals)})" for job in self._jobs) + f"，收盘后 {self.settle_seconds} 秒检测")
+
+        while not self._stopped.is_set():
+            self.clock.maybe_sync()
+            now = self.clock.now_ms()
+            settle_ms = self.settle_seconds * 1000
+            due_at = min(close for job in self._jobs for close in job.next_close.values()) + settle_ms
+            if now < due_at:
+                # 最多等待一分钟，期间可能重新校时
+                self._stopped.wait(min((due_at - now) / 1000, 60))
+                continue
+
+            for job in self._jobs:
+                closed = [interval for interval, close in job.next_close.items() if close + settle_ms <= now]
+                if not closed:
+                    continue
+                close_ms = max(job.next_close[interval] for interval in closed)
+                for interval in closed:
+                    # 调度线程被阻塞（如系统休眠）时跳过错过的收盘，只检测最近一次
+                    missed = (int(now - settle_ms) - job.next_close[interval]) // interval_to_ms(interval)
+                    if missed > 0:
+                        SKIPPED.inc(missed, job=job.name)
+                    job.next_close[interval] = next_close_ms(now - settle_ms, interval)
+                self._submit(job, closed, close_ms)
+
+        for thread in self._threads:
+            thread.join()
+
+    def _submit(self, job: _Job, intervals: List[str], close_ms: int):
+        with self._lock:
+            if job.running:
+                job.pending.update(intervals)
+                job.pending_close = max(job.pending_close, close_ms)
+                COALESCED.inc(job=job.name)
+                logger.warning(f"{job.name}上一轮尚未完成，{', '.join(intervals)}的收盘合并到下一轮")
+                return
+            job.running = True
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            thread = threading.Thread(target=self._run_job, args=(job, intervals, close_ms), daemon=True)
+            self._threads.append(thread)
+        thread.start()
+
+    def _run_job(self, job: _Job, intervals: List[str], close_ms: int):
+        while True:
+            try:
+                job.fn(intervals, close_ms)
+            except Exception as e:
+                logger.error(f"{job.name}执行出错: {e}")
+            CLOSE_LAG.observe((self.clock.now_ms() - close_ms) / 1000, job=job.name)
+
+            with self._lock:
+                if not job.pending:
+                    job.running = False
+                    return
+                intervals, close_ms = sorted(job.pending, key=interval_to_ms), job.pending_close
+                job.pending = set()
+                job.pending_close = 0
+
+
+def simulate_sleep_loop(interval_seconds: float, cycle_seconds: float, bar: str = '1h',
+                        hours: int = 24, start_seconds: float = 0.0) -> Dict[str, float]:
+    """模拟原先的“检测 + sleep(interval)”循环：每轮实际间隔为interval + 本轮耗时
+
+    返回每根K线的平均拉取次数，以及K线收盘到第一次包含这根已收盘K线的检测完成的平均时间。
+    """
+    bar_seconds = interval_to_ms(bar) / 1000
+    end = hours * 3600
+    starts = []
+    t = start_seconds
+    while t < end:
+        starts.append(t)
+        t += cycle_seconds + interval_seconds
+
+    lags = []
+    for close in range(int(bar_seconds), int(end), int(bar_seconds)):
+        first = next((start for start in starts if start >= close), None)
+        if first is not None:
+            lags.append(first + cycle_seconds - close)
+    return {'fetches_per_bar': len(starts) / (end / bar_seconds), 'lag_seconds': sum(lags) / len(lags)}
+
+
+# 与原先sleep循环的对比：每根1h K线的拉取次数和收盘后多久检测到
+if __name__ == "__main__":
+    cycle_seconds = 20.0
+    settle_seconds = 2.0
+    for interval in (60, 300, 900):
+        result = simulate_sleep_loop(interval, cycle_seconds, start_seconds=1234)
+        print(f"sleep({interval:3d})循环: 每根K线拉取 {result['fetches_per_bar']:5.1f} 次，"
+              f"收盘后平均 {result['lag_seconds']:6.1f} 秒检测到")
+    print(f"收盘对齐调度:    每根K线拉取 {1:5.1f} 次，收盘后 {settle_seconds + cycle_seconds:6.1f} 秒检测到"
+          f"（等待{settle_seconds:.0f}秒 + 本轮耗时{cycle_seconds:.0f}秒）")
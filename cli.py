@@ -0,0 +1,124 @@
+import sys
+import argparse
+import logging
+
+# 这里只导入标准库的轻量模块：检测器、pandas、ta、smtplib等都在对应子命令里才导入，
+# cron定时执行单次检测时启动开销主要是numpy和requests
+
+
+def make_detector(config_file: str = 'trading_config.json', base_url: str = None):
+    from binance_trend_detector import BinanceTrendDetector
+
+    detector = BinanceTrendDetector()
+    detector.load_config(config_file)
+    if base_url:
+        detector.base_url = base_url.rstrip('/')
+    return detector
+
+
+def run_once(detector) -> int:
+    """检测一轮（日期变化后的第一次运行同时发送前一天的总结），等待队列中的通知发送完毕后退出"""
+    try:
+        detector.run_detection()
+    finally:
+        detector.dispatcher.stop()
+    return 0
+
+
+def interactive(detector) -> int:
+    """原有的交互式菜单"""
+    print("币安趋势反转检测系统")
+    print("=" * 50)
+
+    choice = input("选择运行模式:\n1. 单次检测\n2. 持续监控\n3. 推送监控(K线收盘即检测)\n请输入选择 (1/2/3): ")
+
+    if choice == "1":
+        return run_once(detector)
+    elif choice == "2":
+        interval = input("输入检测间隔(秒，默认300): ")
+        interval = int(interval) if interval.isdigit() else 300
+        detector.start_monitoring(interval)
+    elif choice == "3":
+        detector.start_streaming()
+    else:
+        print("无效选择")
+        return 1
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="币安趋势反转检测系统（不带子命令时进入交互式菜单）")
+    parser.add_argument('--config', default='trading_config.json')
+    parser.add_argument('--base-url', help="币安接口地址，默认 https://api.binance.com")
+    subparsers = parser.add_subparsers(dest='command')
+
+    subparsers.add_parser('once', help="检测一轮后退出（适合cron定时执行）")
+
+    monitor = subparsers.add_parser('monitor', help="按固定间隔持续检测")
+    monitor.add_argument('--interval', type=int, help="检测间隔（秒），默认取notification_settings.check_interval或300")
+
+    subparsers.add_parser('schedule', help="按K线收盘对齐检测（交易所服务器时间，收盘后几秒内检测）")
+
+    stream = subparsers.add_parser('stream', help="推送监控：K线收盘即检测")
+    stream.add_argument('--interval', default='1h', help="K线周期")
+    stream.add_argument('--intrabar', action='store_true', help="未收盘K线的推送也参与检测")
+
+    # 以下两个子命令把其余参数原样交给history_downloader.py / backtest.py
+    subparsers.add_parser('backfill', add_help=False,
+                          help="批量下载或导入历史K线，参数同 history_downloader.py（省略download）")
+    subparsers.add_parser('backtest', add_help=False, help="用本地K线回测，参数同 backtest.py")
+    return parser
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+
+    if args.command == 'backfill':
+        import history_downloader
+
+        if not rest or rest[0] not in ('download', 'import', '-h', '--help'):
+            rest = ['download'] + rest
+        if rest[0] == 'download' and '--config' not in rest:
+            rest += ['--config', args.config]
+        if args.base_url:
+            if rest[0] == 'import':
+                parser.error("backfill import只导入本地归档文件，不支持--base-url")
+            if rest[0] == 'download' and '--base-url' not in rest:
+                rest += ['--base-url', args.base_url]
+        return history_downloader.main(rest) or 0
+    if args.command == 'backtest':
+        import backtest
+
+        if args.base_url:
+            parser.error("backtest只读取本地K线存储，不访问币安接口，不支持--base-url")
+        if '--config' not in rest:
+            rest += ['--config', args.config]
+        return backtest.main(rest) or 0
+    if rest:
+        parser.error(f"无法识别的参数: {' '.join(rest)}")
+
+    detector = make_detector(args.config, args.base_url)
+    if args.command == 'once':
+        return run_once(detector)
+    if args.command == 'monitor':
+        detector.start_monitoring(args.interval or detector.cycle_interval or 300)
+        return 0
+    if args.command == 'schedule':
+        detector.start_scheduled()
+        return 0
+    if args.command == 'stream':
+        detector.start_streaming(args.interval, args.intrabar)
+        return 0
+    return interactive(detector)
+
+
+# 示例：
+#   python cli.py once                       # cron: */5 * * * * cd /path/to/bianmac && python cli.py once
+#   python cli.py monitor --interval 300
+#   python cli.py schedule
+#   python cli.py backfill --interval 1m --start 2024-01-01
+#   python cli.py backtest --grid grid.json
+if __name__ == "__main__":
+    sys.exit(main())
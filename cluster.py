@@ -0,0 +1,526 @@
+import os
+import json
+import time
+import socket
+import hashlib
+import argparse
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple
+
+from metrics import REGISTRY, record_cycle
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 9200
+CLUSTER_WORKERS = REGISTRY.gauge('cluster_workers', "在线的检测工作进程数量")
+CLUSTER_REBALANCES = REGISTRY.counter('cluster_rebalances_total', "分片重新分配的次数")
+
+
+def shard_owner(symbol: str, workers: List[str]) -> Optional[str]:
+    """最高随机权重（rendezvous）哈希：工作进程增减时只有它自己的交易对需要迁移"""
+    best, best_score = None, b''
+    for worker in workers:
+        score = hashlib.md5(f"{worker}|{symbol}".encode()).digest()
+        if best is None or score > best_score:
+            best, best_score = worker, score
+    return best
+
+
+def partition(symbols: List[str], workers: List[str]) -> Dict[str, List[str]]:
+    shards = {worker: [] for worker in workers}
+    if not workers:
+        return shards
+    for symbol in symbols:
+        shards[shard_owner(symbol, workers)].append(symbol)
+    return shards
+
+
+class _Connection:
+    """一条按行分隔的JSON消息连接，发送加锁以便多个线程共用"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = sock.makefile('rb')
+        self._send_lock = threading.Lock()
+
+    def send(self, message: Dict):
+        data = json.dumps(message, ensure_ascii=False, default=float).encode() + b"\n"
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def receive(self) -> Optional[Dict]:
+        """读取一条消息，连接关闭时返回None"""
+        line = self._reader.readline()
+        if not line:
+            return None
+        return json.loads(line)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class _WorkerHandle:
+    __slots__ = ('worker_id', 'conn', 'last_seen', 'symbols')
+
+    def __init__(self, worker_id: str, conn: _Connection):
+        self.worker_id = worker_id
+        self.conn = conn
+        self.last_seen = time.time()
+        self.symbols: List[str] = []
+
+
+class ClusterCoordinator:
+    """协调进程 - 把交易对按哈希分片给各工作进程，汇总检测结果后由本进程统一去重和发送通知
+
+    协议是TCP上按行分隔的JSON，工作进程可以在本机也可以在其他主机（各自使用自己IP的请求权重额度）。
+    工作进程心跳超时或断开后，它的交易对重新分配给其余工作进程，本轮未完成的部分立即补检。
+    """
+
+    def __init__(self, detector, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 heartbeat_timeout: float = 15.0, cycle_timeout: float = 120.0, token: str = ''):
+        # detector提供select_symbols、handle_signal和flush_notifications（信号去重与通知）
+        self.detector = detector
+        self.heartbeat_timeout = heartbeat_timeout
+        self.cycle_timeout = cycle_timeout
+        self.token = token
+
+        self._server = socket.create_server((host, port))
+        self.address: Tuple[str, int] = self._server.getsockname()[:2]
+        self._workers: Dict[str, _WorkerHandle] = {}
+        self._cond = threading.Condition()
+        self._running = False
+
+        self.cycle = 0
+        self._membership: List[str] = []
+        self._outstanding: Dict[str, Set[str]] = {}  # 本轮各工作进程尚未返回结果的交易对
+        self._seen: Set[Tuple[str, str]] = set()       # 本轮已处理的(交易对, 周期)，丢弃补检产生的重复结果
+        self.stats = {'results': 0, 'duplicates': 0, 'reassigned': 0}
+
+    @property
+    def workers(self) -> List[str]:
+        with self._cond:
+            return sorted(self._workers)
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._watchdog, daemon=True).start()
+        logger.info(f"协调进程已启动: {self.address[0]}:{self.address[1]}")
+        return self
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            handles = list(self._workers.values())
+        for handle in handles:
+            try:
+                handle.conn.send({'type': 'stop'})
+            except OSError:
+                pass
+            handle.conn.close()
+        self._server.close()
+
+    def wait_for_workers(self, count: int, timeout: float = 30.0) -> bool:
+        deadline = time.time() + timeout
+        with self._cond:
+            while len(self._workers) < count:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # ---- 连接与成员管理 ----
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                sock, address = self._server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(sock, address), daemon=True).start()
+
+    def _serve(self, sock: socket.socket, address):
+        conn = _Connection(sock)
+        worker_id = None
+        try:
+            hello = conn.receive()
+            if not hello or hello.get('type') != 'hello' or hello.get('token', '') != self.token:
+                logger.warning(f"拒绝来自{address}的连接")
+                conn.close()
+                return
+            worker_id = hello['worker_id']
+            with self._cond:
+                previous = self._workers.get(worker_id)
+                self._workers[worker_id] = _WorkerHandle(worker_id, conn)
+                CLUSTER_WORKERS.set(len(self._workers))
+                self._cond.notify_all()
+            if previous is not None:
+                previous.conn.close()
+            logger.info(f"工作进程加入: {worker_id} ({address[0]})，当前 {len(self.workers)} 个")
+
+            while True:
+                message = conn.receive()
+                if message is None:
+                    break
+                self._on_message(worker_id, message)
+        except (OSError, ValueError) as e:
+            logger.warning(f"工作进程{worker_id or address}连接异常: {e}")
+        finally:
+            if worker_id is not None:
+                self._remove_worker(worker_id, conn, "连接断开")
+
+    def _watchdog(self):
+        while self._running:
+            time.sleep(1.0)
+            now = time.time()
+            with self._cond:
+                expired = [(h.worker_id, h.conn) for h in self._workers.values()
+                           if now - h.last_seen > self.heartbeat_timeout]
+            for worker_id, conn in expired:
+                self._remove_worker(worker_id, conn, "心跳超时")
+                conn.close()
+
+    def _remove_worker(self, worker_id: str, conn: _Connection, reason: str):
+        # 整个重新分配过程持有锁（可重入），run_cycle不会在补检任务登记前误以为本轮已完成
+        with self._cond:
+            handle = self._workers.get(worker_id)
+            if handle is None or handle.conn is not conn:
+                return
+            del self._workers[worker_id]
+            CLUSTER_WORKERS.set(len(self._workers))
+            orphaned = self._outstanding.pop(worker_id, set())
+            survivors = sorted(self._workers)
+            if not self._running:
+                return
+            logger.warning(f"工作进程离开: {worker_id}（{reason}），剩余 {len(survivors)} 个")
+
+            if orphaned and survivors:
+                # 本轮尚未完成的交易对立即交给新的归属进程补检
+                for owner, symbols in partition(sorted(orphaned), survivors).items():
+                    if symbols:
+                        self._dispatch(owner, symbols, reassigned=True)
+                self.stats['reassigned'] += len(orphaned)
+            elif orphaned:
+                logger.error(f"没有可用的工作进程，本轮 {len(orphaned)} 个交易对未检测")
+            self._cond.notify_all()
+
+    # ---- 检测轮次 ----
+
+    def _dispatch(self, worker_id: str, symbols: List[str], reassigned: bool = False):
+        with self._cond:
+            handle = self._workers.get(worker_id)
+            if handle is None:
+                return
+            if set(symbols) != set(handle.symbols) and not reassigned:
+                handle.symbols = list(symbols)
+                assign = {'type': 'assign', 'symbols': handle.symbols}
+            else:
+                assign = None
+            self._outstanding.setdefault(worker_id, set()).update(symbols)
+            cycle = self.cycle
+        try:
+            if assign:
+                handle.conn.send(assign)
+            handle.conn.send({'type': 'run', 'cycle': cycle, 'symbols': symbols})
+        except OSError as e:
+            logger.warning(f"向{worker_id}发送任务失败: {e}")
+            handle.conn.close()
+
+    def _on_message(self, worker_id: str, message: Dict):
+        kind = message.get('type')
+        with self._cond:
+            handle = self._workers.get(worker_id)
+            if handle is not None:
+                handle.last_seen = time.time()
+        if kind == 'heartbeat':
+            return
+
+        if kind == 'result':
+            if message.get('cycle') != self.cycle:
+                return
+            symbol, interval = message['symbol'], message['interval']
+            # 多周期模式下一个交易对有多条结果，收到该交易对的done后才算完成，
+            # 工作进程在发完全部周期前断开时，整个交易对会被重新分配（已处理的周期按_seen去重）
+            with self._cond:
+                duplicate = (symbol, interval) in self._seen
+                self._seen.add((symbol, interval))
+                if duplicate:
+                    self.stats['duplicates'] += 1
+                else:
+                    self.stats['results'] += 1
+            if not duplicate and message.get('signal') is not None:
+                self.detector.handle_signal(symbol, message['signal'], interval)
+            return
+
+        if kind == 'done':
+            if message.get('cycle') != self.cycle:
+                return
+            with self._cond:
+                outstanding = self._outstanding.get(worker_id, set())
+                outstanding.difference_update(message.get('symbols', []))
+                if not outstanding:
+                    self._outstanding.pop(worker_id, None)
+                self._cond.notify_all()
+
+    def run_cycle(self) -> Dict:
+        """执行一轮分布式检测：按当前成员分片、下发、等待全部结果，然后统一发送通知"""
+        # 配置文件的交易对列表变化时，新的分片在下面下发，工作进程丢弃不再负责的交易对
+        self.detector.reload_config_if_changed()
+        symbols = self.detector.select_symbols()
+        started = time.time()
+        with self._cond:
+            # 下发期间持有锁：工作进程此时离开，它的分片会在登记后立即被重新分配
+            workers = sorted(self._workers)
+            if not workers:
+                logger.error("没有在线的工作进程，跳过本轮检测")
+                return {'symbols': 0, 'workers': 0, 'seconds': 0.0}
+            self.cycle += 1
+            self._outstanding = {}
+            self._seen = set()
+            if workers != self._membership:
+                if self._membership:
+                    CLUSTER_REBALANCES.inc()
+                    logger.info(f"工作进程变化，重新分片: {len(self._membership)} -> {len(workers)} 个")
+                self._membership = workers
+            for worker_id, shard in partition(symbols, workers).items():
+                self._dispatch(worker_id, shard)
+
+        deadline = started + self.cycle_timeout
+        with self._cond:
+            while any(self._outstanding.values()):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    missing = sum(len(s) for s in self._outstanding.values())
+                    logger.warning(f"第{self.cycle}轮检测超时，{missing} 个交易对没有返回结果")
+                    break
+                self._cond.wait(min(remaining, 1.0))
+
+        self.detector.flush_notifications()
+        elapsed = time.time() - started
+        record_cycle('cluster', elapsed, len(symbols), self.detector.cycle_interval)
+        logger.info(f"第{self.cycle}轮分布式检测完成: {len(workers)} 个工作进程，{len(symbols)} 个交易对，"
+                    f"耗时 {elapsed:.1f} 秒")
+        return {'symbols': len(symbols), 'workers': len(workers), 'seconds': elapsed}
+
+    def start_monitoring(self, interval: int = 300):
+        logger.info(f"开始分布式监控，检测间隔: {interval}秒")
+        self.detector.cycle_interval = interval
+        try:
+            while True:
+                try:
+                    self.run_cycle()
+                except Exception as e:
+                    logger.error(f"分布式检测出错: {e}")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            logger.info("监控已停止")
+        finally:
+            self.stop()
+            self.detector.dispatcher.stop()
+
+
+class ClusterWorker:
+    """工作进程 - 只检测分配给自己的交易对，把结果发回协调进程，不发送通知"""
+
+    def __init__(self, detector, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 worker_id: str = None, heartbeat_interval: float = 5.0, token: str = ''):
+        self.detector = detector
+        self.address = (host, port)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.token = token
+        self.symbols: List[str] = []
+        self._conn: Optional[_Connection] = None
+        self._stopped = threading.Event()
+        self._jobs = ThreadPoolExecutor(max_workers=1)  # 同一时间只执行一轮（补检任务排队）
+
+    def _heartbeat(self, conn: _Connection):
+        while not self._stopped.is_set() and self._conn is conn:
+            try:
+                conn.send({'type': 'heartbeat'})
+            except OSError:
+                return
+            self._stopped.wait(self.heartbeat_interval)
+
+    def _assign(self, symbols: List[str]):
+        """分片变化时丢弃不再负责的交易对的指标状态"""
+        removed = set(self.symbols) - set(symbols)
+        self.detector.evict_symbols(removed)
+        self.symbols = list(symbols)
+        self.detector.symbols = self.symbols
+        logger.info(f"分配到 {len(symbols)} 个交易对（移除 {len(removed)} 个）")
+
+    def _analyze(self, symbol: str) -> Dict[str, Optional[Dict]]:
+        detector = self.detector
+        if detector.timeframes:
+            return detector.analyze_symbol_timeframes(symbol)
+        return {'1h': detector.analyze_symbol(symbol)}
+
+    def _run(self, conn: _Connection, cycle: int, symbols: List[str]):
+        detector = self.detector
+        started = time.time()
+        if detector.reload_config_if_changed():
+            # 阈值和规则取新配置，交易对仍以协调进程的分配为准
+            detector.symbols = self.symbols
+        if detector.timeframes:
+            new_symbols = [symbol for symbol in symbols if symbol not in detector.resamplers]
+            if new_symbols:
+                detector._warm_up_timeframes(new_symbols)
+
+        with ThreadPoolExecutor(max_workers=detector.max_workers) as executor:
+            futures = {executor.submit(self._analyze, symbol): symbol for symbol in symbols}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    logger.error(f"处理{symbol}时出错: {e}")
+                    results = {}
+                for interval, signal_data in results.items():
+                    conn.send({'type': 'result', 'cycle': cycle, 'symbol': symbol,
+                               'interval': interval, 'signal': signal_data})
+                # 该交易对的全部周期已发出
+                conn.send({'type': 'done', 'cycle': cycle, 'symbols': [symbol]})
+        logger.info(f"第{cycle}轮完成 {len(symbols)} 个交易对，耗时 {time.time() - started:.1f} 秒")
+
+    def _session(self, conn: _Connection):
+        conn.send({'type': 'hello', 'worker_id': self.worker_id, 'token': self.token})
+        threading.Thread(target=self._heartbeat, args=(conn,), daemon=True).start()
+        while True:
+            message = conn.receive()
+            if message is None:
+                return
+            kind = message.get('type')
+            if kind == 'assign':
+                self._assign(message['symbols'])
+            elif kind == 'run':
+                self._jobs.submit(self._run_safely, conn, message['cycle'], message['symbols'])
+            elif kind == 'stop':
+                self._stopped.set()
+                return
+
+    def _run_safely(self, conn: _Connection, cycle: int, symbols: List[str]):
+        try:
+            self._run(conn, cycle, symbols)
+        except OSError as e:
+            logger.warning(f"发送第{cycle}轮结果失败: {e}")
+        except Exception as e:
+            logger.error(f"第{cycle}轮检测出错: {e}")
+
+    def run(self):
+        """连接协调进程并处理任务，连接断开后退避重连，直到收到stop"""
+        delay = 1.0
+        while not self._stopped.is_set():
+            try:
+                sock = socket.create_connection(self.address, timeout=10)
+                sock.settimeout(None)
+            except OSError as e:
+                logger.warning(f"连接协调进程{self.address[0]}:{self.address[1]}失败({e})，{delay:.0f}秒后重试")
+                self._stopped.wait(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+
+            delay = 1.0
+            conn = _Connection(sock)
+            self._conn = conn
+            logger.info(f"已连接协调进程，工作进程ID {self.worker_id}")
+            try:
+                self._session(conn)
+            except (OSError, ValueError) as e:
+                logger.warning(f"与协调进程的连接中断: {e}")
+            finally:
+                self._conn = None
+                conn.close()
+        self._jobs.shutdown(wait=False)
+
+    def stop(self):
+        self._stopped.set()
+        if self._conn is not None:
+            self._conn.close()
+
+
+def run_worker(host: str, port: int, config_file: str = 'trading_config.json', worker_id: str = None,
+               token: str = '', base_url: str = None, heartbeat_interval: float = 5.0):
+    """工作进程入口：按配置创建检测器（只用于抓取和计算），连接协调进程"""
+    from binance_trend_detector import BinanceTrendDetector
+
+    detector = BinanceTrendDetector()
+    detector.load_config(config_file)
+    if base_url:
+        detector.base_url = base_url
+    # 通知和信号状态由协调进程负责
+    detector.signal_state.path = None
+    ClusterWorker(detector, host, port, worker_id, heartbeat_interval, token).run()
+
+
+def spawn_local_workers(count: int, host: str, port: int, config_file: str = 'trading_config.json',
+                        token: str = '', base_url: str = None) -> List[multiprocessing.Process]:
+    """在本机启动count个工作进程"""
+    processes = []
+    for i in range(count):
+        process = multiprocessing.Process(
+            target=run_worker, args=(host, port, config_file, f"{socket.gethostname()}-w{i}", token, base_url),
+            daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def load_cluster_settings(config_file: str = 'trading_config.json') -> Dict:
+    """读取配置文件中的cluster部分，缺省项使用默认值"""
+    settings = {'host': '127.0.0.1', 'port': DEFAULT_PORT, 'local_workers': 0,
+                'heartbeat_interval': 5, 'heartbeat_timeout': 15, 'cycle_timeout': 120, 'token': ''}
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f).get('cluster', {}))
+    except (OSError, ValueError) as e:
+        logger.error(f"读取集群配置失败: {e}")
+    return settings
+
+
+# 使用示例：
+#   python cluster.py coordinator --local-workers 4        # 本机4个工作进程
+#   python cluster.py coordinator --host 0.0.0.0           # 等待其他主机上的工作进程连接
+#   python cluster.py worker --connect 10.0.0.5:9200       # 在另一台主机上启动工作进程
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="分布式检测：协调进程 / 工作进程（未指定的参数取配置文件的cluster部分）")
+    parser.add_argument('role', choices=['coordinator', 'worker'])
+    parser.add_argument('--config', default='trading_config.json')
+    parser.add_argument('--host', help="协调进程监听的地址")
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--connect', help="工作进程要连接的协调进程 host:port")
+    parser.add_argument('--local-workers', type=int, help="协调进程同时在本机启动的工作进程数")
+    parser.add_argument('--interval', type=int, help="检测间隔（秒），默认取notification_settings.check_interval")
+    args = parser.parse_args()
+
+    settings = load_cluster_settings(args.config)
+    host = args.host or settings['host']
+    port = args.port or settings['port']
+    token = os.environ.get('CLUSTER_TOKEN', settings['token'])
+
+    if args.role == 'worker':
+        if args.connect:
+            host, _, port = args.connect.rpartition(':')
+        run_worker(host, int(port), args.config, token=token, heartbeat_interval=settings['heartbeat_interval'])
+    else:
+        from binance_trend_detector import BinanceTrendDetector
+
+        detector = BinanceTrendDetector()
+        detector.load_config(args.config)
+        coordinator = ClusterCoordinator(detector, host, port, heartbeat_timeout=settings['heartbeat_timeout'],
+                                         cycle_timeout=settings['cycle_timeout'], token=token).start()
+        local_workers = settings['local_workers'] if args.local_workers is None else args.local_workers
+        if local_workers:
+            spawn_local_workers(local_workers, '127.0.0.1', coordinator.address[1], args.config, token)
+            coordinator.wait_for_workers(local_workers)
+        coordinator.start_monitoring(args.interval or detector.cycle_interval or 300)
@@ -0,0 +1,83 @@
+import os
+import json
+import logging
+from typing import Dict, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CONFIG_RELOADS = REGISTRY.counter('config_reloads_total', "配置文件热加载次数", ['result'])
+
+
+class ConfigWatcher:
+    """按修改时间轮询配置文件
+
+    每次poll()只做一次os.stat，(修改时间, 大小, inode)变化时才重新读取；编辑器“写临时文件再改名”
+    的保存方式会换inode，同样能检测到。内容不是合法JSON时（如保存到一半）记录错误并返回None，
+    文件再次修改后重新读取。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._stamp = self._read_stamp()
+
+    def _read_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def poll(self) -> Optional[Dict]:
+        """文件变化且能解析时返回新的配置，否则返回None"""
+        stamp = self._read_stamp()
+        if stamp is None or stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            CONFIG_RELOADS.inc(result='invalid')
+            logger.error(f"配置文件{self.path}无法解析，继续使用当前配置: {e}")
+            return None
+        if not isinstance(config, dict):
+            CONFIG_RELOADS.inc(result='invalid')
+            logger.error(f"配置文件{self.path}的顶层必须是对象，继续使用当前配置")
+            return None
+        return config
+
+
+def diff_symbols(before, after) -> Tuple[list, list]:
+    """返回(新增的交易对, 移除的交易对)，按名称排序"""
+    before, after = set(before), set(after)
+    return sorted(after - before), sorted(before - after)
+
+
+# 演示：修改临时配置文件后poll()返回新配置，未修改时返回None
+if __name__ == "__main__":
+    import time
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'trading_config.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'watch_list': ['BTCUSDT', 'ETHUSDT']}, f)
+        watcher = ConfigWatcher(path)
+        print("未修改:", watcher.poll())
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'watch_list': ['BTCUSDT', 'SOLUSDT', 'ADAUSDT']}, f)
+        config = watcher.poll()
+        print("修改后:", config, "新增/移除:", diff_symbols(['BTCUSDT', 'ETHUSDT'], config['watch_list']))
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"watch_list": [')
+        print("保存到一半:", watcher.poll())
+
+        started = time.perf_counter()
+        for _ in range(10000):
+            watcher.poll()
+        print(f"未变化时每次轮询 {(time.perf_counter() - started) / 10000 * 1e6:.1f} µs")
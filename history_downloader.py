@@ -0,0 +1,282 @@
+import os
+import re
+import io
+import time
+import zipfile
+import argparse
+import threading
+import logging
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from kline_store import KlineStore, interval_to_ms, INTERVAL_MS, ROW_WIDTH, OPEN_TIME, CLOSE_TIME
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000  # /api/v3/klines单次最多返回1000根
+
+# 币安历史数据归档文件名，如 BTCUSDT-1m-2024-01.zip / BTCUSDT-1h-2024-01-15.csv
+ARCHIVE_PATTERN = re.compile(r'^(?P<symbol>[A-Z0-9]+)-(?P<interval>\d+[smhdwM])-(?P<date>[\d-]+)\.(?P<ext>zip|csv)$')
+
+
+def parse_date(value: str) -> int:
+    """YYYY-MM-DD（UTC）转毫秒时间戳"""
+    return int(datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def validate_klines(rows: np.ndarray, interval_ms: int) -> Dict:
+    """检查K线的缺口、重复和未对齐的开盘时间"""
+    if len(rows) == 0:
+        return {'bars': 0, 'gaps': [], 'missing_bars': 0, 'duplicates': 0, 'misaligned': 0}
+
+    open_times = rows[:, OPEN_TIME]
+    steps = np.diff(open_times)
+    gap_index = np.flatnonzero(steps > interval_ms)
+    gaps = [(int(open_times[i] + interval_ms), int(open_times[i + 1] - interval_ms)) for i in gap_index]
+    return {
+        'bars': len(rows),
+        'gaps': gaps,
+        'missing_bars': int(np.sum((steps[gap_index] // interval_ms) - 1)),
+        'duplicates': int(np.sum(steps == 0)),
+        'misaligned': int(np.sum(open_times % interval_ms != 0)) if interval_ms < 604_800_000 else 0,
+    }
+
+
+class _OrderedWriter:
+    """按页序号顺序写入存储，保证文件里的数据始终连续，中断后可从断点续传
+
+    buffered为True时用于补齐已存数据之前的历史：页序号从紧挨已存数据的一页往前编号，
+    连续完成的页先缓存，最后一次写入（往文件开头插入需要整体重写，逐页写入代价太高）。
+    """
+
+    def __init__(self, store: KlineStore, symbol: str, interval: str, buffered: bool = False):
+        self.store = store
+        self.symbol = symbol
+        self.interval = interval
+        self.buffered = buffered
+        self.next_page = 0
+        self.pending: Dict[int, np.ndarray] = {}
+        self.ready: List[np.ndarray] = []
+        self.written = 0
+        self.lock = threading.Lock()
+
+    def add(self, page: int, rows: np.ndarray):
+        with self.lock:
+            self.pending[page] = rows
+            while self.next_page in self.pending:
+                rows = self.pending.pop(self.next_page)
+                if self.buffered:
+                    self.ready.append(rows)
+                else:
+                    self.written += self.store.upsert(self.symbol, self.interval, rows)
+                self.next_page += 1
+
+    def flush(self):
+        with self.lock:
+            if self.ready:
+                self.written += self.store.upsert(self.symbol, self.interval, np.concatenate(self.ready))
+                self.ready = []
+
+
+def _page_ranges(begin_ms: int, end_ms: int, step: int) -> List[tuple]:
+    """把[begin_ms, end_ms]按PAGE_SIZE根K线切分为(开始, 结束)列表"""
+    ranges = []
+    page_start = begin_ms - begin_ms % step
+    while page_start <= end_ms:
+        ranges.append((page_start, min(page_start + PAGE_SIZE * step - 1, end_ms)))
+        page_start += PAGE_SIZE * step
+    return ranges
+
+
+class HistoryDownloader:
+    """批量历史K线下载 - 按1000根分页，多线程并发，受请求权重预算控制"""
+
+    def __init__(self, detector, store: KlineStore = None, workers: int = 8):
+        # detector提供带权重预算和连接池的request_kline_rows
+        self.detector = detector
+        self.store = store or detector.kline_store or KlineStore()
+        self.workers = workers
+
+    def _fetch_page(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> np.ndarray:
+        return self.detector.request_kline_rows({
+            'symbol': symbol,
+            'interval': interval,
+            'startTime': start_ms,
+            'endTime': end_ms,
+            'limit': PAGE_SIZE,
+        })
+
+    def download(self, symbols: List[str], interval: str, start_ms: int,
+                 end_ms: Optional[int] = None) -> Dict[str, Dict]:
+        """下载[start_ms, end_ms]内的K线；已存储的部分自动跳过，只下载已存数据之前和之后缺少的部分（断点续传）"""
+        step = interval_to_ms(interval)
+        end_ms = end_ms or int(time.time() * 1000)
+        started = time.time()
+
+        writers = {}
+        tasks = []
+        for symbol in symbols:
+            first = self.store.first_row(symbol, interval)
+            last = self.store.last_row(symbol, interval)
+            segments = []
+            if first is not None and first[OPEN_TIME] > start_ms:
+                # 已存数据之前的历史：从紧挨已存数据的一页往前下载，中断后已写入的部分仍与已存数据相连
+                head_end = min(int(first[OPEN_TIME]) - 1, end_ms)
+                segments.append(('head', _page_ranges(start_ms, head_end, step)[::-1]))
+            begin = start_ms
+            if last is not None and last[OPEN_TIME] >= start_ms:
+                # 从最后一根已存K线开始，顺便覆盖可能未收盘的那一根
+                begin = int(last[OPEN_TIME])
+            segments.append(('tail', _page_ranges(begin, end_ms, step)))
+
+            for segment, ranges in segments:
+                writers[(symbol, segment)] = _OrderedWriter(self.store, symbol, interval,
+                                                            buffered=segment == 'head')
+                for page, (page_start, page_end) in enumerate(ranges):
+                    tasks.append((symbol, segment, page, page_start, page_end))
+
+        logger.info(f"开始下载 {len(symbols)} 个交易对的 {interval} K线，共 {len(tasks)} 页")
+        failed = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._fetch_page, symbol, interval, page_start, page_end):
+                       (symbol, segment, page) for symbol, segment, page, page_start, page_end in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                symbol, segment, page = futures[future]
+                try:
+                    writers[(symbol, segment)].add(page, future.result())
+                except Exception as e:
+                    # 失败页之后的数据不会写入，下次运行会从断点继续
+                    failed.setdefault(symbol, page)
+                    logger.error(f"下载{symbol}第{page}页失败: {e}")
+                if done % 100 == 0:
+                    logger.info(f"已完成 {done}/{len(tasks)} 页")
+
+        for writer in writers.values():
+            writer.flush()
+
+        report = {}
+        for symbol in symbols:
+            report[symbol] = validate_klines(np.asarray(self.store.load(symbol, interval)), step)
+            report[symbol]['written'] = sum(writer.written for (name, _), writer in writers.items()
+                                            if name == symbol)
+            if symbol in failed:
+                report[symbol]['failed_page'] = failed[symbol]
+
+        bars = sum(item['written'] for item in report.values())
+        elapsed = time.time() - started
+        logger.info(f"下载完成：新增 {bars} 根K线，耗时 {elapsed:.1f} 秒 ({bars / max(elapsed, 1e-9):.0f} 根/秒)")
+        return report
+
+
+def read_archive_file(path: str) -> np.ndarray:
+    """读取币安历史数据归档（zip或csv），返回KlineStore行格式"""
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            name = next(n for n in archive.namelist() if n.endswith('.csv'))
+            content = archive.read(name)
+    else:
+        with open(path, 'rb') as f:
+            content = f.read()
+
+    # 新版归档带表头
+    first_line = content.split(b'\n', 1)[0]
+    header = 0 if first_line[:1].isalpha() else None
+    import pandas as pd
+
+    df = pd.read_csv(io.BytesIO(content), header=header, usecols=range(ROW_WIDTH))
+    rows = df.to_numpy(dtype=np.float64)
+
+    # 2025年起现货归档的时间戳是微秒
+    if len(rows) and rows[0, OPEN_TIME] > 1e14:
+        rows[:, OPEN_TIME] = np.floor(rows[:, OPEN_TIME] / 1000)
+        rows[:, CLOSE_TIME] = np.floor(rows[:, CLOSE_TIME] / 1000)
+    return rows
+
+
+def import_archives(directory: str, store: KlineStore) -> Dict[str, Dict]:
+    """导入目录下的全部归档文件，按交易对/周期写入存储"""
+    imported: Dict[tuple, int] = {}
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            match = ARCHIVE_PATTERN.match(filename)
+            if not match:
+                continue
+            symbol, interval = match.group('symbol'), match.group('interval')
+            if interval not in INTERVAL_MS:
+                # 如1s：检测和校验都不支持，写入存储也用不上
+                logger.warning(f"跳过{filename}: 不支持的K线周期 {interval}")
+                continue
+            try:
+                rows = read_archive_file(os.path.join(root, filename))
+                key = (symbol, interval)
+                imported[key] = imported.get(key, 0) + store.upsert(symbol, interval, rows)
+                logger.info(f"已导入 {filename}: {len(rows)} 根K线")
+            except Exception as e:
+                logger.error(f"导入{filename}失败: {e}")
+
+    report = {}
+    for (symbol, interval), written in imported.items():
+        stats = validate_klines(np.asarray(store.load(symbol, interval)), interval_to_ms(interval))
+        stats['written'] = written
+        report[f"{symbol} {interval}"] = stats
+    return report
+
+
+def format_report(report: Dict[str, Dict]) -> str:
+    lines = []
+    for name, stats in report.items():
+        line = (f"{name}: 共{stats['bars']}根, 本次新增{stats['written']}根, "
+                f"缺口{len(stats['gaps'])}处(缺{stats['missing_bars']}根), "
+                f"重复{stats['duplicates']}, 未对齐{stats['misaligned']}")
+        if 'failed_page' in stats:
+            line += f", 第{stats['failed_page']}页下载失败"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量下载或导入历史K线")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    download = subparsers.add_parser('download', help="通过REST分页下载")
+    download.add_argument('--config', default='trading_config.json')
+    download.add_argument('--symbols', nargs='*', help="默认使用配置文件中的全部交易对")
+    download.add_argument('--interval', default='1h')
+    download.add_argument('--start', required=True, help="开始日期 YYYY-MM-DD (UTC)")
+    download.add_argument('--end', help="结束日期 YYYY-MM-DD (UTC)，默认到当前")
+    download.add_argument('--workers', type=int, default=8)
+    download.add_argument('--base-url', help="币安接口地址，默认 https://api.binance.com")
+
+    importer = subparsers.add_parser('import', help="导入data.binance.vision的zip/csv归档")
+    importer.add_argument('directory')
+
+    for sub in (download, importer):
+        sub.add_argument('--data-dir', default='kline_data')
+
+    args = parser.parse_args(argv)
+    store = KlineStore(args.data_dir)
+
+    if args.command == 'import':
+        print(format_report(import_archives(args.directory, store)))
+        return
+
+    from binance_trend_detector import BinanceTrendDetector
+
+    detector = BinanceTrendDetector()
+    detector.load_config(args.config)
+    detector.kline_store = store
+    if args.base_url:
+        detector.base_url = args.base_url.rstrip('/')
+    symbols = args.symbols or sorted(detector.symbols)
+    end_ms = parse_date(args.end) if args.end else None
+    report = HistoryDownloader(detector, store, args.workers).download(
+        symbols, args.interval, parse_date(args.start), end_ms)
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
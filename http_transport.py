@@ -0,0 +1,227 @@
+import time
+import random
+import threading
+import logging
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+# 当前线程正在进行的请求的建连耗时（由连接类在connect时累加）
+_request_timing = threading.local()
+
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+# 重复发送没有副作用的方法；其余方法（如发送通知的POST）只在请求确定没有发出时重试，避免重复推送
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+
+def _not_sent(error: Exception) -> bool:
+    """连接阶段的失败（建连超时、连接被拒绝、域名解析失败），请求还没有发出"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def _record_connect(seconds: float):
+    _request_timing.connect = getattr(_request_timing, 'connect', 0.0) + seconds
+    _request_timing.new_connections = getattr(_request_timing, 'new_connections', 0) + 1
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _record_connect(time.perf_counter() - started)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        # HTTPS的connect包含TCP建连和TLS握手
+        started = time.perf_counter()
+        super().connect()
+        _record_connect(time.perf_counter() - started)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class LatencyStats:
+    """请求延迟统计 - 区分建连耗时和服务端耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def record(self, host: str, connect_seconds: float, total_seconds: float,
+               new_connections: int, failed: bool = False):
+        with self._lock:
+            stats = self._hosts.setdefault(host, {
+                'requests': 0, 'new_connections': 0, 'errors': 0,
+                'connect_seconds': 0.0, 'server_seconds': 0.0,
+            })
+            stats['requests'] += 1
+            stats['new_connections'] += new_connections
+            stats['connect_seconds'] += connect_seconds
+            stats['server_seconds'] += max(total_seconds - connect_seconds, 0.0)
+            if failed:
+                stats['errors'] += 1
+
+    def snapshot(self, reset: bool = False) -> Dict[str, Dict]:
+        """返回各主机的累计统计，reset=True时清零（用于按周期统计）"""
+        with self._lock:
+            hosts = {host: dict(stats) for host, stats in self._hosts.items()}
+            if reset:
+                self._hosts = {}
+        return hosts
+
+    def format_summary(self, reset: bool = False) -> str:
+        parts = []
+        for host, stats in self.snapshot(reset).items():
+            count = max(stats['requests'], 1)
+            parts.append(
+                f"{host}: {stats['requests']}次请求, 新建连接{stats['new_connections']}个, "
+                f"建连{stats['connect_seconds'] * 1000:.0f}ms, "
+                f"服务端平均{stats['server_seconds'] / count * 1000:.0f}ms, "
+                f"失败{stats['errors']}次"
+            )
+        return "; ".join(parts) if parts else "无请求"
+
+
+class HttpTransport:
+    """共享HTTP传输层 - 每个主机一个保活连接池，带超时和抖动退避重试"""
+
+    def __init__(self, connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 gzip: bool = True, pool_maxsize: int = 16):
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.gzip = gzip
+        self.pool_maxsize = pool_maxsize
+        self.stats = LatencyStats()
+
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, host: str) -> requests.Session:
+        """获取（或创建）指定主机的会话"""
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = _TimedHTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['Accept-Encoding'] = 'gzip, deflate' if self.gzip else 'identity'
+                self._sessions[host] = session
+            return session
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: 在[0, base*2^attempt]内随机等待，避免多个线程同时重试
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, url: str, retry: Optional[bool] = None, **kwargs) -> requests.Response:
+        """发送请求；连接错误、超时和5xx会在有限次数内退避重试
+
+        retry省略时只有GET/HEAD整体重试，其他方法只重试请求尚未发出的建连失败：读超时或5xx时服务端
+        可能已经处理了请求（如已发出消息）。确定可以重复发送的请求可以传retry=True。
+        """
+        host = urlsplit(url).netloc
+        session = self.session_for(host)
+        kwargs.setdefault('timeout', self.timeout)
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+
+        for attempt in range(self.max_retries + 1):
+            _request_timing.connect = 0.0
+            _request_timing.new_connections = 0
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.stats.record(host, _request_timing.connect, time.perf_counter() - started,
+                                  _request_timing.new_connections, failed=True)
+                if attempt >= self.max_retries or not (retry or _not_sent(e)):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"请求{host}失败({e})，{delay:.2f}秒后重试")
+                time.sleep(delay)
+                continue
+
+            failed = response.status_code in RETRY_STATUS_CODES
+            self.stats.record(host, _request_timing.connect, response.elapsed.total_seconds(),
+                              _request_timing.new_connections, failed=failed)
+            if failed and retry and attempt < self.max_retries:
+                delay = self._backoff(attempt)
+                logger.warning(f"{host}返回{response.status_code}，{delay:.2f}秒后重试")
+                time.sleep(delay)
+                continue
+
+            return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, retry: bool = False, **kwargs) -> requests.Response:
+        return self.request('POST', url, retry=retry, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+_default_transport: Optional[HttpTransport] = None
+_default_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """获取进程内共享的默认传输层"""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = HttpTransport()
+        return _default_transport
+
+
+def configure_transport(settings: dict) -> HttpTransport:
+    """按配置文件中的http_settings重建默认传输层"""
+    global _default_transport
+    transport = HttpTransport(
+        connect_timeout=settings.get('connect_timeout', 3.05),
+        read_timeout=settings.get('read_timeout', 10.0),
+        max_retries=settings.get('max_retries', 3),
+        backoff_base=settings.get('backoff_base', 0.5),
+        backoff_max=settings.get('backoff_max', 8.0),
+        gzip=settings.get('gzip', True),
+        pool_maxsize=settings.get('pool_maxsize', 16),
+    )
+    with _default_lock:
+        previous, _default_transport = _default_transport, transport
+    if previous is not None:
+        previous.close()
+    return transport
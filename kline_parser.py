@@ -0,0 +1,85 @@
+import json
+import logging
+from typing import Optional, Tuple, Union, TYPE_CHECKING
+
+import numpy as np
+
+from kline_store import ROW_WIDTH, OPEN_TIME, OPEN, CLOSE_TIME
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    # 没有orjson时用标准库，去掉引号后同样直接解析为数字，只是慢一些
+    _loads = json.loads
+
+FRAME_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def _decode(payload: Union[bytes, str]) -> list:
+    """解码K线响应体：价格和成交量是带引号的数字字符串，去掉引号后解码器直接得到float，不再逐个转换字符串"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    payload = payload.strip()
+    if not payload.startswith(b'['):
+        # 错误响应，如{"code":-1121,"msg":"Invalid symbol."}
+        raise ValueError(f"K线响应不是数组: {payload[:200].decode(errors='replace')}")
+    return _loads(payload.replace(b'"', b''))
+
+
+def parse_klines(payload: Union[bytes, str], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """把/api/v3/klines的原始响应体解析为KlineStore行格式的float64数组，形状(n, 7)
+
+    只按列写入需要的7个字段；out可以传入预先分配的数组（行数不少于K线根数），返回其前n行。
+    """
+    data = _decode(payload)
+    n = len(data)
+    if out is None:
+        out = np.empty((n, ROW_WIDTH), dtype=np.float64)
+    elif out.shape[0] < n or out.shape[1] != ROW_WIDTH:
+        raise ValueError(f"预分配数组形状{out.shape}不足以容纳 {n} 根K线")
+    for column in range(ROW_WIDTH):
+        out[:n, column] = [row[column] for row in data]
+    return out[:n]
+
+
+def parse_kline_columns(payload: Union[bytes, str],
+                        dtype=np.float32) -> Tuple[np.ndarray, np.ndarray]:
+    """解析为(开盘时间int64数组, 形状(n, 5)的开高低收量数组)，价格可以用float32节省一半内存
+
+    毫秒时间戳超出float32的精度，因此单独以int64保存。
+    """
+    data = _decode(payload)
+    n = len(data)
+    open_time = np.fromiter((row[OPEN_TIME] for row in data), dtype=np.int64, count=n)
+    values = np.empty((n, CLOSE_TIME - OPEN), dtype=dtype)
+    for column in range(OPEN, CLOSE_TIME):
+        values[:, column - OPEN] = [row[column] for row in data]
+    return open_time, values
+
+
+def rows_to_frame(rows: np.ndarray) -> 'pd.DataFrame':
+    """由行格式数组构建get_klines格式的DataFrame（价格列复制一份，不与rows共享内存）"""
+    import pandas as pd
+
+    df = pd.DataFrame(np.array(rows[:, OPEN:CLOSE_TIME]), columns=FRAME_COLUMNS,
+                      index=pd.to_datetime(rows[:, OPEN_TIME].astype(np.int64), unit='ms'))
+    df.index.name = 'timestamp'
+    return df
+
+
+# 与原解析路径（response.json() + rows_from_api）的一致性自检
+if __name__ == "__main__":
+    from kline_store import rows_from_api
+
+    sample = b'[[1499040000000,"0.01634790","0.80000000","0.01575800","0.01577100","148976.11427815",' \
+             b'1499644799999,"2434.19055334",308,"1756.87402397","28.46694368","0"]]'
+    expected = rows_from_api(json.loads(sample))
+    print(f"解码器: {'orjson' if _loads is not json.loads else 'json'}")
+    print(f"parse_klines一致: {np.array_equal(parse_klines(sample), expected)}")
+    print(rows_to_frame(parse_klines(sample)))
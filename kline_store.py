@@ -0,0 +1,138 @@
+import os
+import threading
+import logging
+from typing import Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 每根K线保存的字段，按列顺序存为float64定长记录
+KLINE_FIELDS = ('open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time')
+OPEN_TIME, OPEN, HIGH, LOW, CLOSE, VOLUME, CLOSE_TIME = range(len(KLINE_FIELDS))
+ROW_WIDTH = len(KLINE_FIELDS)
+ROW_BYTES = ROW_WIDTH * 8
+
+# 币安K线周期对应的毫秒数
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000,
+    '8h': 28_800_000, '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000,
+    '1w': 604_800_000,
+}
+
+
+def interval_to_ms(interval: str) -> int:
+    """K线周期转毫秒"""
+    try:
+        return INTERVAL_MS[interval]
+    except KeyError:
+        raise ValueError(f"不支持的K线周期: {interval}")
+
+
+def rows_from_api(data: list) -> np.ndarray:
+    """把/api/v3/klines返回的原始数组转换为存储格式"""
+    if not data:
+        return np.empty((0, ROW_WIDTH))
+    return np.array([row[:ROW_WIDTH] for row in data], dtype=np.float64)
+
+
+class KlineStore:
+    """本地K线存储 - 每个交易对/周期一个按开盘时间排序、可内存映射的定长记录文件"""
+
+    def __init__(self, root: str = 'kline_data'):
+        self.root = root
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, symbol.upper(), f"{interval}.f64")
+
+    def _lock(self, path: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def count(self, symbol: str, interval: str) -> int:
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // ROW_BYTES
+
+    def load(self, symbol: str, interval: str, tail: int = None) -> np.ndarray:
+        """以只读内存映射方式读取K线，形状为(n, 7)；tail指定时只返回最后tail根"""
+        path = self.path(symbol, interval)
+        rows = self.count(symbol, interval)
+        if rows == 0:
+            return np.empty((0, ROW_WIDTH))
+
+        data = np.memmap(path, dtype=np.float64, mode='r', shape=(rows, ROW_WIDTH))
+        if tail is not None:
+            data = data[-tail:]
+        return data
+
+    def first_row(self, symbol: str, interval: str) -> np.ndarray:
+        """第一根已存储的K线，没有数据时返回None"""
+        data = self.load(symbol, interval)
+        return np.array(data[0]) if len(data) else None
+
+    def last_row(self, symbol: str, interval: str) -> np.ndarray:
+        """最后一根已存储的K线，没有数据时返回None"""
+        data = self.load(symbol, interval, tail=1)
+        return np.array(data[0]) if len(data) else None
+
+    def upsert(self, symbol: str, interval: str, rows: np.ndarray) -> int:
+        """写入K线：已存在的开盘时间原地覆盖，新的K线追加到文件末尾，返回新增根数"""
+        if len(rows) == 0:
+            return 0
+
+        rows = np.ascontiguousarray(rows, dtype=np.float64)
+        if np.any(np.diff(rows[:, OPEN_TIME]) <= 0):
+            order = np.argsort(rows[:, OPEN_TIME], kind='stable')
+            rows = rows[order]
+            # 同一开盘时间保留最后出现的一条
+            keep = np.append(rows[1:, OPEN_TIME] != rows[:-1, OPEN_TIME], True)
+            rows = rows[keep]
+
+        path = self.path(symbol, interval)
+        with self._lock(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existing = self.load(symbol, interval)
+
+            if len(existing) == 0:
+                self._write_all(path, rows)
+                return len(rows)
+
+            last_open = existing[-1, OPEN_TIME]
+            newer = rows[rows[:, OPEN_TIME] > last_open]
+            overlap = rows[rows[:, OPEN_TIME] <= last_open]
+
+            if len(overlap):
+                positions = np.searchsorted(existing[:, OPEN_TIME], overlap[:, OPEN_TIME])
+                exact = existing[np.minimum(positions, len(existing) - 1), OPEN_TIME] == overlap[:, OPEN_TIME]
+                if exact.all():
+                    # 通常只有最后一根未收盘K线需要覆盖
+                    writable = np.memmap(path, dtype=np.float64, mode='r+', shape=existing.shape)
+                    writable[positions] = overlap
+                    writable.flush()
+                    del writable
+                else:
+                    # 历史数据中间有缺口被补齐，合并后整体重写
+                    merged = np.concatenate([existing, rows])
+                    order = np.argsort(merged[:, OPEN_TIME], kind='stable')
+                    merged = merged[order]
+                    keep = np.append(merged[1:, OPEN_TIME] != merged[:-1, OPEN_TIME], True)
+                    merged = merged[keep]
+                    added = len(merged) - len(existing)
+                    self._write_all(path, merged)
+                    return added
+
+            if len(newer):
+                with open(path, 'ab') as f:
+                    f.write(newer.tobytes())
+            return len(newer)
+
+    def _write_all(self, path: str, rows: np.ndarray):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(np.ascontiguousarray(rows, dtype=np.float64).tobytes())
+        os.replace(tmp_path, path)
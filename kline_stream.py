@@ -0,0 +1,292 @@
+import json
+import time
+import base64
+import random
+import socket
+import struct
+import hashlib
+import threading
+import logging
+from typing import Callable, Dict, List, Optional, TYPE_CHECKING
+from urllib.parse import urlsplit, parse_qs
+
+if TYPE_CHECKING:
+    import websocket
+
+logger = logging.getLogger(__name__)
+
+STREAM_BASE_URL = "wss://stream.binance.com:9443"
+# 币安单个连接最多订阅1024个流，这里保守一些
+STREAMS_PER_CONNECTION = 200
+
+
+def stream_name(symbol: str, interval: str) -> str:
+    return f"{symbol.lower()}@kline_{interval}"
+
+
+def kline_to_row(kline: dict) -> list:
+    """把推送中的k字段转换为/api/v3/klines的数组格式"""
+    return [kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v'], kline['T']]
+
+
+class KlineStreamClient:
+    """币安组合K线流客户端 - 少量多路复用连接，断线自动重连"""
+
+    def __init__(self, symbols: List[str], interval: str,
+                 on_kline: Callable[[str, dict], None],
+                 on_reconnect: Optional[Callable[[List[str]], None]] = None,
+                 base_url: str = STREAM_BASE_URL,
+                 streams_per_connection: int = STREAMS_PER_CONNECTION,
+                 reconnect_delay: float = 1.0, reconnect_delay_max: float = 60.0):
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.on_kline = on_kline
+        self.on_reconnect = on_reconnect
+        self.base_url = base_url.rstrip('/')
+        self.streams_per_connection = streams_per_connection
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_delay_max = reconnect_delay_max
+
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._sockets: Dict[int, 'websocket.WebSocket'] = {}
+        self._lock = threading.Lock()
+
+    def _url(self, symbols: List[str]) -> str:
+        streams = '/'.join(stream_name(symbol, self.interval) for symbol in symbols)
+        return f"{self.base_url}/stream?streams={streams}"
+
+    def start(self):
+        """按分组启动连接线程"""
+        self._stop.clear()
+        size = self.streams_per_connection
+        for index, start in enumerate(range(0, len(self.symbols), size)):
+            chunk = self.symbols[start:start + size]
+            thread = threading.Thread(target=self._run_connection, args=(index, chunk),
+                                      name=f"kline-stream-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"已启动 {len(self._threads)} 个K线推送连接，共 {len(self.symbols)} 个交易对")
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            sockets = list(self._sockets.values())
+        for ws in sockets:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def wait(self):
+        """阻塞直到全部连接线程退出"""
+        for thread in self._threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+
+    def _run_connection(self, index: int, symbols: List[str]):
+        import websocket  # 只有推送模式需要
+
+        url = self._url(symbols)
+        attempt = 0
+        connected_before = False
+
+        while not self._stop.is_set():
+            try:
+                ws = websocket.create_connection(url, timeout=10)
+            except Exception as e:
+                attempt += 1
+                delay = random.uniform(0, min(self.reconnect_delay_max,
+                                              self.reconnect_delay * (2 ** attempt)))
+                logger.error(f"K线推送连接{index}失败: {e}，{delay:.1f}秒后重连")
+                self._stop.wait(delay)
+                continue
+
+            with self._lock:
+                self._sockets[index] = ws
+            attempt = 0
+
+            try:
+                if connected_before and self.on_reconnect:
+                    # 断线期间可能错过了K线，用REST补齐
+                    self.on_reconnect(symbols)
+                connected_before = True
+                self._receive(ws)
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.error(f"K线推送连接{index}中断: {e}")
+            finally:
+                with self._lock:
+                    self._sockets.pop(index, None)
+                try:
+                    ws.close()
+                except Exception:
+                    pass
+
+            if not self._stop.is_set():
+                self._stop.wait(random.uniform(0, self.reconnect_delay))
+
+    def _receive(self, ws: 'websocket.WebSocket'):
+        # 服务端每隔几分钟发送ping，websocket-client会自动回复pong
+        ws.settimeout(None)
+        while not self._stop.is_set():
+            message = ws.recv()
+            if not message:
+                raise ConnectionError("连接已关闭")
+
+            payload = json.loads(message)
+            data = payload.get('data', payload)
+            if data.get('e') != 'kline':
+                continue
+
+            try:
+                self.on_kline(data['s'], data['k'])
+            except Exception as e:
+                logger.error(f"处理{data.get('s')}的K线推送出错: {e}")
+
+
+class LocalKlineStreamServer:
+    """本地WebSocket替身服务 - 模拟币安组合流接口，用于开发和测试"""
+
+    GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self._server = socket.create_server((host, port))
+        self.host, self.port = self._server.getsockname()[:2]
+        self._clients: Dict[socket.socket, set] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.connection_count = 0
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.drop_connections()
+        self._server.close()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket):
+        try:
+            request = b''
+            while b'\r\n\r\n' not in request:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    conn.close()
+                    return
+                request += chunk
+
+            lines = request.decode('latin-1').split('\r\n')
+            path = lines[0].split(' ')[1]
+            headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+
+            accept = base64.b64encode(hashlib.sha1(
+                (headers['sec-websocket-key'] + self.GUID).encode()).digest()).decode()
+            conn.sendall((
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+            ).encode())
+
+            query = parse_qs(urlsplit(path).query)
+            streams = set(query.get('streams', [''])[0].split('/'))
+            with self._lock:
+                self._clients[conn] = streams
+                self.connection_count += 1
+
+            # 读取客户端帧直到关闭，客户端帧都带掩码
+            while True:
+                header = conn.recv(2)
+                if len(header) < 2:
+                    break
+                opcode = header[0] & 0x0F
+                length = header[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack('!H', conn.recv(2))[0]
+                elif length == 127:
+                    length = struct.unpack('!Q', conn.recv(8))[0]
+                if header[1] & 0x80:
+                    conn.recv(4)  # 掩码，替身服务不关心内容
+                remaining = length
+                while remaining:
+                    chunk = conn.recv(remaining)
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                if opcode == 0x8:
+                    break
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._clients.pop(conn, None)
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _frame(payload: bytes) -> bytes:
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x81, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x81, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x81, 127, length)
+        return header + payload
+
+    def push_kline(self, symbol: str, interval: str, row: list, closed: bool):
+        """向订阅了该交易对的连接推送一条K线消息，row为[开盘时间, 开, 高, 低, 收, 量, 收盘时间]"""
+        stream = stream_name(symbol, interval)
+        message = {
+            'stream': stream,
+            'data': {
+                'e': 'kline', 'E': int(time.time() * 1000), 's': symbol.upper(),
+                'k': {
+                    't': row[0], 'T': row[6], 's': symbol.upper(), 'i': interval,
+                    'o': str(row[1]), 'h': str(row[2]), 'l': str(row[3]), 'c': str(row[4]),
+                    'v': str(row[5]), 'x': closed,
+                },
+            },
+        }
+        frame = self._frame(json.dumps(message).encode())
+        with self._lock:
+            targets = [conn for conn, streams in self._clients.items() if stream in streams]
+        for conn in targets:
+            try:
+                conn.sendall(frame)
+            except OSError:
+                pass
+
+    def drop_connections(self):
+        """强制断开全部客户端，用于模拟网络中断"""
+        with self._lock:
+            clients = list(self._clients)
+            self._clients = {}
+        for conn in clients:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+                conn.close()
+            except OSError:
+                pass
@@ -0,0 +1,158 @@
+import logging
+from typing import Dict, Optional, Sequence, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 与calculate_technical_indicators输出的列保持一致
+INDICATOR_COLUMNS = [
+    'rsi', 'ma_short', 'ma_long', 'macd', 'macd_signal', 'macd_histogram',
+    'bb_upper', 'bb_lower', 'bb_middle', 'volume_ma', 'stoch_k', 'stoch_d',
+]
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+LIVE_COLUMNS = ['open_time'] + PRICE_COLUMNS + INDICATOR_COLUMNS
+COLUMN_INDEX = {name: i for i, name in enumerate(LIVE_COLUMNS)}
+
+
+class LiveState:
+    """单个交易对/周期最近capacity根K线的价格和指标，保存在预先分配的定长数组里
+
+    数组按列存放且每行写两次（i和i+capacity），最近n根K线在每一列上总是一段连续内存，
+    state['close']等返回的是视图而不是副本，可以直接交给detect_trend_reversal。
+    创建后不再分配数组，内存占用为 列数 × 2 × capacity × 8 字节。
+    """
+
+    __slots__ = ('capacity', '_data', '_head', '_count')
+
+    def __init__(self, capacity: int = 30):
+        self.capacity = capacity
+        self._data = np.full((len(LIVE_COLUMNS), 2 * capacity), np.nan)
+        self._head = 0   # 下一根K线写入的位置
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def clear(self):
+        self._data.fill(np.nan)
+        self._head = 0
+        self._count = 0
+
+    def _write(self, position: int, row: Sequence[float]):
+        self._data[:, position] = row
+        self._data[:, position + self.capacity] = row
+
+    def append(self, row: Sequence[float]):
+        """追加一根K线，row按LIVE_COLUMNS的顺序；已满时覆盖最早的一根"""
+        self._write(self._head, row)
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def replace_last(self, row: Sequence[float]):
+        """覆盖最近一根K线（未收盘K线的反复更新）"""
+        if self._count == 0:
+            raise IndexError("LiveState为空")
+        self._write((self._head - 1) % self.capacity, row)
+
+    def _end(self) -> int:
+        # 最近一根K线在镜像区间中的位置+1，[end-count, end)是一段连续的列
+        return self._head + self.capacity if self._head else self.capacity
+
+    def column(self, name: str, n: int = None) -> np.ndarray:
+        """某一列最近n根（默认全部）K线的只读视图，按时间从早到晚"""
+        n = self._count if n is None else min(n, self._count)
+        end = self._end()
+        view = self._data[COLUMN_INDEX[name], end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.column(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in COLUMN_INDEX
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        if not self._count:
+            return None
+        values = self._data[:, self._end() - 1]
+        return {name: float(values[i]) for i, name in enumerate(LIVE_COLUMNS) if i}
+
+    def window(self, n: int = None) -> np.ndarray:
+        """最近n根K线的全部列，形状(列数, n)的视图"""
+        n = self._count if n is None else min(n, self._count)
+        end = self._end()
+        view = self._data[:, end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def frame(self) -> 'pd.DataFrame':
+        """转换为DataFrame（会复制数据，只在调用方需要DataFrame时使用）"""
+        import pandas as pd
+
+        if not self._count:
+            return pd.DataFrame()
+        window = self.window()
+        index = pd.to_datetime(window[0].astype(np.int64), unit='ms')
+        df = pd.DataFrame(window[1:].T.copy(), index=index, columns=PRICE_COLUMNS + INDICATOR_COLUMNS)
+        df.index.name = 'timestamp'
+        return df
+
+
+def measure_footprint(pairs: int = 2000, bars: int = 60, cycles: int = 20, capacity: int = 30) -> Dict:
+    """模拟监控pairs个交易对/周期：预热后每轮更新一根未收盘K线并检测，统计常驻内存和每轮新增内存"""
+    import tracemalloc
+    from streaming_indicators import StreamingIndicators
+    from signal_rules import evaluate_signals, REQUIRED_COLUMNS
+
+    rng = np.random.default_rng(3)
+    tracemalloc.start()
+    try:
+        engines = []
+        for _ in range(pairs):
+            close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+            engine = StreamingIndicators(history=capacity)
+            for i in range(bars):
+                engine.update(i * 3_600_000, close[i], close[i] * 1.01, close[i] * 0.99, close[i], 100.0)
+            engines.append(engine)
+        resident, _ = tracemalloc.get_traced_memory()
+
+        def cycle(step: int):
+            for engine in engines:
+                close = engine.state['close'][-1] * (1 + 0.001 * ((step % 3) - 1))
+                engine.update(bars * 3_600_000, close, close * 1.01, close * 0.99, close, 50.0, closed=False)
+                evaluate_signals({name: engine.state[name][-3:] for name in REQUIRED_COLUMNS}, min_bars=3)
+
+        cycle(0)
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for step in range(1, cycles + 1):
+            cycle(step)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'pairs': pairs,
+        'resident_mb': resident / 1024 / 1024,
+        'per_pair_kb': resident / pairs / 1024,
+        'buffer_kb': engines[0].state.nbytes / 1024,
+        'growth_kb': (after - before) / 1024,
+        'cycle_peak_mb': (peak - before) / 1024 / 1024,
+    }
+
+
+# 2000个交易对/周期的常驻内存和每轮新增内存
+if __name__ == "__main__":
+    result = measure_footprint()
+    print(f"{result['pairs']} 个交易对/周期: 常驻 {result['resident_mb']:.1f} MB "
+          f"(每个 {result['per_pair_kb']:.1f} KB，其中环形缓冲区 {result['buffer_kb']:.1f} KB)")
+    print(f"稳态每轮: 内存增长 {result['growth_kb']:.1f} KB，峰值临时内存 {result['cycle_peak_mb']:.2f} MB")
@@ -0,0 +1,136 @@
+import time
+import inspect
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rate_limiter import TICKER_24HR_ALL_WEIGHT, EXCHANGE_INFO_WEIGHT
+
+logger = logging.getLogger(__name__)
+
+# 杠杆代币等不适合趋势检测的交易对
+DEFAULT_EXCLUDE_SUFFIXES = ('UPUSDT', 'DOWNUSDT', 'BULLUSDT', 'BEARUSDT')
+
+
+class MarketScreener:
+    """全市场初筛 - 一次请求全部交易对的24小时行情，向量化过滤后只对候选交易对拉取K线
+
+    请求/api/v3/ticker/24hr(权重80)代替逐个交易对请求K线(每个权重2)，
+    交易所信息(权重20)和筛选结果分别缓存exchange_info_ttl、refresh_seconds秒。
+    """
+
+    def __init__(self, detector, quote_asset: str = 'USDT', min_quote_volume: float = 20_000_000,
+                 price_change_range: Tuple[float, float] = (-25.0, 25.0), max_spread: float = 0.001,
+                 max_symbols: int = 20, exclude_suffixes: Sequence[str] = DEFAULT_EXCLUDE_SUFFIXES,
+                 refresh_seconds: float = 900, exchange_info_ttl: float = 3600,
+                 watch_shortlist: bool = True):
+        self.detector = detector
+        self.quote_asset = quote_asset
+        self.min_quote_volume = min_quote_volume
+        self.price_change_range = tuple(price_change_range)
+        self.max_spread = max_spread
+        self.max_symbols = max_symbols
+        self.exclude_suffixes = tuple(exclude_suffixes)
+        self.refresh_seconds = refresh_seconds
+        self.exchange_info_ttl = exchange_info_ttl
+        # 为True时筛选出的交易对视同观察列表，可以触发买入通知
+        self.watch_shortlist = watch_shortlist
+
+        self.shortlist: List[str] = []
+        self.last_stats: Dict = {}
+        self._screened_at = 0.0
+        self._tradable: Optional[np.ndarray] = None
+        self._tradable_at = 0.0
+
+    @classmethod
+    def from_settings(cls, detector, settings: Dict) -> Optional['MarketScreener']:
+        """按配置文件的screener部分构建，未启用时返回None；设置项有误时抛出ValueError"""
+        settings = dict(settings)
+        if not settings.pop('enabled', False):
+            return None
+        known = set(inspect.signature(cls.__init__).parameters) - {'self', 'detector'}
+        unknown = sorted(set(settings) - known)
+        if unknown:
+            raise ValueError(f"全市场初筛配置有未知的设置项: {', '.join(unknown)}")
+        try:
+            return cls(detector, **settings)
+        except TypeError as e:
+            raise ValueError(f"全市场初筛配置有误: {e}")
+
+    def _tradable_symbols(self) -> Optional[np.ndarray]:
+        """状态为TRADING且计价币种匹配的交易对（缓存），获取失败时返回None改用后缀判断"""
+        if self._tradable is not None and time.time() - self._tradable_at < self.exchange_info_ttl:
+            return self._tradable
+        try:
+            info = self.detector.request_api("/api/v3/exchangeInfo", weight=EXCHANGE_INFO_WEIGHT)
+            self._tradable = np.array(sorted(
+                item['symbol'] for item in info['symbols']
+                if item.get('status') == 'TRADING' and item.get('quoteAsset') == self.quote_asset))
+            self._tradable_at = time.time()
+        except Exception as e:
+            logger.error(f"获取交易所信息失败: {e}")
+        return self._tradable
+
+    def fetch_tickers(self) -> List[Dict]:
+        return self.detector.request_api("/api/v3/ticker/24hr", weight=TICKER_24HR_ALL_WEIGHT)
+
+    def screen(self, tickers: List[Dict], tradable: Optional[np.ndarray] = None) -> List[str]:
+        """按成交额下限、涨跌幅区间和买卖价差过滤，按成交额从高到低取前max_symbols个"""
+        if not tickers:
+            return []
+
+        symbols = np.array([t['symbol'] for t in tickers])
+        quote_volume = np.array([t['quoteVolume'] for t in tickers], dtype=np.float64)
+        change = np.array([t['priceChangePercent'] for t in tickers], dtype=np.float64)
+        bid = np.array([t.get('bidPrice') or 0 for t in tickers], dtype=np.float64)
+        ask = np.array([t.get('askPrice') or 0 for t in tickers], dtype=np.float64)
+        count = np.array([t.get('count', 1) for t in tickers], dtype=np.int64)
+
+        if tradable is not None:
+            mask = np.isin(symbols, tradable)
+        else:
+            mask = np.char.endswith(symbols, self.quote_asset)
+        for suffix in self.exclude_suffixes:
+            mask &= ~np.char.endswith(symbols, suffix)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            spread = (ask - bid) / ((ask + bid) / 2)
+        low, high = self.price_change_range
+        mask &= (count > 0) & (bid > 0) & (ask >= bid)
+        mask &= quote_volume >= self.min_quote_volume
+        mask &= (change >= low) & (change <= high)
+        mask &= spread <= self.max_spread
+
+        passed = np.flatnonzero(mask)
+        order = passed[np.argsort(-quote_volume[passed], kind='stable')]
+        shortlist = symbols[order[:self.max_symbols]].tolist()
+
+        self.last_stats = {'universe': int(len(tickers)), 'passed': int(len(passed)),
+                           'shortlist': len(shortlist)}
+        return shortlist
+
+    def run(self, force: bool = False) -> List[str]:
+        """返回当前的候选交易对，缓存过期时重新筛选；请求失败时沿用上一次的结果"""
+        if not force and self.shortlist and time.time() - self._screened_at < self.refresh_seconds:
+            return self.shortlist
+        try:
+            tradable = self._tradable_symbols()
+            self.shortlist = self.screen(self.fetch_tickers(), tradable)
+            self._screened_at = time.time()
+            logger.info(f"全市场初筛: {self.last_stats['universe']} 个交易对，"
+                        f"通过 {self.last_stats['passed']} 个，选取 {len(self.shortlist)} 个")
+        except Exception as e:
+            logger.error(f"全市场初筛失败: {e}")
+        return self.shortlist
+
+
+# 使用示例：对全部USDT交易对做一次初筛
+if __name__ == "__main__":
+    from binance_trend_detector import BinanceTrendDetector
+
+    detector = BinanceTrendDetector()
+    screener = MarketScreener(detector)
+    for symbol in screener.run():
+        print(symbol)
+    print(f"已用权重 {detector.rate_limiter.used_weight}")
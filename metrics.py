@@ -0,0 +1,491 @@
+import os
+import io
+import time
+import cProfile
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+from urllib.parse import urlsplit, parse_qs
+
+if TYPE_CHECKING:
+    import pstats
+
+logger = logging.getLogger(__name__)
+
+# 从5毫秒（本地计算）到5分钟（一整轮检测）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Gauge(_Metric):
+    """当前值；可以用set_function在抓取时再读取（如队列深度、已用权重）"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._functions: Dict[Tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels) -> Optional[float]:
+        key = self._key(labels)
+        with self._lock:
+            fn = self._functions.get(key)
+            value = self._values.get(key)
+        return fn() if fn else value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception as e:
+                logger.error(f"读取指标{self.name}失败: {e}")
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """耗时分布：各分桶的累计次数、总和与次数"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def totals(self) -> Dict[Tuple, Dict]:
+        with self._lock:
+            return {key: {'sum': state['sum'], 'count': state['count']} for key, state in self._values.items()}
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, {'counts': list(state['counts']), 'sum': state['sum'],
+                                  'count': state['count']})
+                           for key, state in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """进程内的指标集合，按Prometheus文本格式输出"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"指标{metric.name}已以不同的类型或标签注册")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# 检测流程各阶段：throttle(等待权重预算)、fetch(HTTP往返)、parse(JSON解码和构建数组/DataFrame)、
+# store(本地K线存储读写)、indicators、detect、notify(后台队列实际发送一条通知)
+STAGE_SECONDS = REGISTRY.histogram('detector_stage_seconds', "检测流程各阶段单次调用的耗时", ['stage'])
+STAGE_ERRORS = REGISTRY.counter('detector_errors_total', "各阶段的错误次数", ['stage'])
+CYCLE_SECONDS = REGISTRY.histogram('detector_cycle_seconds', "一轮检测的总耗时", ['mode'])
+LAST_CYCLE_SECONDS = REGISTRY.gauge('detector_last_cycle_seconds', "最近一轮检测的耗时")
+LAST_CYCLE_TIMESTAMP = REGISTRY.gauge('detector_last_cycle_timestamp_seconds', "最近一轮检测结束的时间")
+CYCLE_INTERVAL = REGISTRY.gauge('detector_cycle_interval_seconds', "配置的检测间隔")
+CYCLE_UTILIZATION = REGISTRY.gauge('detector_cycle_utilization_ratio',
+                                   "最近一轮耗时占检测间隔的比例，超过1说明跟不上检测节奏")
+CYCLE_SYMBOLS = REGISTRY.gauge('detector_cycle_symbols', "最近一轮检测的交易对数量")
+
+REQUEST_WEIGHT = REGISTRY.counter('binance_request_weight_total', "按接口累计消耗的请求权重", ['path'])
+REQUEST_WEIGHT_USED = REGISTRY.gauge('binance_request_weight_used', "当前窗口已用的请求权重")
+REQUEST_WEIGHT_BUDGET = REGISTRY.gauge('binance_request_weight_budget', "每个窗口的请求权重预算")
+RATE_LIMITED = REGISTRY.counter('binance_rate_limited_total', "收到429/418限频响应的次数", ['status'])
+
+WECHAT_SECONDS = REGISTRY.histogram('wechat_request_seconds', "微信接口调用耗时", ['call'])
+WECHAT_ERRORS = REGISTRY.counter('wechat_errors_total', "微信接口调用失败次数", ['call'])
+
+NOTIFICATION_QUEUE = REGISTRY.gauge('notification_queue', "通知队列的深度和累计发送情况", ['field'])
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """记录一个阶段的耗时，抛出异常时同时计入该阶段的错误次数"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+@contextmanager
+def timed_call(call: str):
+    """记录一次微信接口调用的耗时，抛出异常时计入失败次数"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        WECHAT_ERRORS.inc(call=call)
+        raise
+    finally:
+        WECHAT_SECONDS.observe(time.perf_counter() - started, call=call)
+
+
+def record_cycle(mode: str, seconds: float, symbols: int, interval: Optional[float] = None):
+    """记录一轮检测的耗时，以及与检测间隔的比值"""
+    CYCLE_SECONDS.observe(seconds, mode=mode)
+    LAST_CYCLE_SECONDS.set(seconds)
+    LAST_CYCLE_TIMESTAMP.set(time.time())
+    CYCLE_SYMBOLS.set(symbols)
+    if interval:
+        CYCLE_INTERVAL.set(interval)
+        CYCLE_UTILIZATION.set(seconds / interval)
+        if seconds > interval:
+            logger.warning(f"本轮检测耗时 {seconds:.1f} 秒，超过检测间隔 {interval} 秒")
+
+
+def stage_totals() -> Dict[str, Tuple[float, int]]:
+    """各阶段累计的(耗时, 次数)"""
+    return {key[0]: (state['sum'], state['count']) for key, state in STAGE_SECONDS.totals().items()}
+
+
+def format_stage_delta(before: Dict[str, Tuple[float, int]]) -> str:
+    """与before相比各阶段新增的累计耗时（多线程并发时累计值会超过墙钟时间）"""
+    parts = []
+    for stage, (seconds, count) in sorted(stage_totals().items()):
+        seconds -= before.get(stage, (0.0, 0))[0]
+        count -= before.get(stage, (0.0, 0))[1]
+        if count:
+            parts.append(f"{stage} {seconds:.2f}秒/{count}次")
+    return ", ".join(parts) if parts else "无数据"
+
+
+class CycleProfiler:
+    """按需对单轮检测做性能剖析，结果写入output_dir
+
+    request()之后的下一轮检测在profile()中运行；cProfile下通过wrap()包装的线程池任务也会被剖析并合并，
+    pyinstrument（可选依赖，未安装时退回cProfile）只采样调用run_detection的线程。
+    """
+
+    def __init__(self, output_dir: str = 'profiles', top: int = 40):
+        self.output_dir = output_dir
+        self.top = top
+        self.last_report: Optional[str] = None
+        self.last_path: Optional[str] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._engine = 'cprofile'
+        self._stats: Optional['pstats.Stats'] = None
+        self._active = False
+
+    def request(self, cycles: int = 1, engine: str = 'cprofile'):
+        """剖析接下来的cycles轮检测"""
+        if engine == 'pyinstrument':
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                logger.warning("未安装pyinstrument，改用cProfile")
+                engine = 'cprofile'
+        with self._lock:
+            self._pending = max(cycles, 1)
+            self._engine = engine
+        logger.info(f"将对接下来的 {cycles} 轮检测做性能剖析({engine})")
+
+    def _merge(self, profiler: cProfile.Profile):
+        import pstats  # 只在剖析时需要
+
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    def wrap(self, fn: Callable) -> Callable:
+        """包装提交到线程池的任务，剖析进行中时在工作线程里单独剖析并合并结果"""
+        if not (self._active and self._engine == 'cprofile'):
+            return fn
+
+        def profiled(*args, **kwargs):
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+                self._merge(profiler)
+        return profiled
+
+    @contextmanager
+    def profile(self):
+        """未请求剖析时什么也不做"""
+        with self._lock:
+            if self._pending <= 0 or self._active:
+                run = False
+            else:
+                self._pending -= 1
+                self._active = True
+                self._stats = None
+                run = True
+        if not run:
+            yield
+            return
+
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        try:
+            if self._engine == 'pyinstrument':
+                from pyinstrument import Profiler
+                profiler = Profiler()
+                profiler.start()
+                try:
+                    yield
+                finally:
+                    profiler.stop()
+                    self._write(f"cycle-{stamp}.html", profiler.output_html(), profiler.output_text())
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    yield
+                finally:
+                    profiler.disable()
+                    self._merge(profiler)
+                    self._write_pstats(f"cycle-{stamp}.prof")
+        finally:
+            with self._lock:
+                self._active = False
+
+    def _write_pstats(self, name: str):
+        stream = io.StringIO()
+        stats = self._stats
+        stats.stream = stream
+        stats.sort_stats('cumulative').print_stats(self.top)
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, name)
+            stats.dump_stats(path)
+        except OSError as e:
+            logger.error(f"保存性能剖析结果失败: {e}")
+            path = None
+        self._finish(path, stream.getvalue())
+
+    def _write(self, name: str, content: str, report: str):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        except OSError as e:
+            logger.error(f"保存性能剖析结果失败: {e}")
+            path = None
+        self._finish(path, report)
+
+    def _finish(self, path: Optional[str], report: str):
+        self.last_path = path
+        self.last_report = report
+        logger.info(f"性能剖析完成: {path}")
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """本地指标服务：GET /metrics 输出Prometheus文本格式，
+    POST /profile?cycles=1&engine=cprofile 请求剖析下一轮检测，GET /profile 查看最近一次的剖析结果"""
+
+    daemon_threads = True
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, profiler: CycleProfiler = None,
+                 host: str = '127.0.0.1', port: int = 9108):
+        super().__init__((host, port), _MetricsHandler)
+        self.registry = registry
+        self.profiler = profiler
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        logger.info(f"指标服务已启动: {self.url}/metrics")
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str, content_type: str = 'text/plain; charset=utf-8'):
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server: MetricsServer = self.server
+        path = urlsplit(self.path).path
+        if path == '/metrics':
+            return self._send(200, server.registry.render(), 'text/plain; version=0.0.4; charset=utf-8')
+        if path == '/profile' and server.profiler is not None:
+            profiler = server.profiler
+            if profiler.last_report is None:
+                return self._send(404, "还没有剖析结果\n")
+            return self._send(200, f"# {profiler.last_path}\n{profiler.last_report}")
+        self._send(404, "not found\n")
+
+    def do_POST(self):
+        server: MetricsServer = self.server
+        parts = urlsplit(self.path)
+        if parts.path == '/profile' and server.profiler is not None:
+            query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+            try:
+                cycles = int(query.get('cycles', 1))
+            except ValueError:
+                return self._send(400, "cycles必须是整数\n")
+            server.profiler.request(cycles, query.get('engine', 'cprofile'))
+            return self._send(202, f"将剖析接下来的 {cycles} 轮检测\n")
+        self._send(404, "not found\n")
+
+
+# 使用示例：启动指标服务并模拟几个阶段的耗时
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    for _ in range(5):
+        with timed_stage('fetch'):
+            time.sleep(0.02)
+        with timed_stage('indicators'):
+            sum(range(100000))
+    record_cycle('single', 0.2, 5, interval=300)
+    print(REGISTRY.render())
@@ -0,0 +1,366 @@
+import json
+import time
+import queue
+import threading
+import socketserver
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+from metrics import timed_stage
+
+# smtplib和email在第一次发送邮件时才导入，没有信号的单次检测不需要加载它们
+if TYPE_CHECKING:
+    import smtplib
+
+logger = logging.getLogger(__name__)
+
+
+class SmtpConnection:
+    """可复用的SMTP连接 - 空闲超时后关闭，发送前用NOOP检查连接是否仍然可用"""
+
+    def __init__(self, config: dict, idle_timeout: float = 60.0):
+        # config与BinanceTrendDetector.notification_config格式相同
+        self.config = config
+        self.idle_timeout = idle_timeout
+        self._server: Optional['smtplib.SMTP'] = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _connect(self):
+        import smtplib
+
+        self.close()
+        server = smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port'], timeout=30)
+        if self.config.get('use_tls', True):
+            server.starttls()
+        if self.config.get('password'):
+            server.login(self.config['email'], self.config['password'])
+        self._server = server
+        self.connects += 1
+
+    def _alive(self) -> bool:
+        if self._server is None:
+            return False
+        import smtplib
+
+        if time.time() - self._last_used > self.idle_timeout:
+            return False
+        try:
+            return self._server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, subject: str, body: str):
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+
+        msg = MIMEMultipart()
+        msg['From'] = self.config['email']
+        msg['To'] = self.config['to_email']
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain', 'utf-8'))
+
+        if not self._alive():
+            self._connect()
+        try:
+            self._server.sendmail(self.config['email'], self.config['to_email'], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # 服务端主动断开，重连后再试一次
+            self._connect()
+            self._server.sendmail(self.config['email'], self.config['to_email'], msg.as_string())
+        self._last_used = time.time()
+
+    def close(self):
+        if self._server is not None:
+            import smtplib
+
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+class NotificationDispatcher:
+    """后台通知队列 - 检测流程只负责入队，工作线程复用SMTP连接和企业微信令牌发送"""
+
+    def __init__(self, email_config: dict, wechat_notifier=None, workers: int = 1,
+                 max_attempts: int = 3, retry_delay: float = 5.0, max_queue_size: int = 1000,
+                 dead_letter_file: str = 'notification_dead_letter.jsonl'):
+        self.email_config = email_config
+        self.wechat_notifier = wechat_notifier
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.dead_letter_file = dead_letter_file
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._threads: List[threading.Thread] = []
+        self._timers: List[threading.Timer] = []
+        self._lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0, 'sent': 0, 'retries': 0, 'dead_lettered': 0, 'dropped': 0,
+            'latency_total': 0.0, 'latency_max': 0.0, 'send_total': 0.0,
+        }
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"notifier-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 30.0):
+        """等待队列中的通知发送完毕后停止工作线程"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            timers, self._timers = self._timers, []
+        for timer in timers:
+            # 尚在等待重试的通知立即重新入队
+            if timer.is_alive():
+                timer.cancel()
+                timer.function(*timer.args)
+        for _ in threads:
+            self._queue.put(None)
+        deadline = time.time() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.time(), 0))
+
+    def enqueue_signal(self, symbol: str, signal_data: Dict, subject: str, body: str) -> bool:
+        """交易信号通知入队，立即返回"""
+        return self._put({
+            'kind': 'signal', 'symbol': symbol, 'signal_data': signal_data,
+            'subject': subject, 'body': body,
+        })
+
+    def enqueue_digest(self, signals: List, subject: str, body: str) -> bool:
+        """同一轮的多个信号合并为一条通知，signals为(symbol, signal_data)列表"""
+        return self._put({'kind': 'digest', 'signals': signals, 'subject': subject, 'body': body})
+
+    def enqueue_summary(self, summary_data: Dict) -> bool:
+        """每日总结（只通过微信发送）"""
+        return self._put({'kind': 'summary', 'summary': summary_data,
+                          'subject': f"每日总结 {summary_data.get('date', '')}"})
+
+    def enqueue_email(self, subject: str, body: str) -> bool:
+        return self._put({'kind': 'email', 'subject': subject, 'body': body})
+
+    def enqueue_wechat(self, title: str, content: str) -> bool:
+        return self._put({'kind': 'wechat', 'subject': title, 'body': content})
+
+    def _put(self, job: Dict) -> bool:
+        self.start()
+        job.setdefault('attempt', 0)
+        job.setdefault('enqueued_at', time.time())
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            self._dead_letter(job, "通知队列已满")
+            return False
+        with self._lock:
+            self._stats['enqueued'] += 1
+        return True
+
+    def _worker(self):
+        # SMTP连接不是线程安全的，每个工作线程各自维护一个
+        smtp = SmtpConnection(self.email_config)
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    break
+                self._process(job, smtp)
+        finally:
+            smtp.close()
+
+    def _deliver(self, job: Dict, smtp: SmtpConnection):
+        kind = job['kind']
+        if kind == 'email':
+            smtp.send(job['subject'], job['body'])
+            return
+
+        if kind == 'wechat':
+            if not (self.wechat_notifier and self.wechat_notifier.send_message(job['subject'], job['body'])):
+                raise RuntimeError("微信消息发送失败")
+            return
+
+        if kind == 'summary':
+            if not (self.wechat_notifier and self.wechat_notifier.send_daily_summary(job['summary'])):
+                raise RuntimeError("每日总结发送失败")
+            return
+
+        # 交易信号：优先微信，未配置或失败时改用邮件
+        if kind == 'digest':
+            sent = self.wechat_notifier and self.wechat_notifier.send_signal_digest(job['signals'])
+        else:
+            sent = self.wechat_notifier and self.wechat_notifier.send_trading_signal(job['symbol'], job['signal_data'])
+        if not sent:
+            smtp.send(job['subject'], job['body'])
+
+    def _process(self, job: Dict, smtp: SmtpConnection):
+        started = time.time()
+        try:
+            with timed_stage('notify'):
+                self._deliver(job, smtp)
+        except Exception as e:
+            job['attempt'] += 1
+            job['last_error'] = str(e)
+            if job['attempt'] >= self.max_attempts:
+                self._dead_letter(job, str(e))
+                return
+
+            delay = self.retry_delay * (2 ** (job['attempt'] - 1))
+            logger.warning(f"通知发送失败({e})，{delay:.1f}秒后第{job['attempt']}次重试")
+            with self._lock:
+                self._stats['retries'] += 1
+                timer = threading.Timer(delay, self._requeue, args=(job,))
+                timer.daemon = True
+                self._timers = [t for t in self._timers if t.is_alive()] + [timer]
+            timer.start()
+            return
+
+        finished = time.time()
+        latency = finished - job['enqueued_at']
+        with self._lock:
+            self._stats['sent'] += 1
+            self._stats['latency_total'] += latency
+            self._stats['latency_max'] = max(self._stats['latency_max'], latency)
+            self._stats['send_total'] += finished - started
+
+    def _requeue(self, job: Dict):
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._dead_letter(job, "通知队列已满")
+
+    def _dead_letter(self, job: Dict, error: str):
+        """超过重试次数的通知写入死信文件，便于人工补发"""
+        with self._lock:
+            self._stats['dead_lettered'] += 1
+        record = {k: v for k, v in job.items() if k not in ('signal_data', 'signals', 'summary', 'last_error')}
+        record['error'] = error
+        record['failed_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        logger.error(f"通知发送最终失败，已写入死信文件: {job.get('subject')}")
+        try:
+            with open(self.dead_letter_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            logger.error(f"写入死信文件失败: {e}")
+
+    def metrics(self) -> Dict:
+        """队列深度和发送延迟统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        sent = max(stats['sent'], 1)
+        return {
+            'queue_depth': self._queue.qsize(),
+            'enqueued': stats['enqueued'],
+            'sent': stats['sent'],
+            'retries': stats['retries'],
+            'dead_lettered': stats['dead_lettered'],
+            'dropped': stats['dropped'],
+            'avg_latency': stats['latency_total'] / sent,
+            'max_latency': stats['latency_max'],
+            'avg_send_time': stats['send_total'] / sent,
+        }
+
+    def format_metrics(self) -> str:
+        m = self.metrics()
+        return (f"队列 {m['queue_depth']}，已发送 {m['sent']}，重试 {m['retries']}，"
+                f"死信 {m['dead_lettered']}，平均延迟 {m['avg_latency'] * 1000:.0f}ms，"
+                f"平均发送耗时 {m['avg_send_time'] * 1000:.0f}ms")
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def _reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self._reply("220 localhost ESMTP stand-in")
+        in_data = False
+        lines = []
+        for raw in self.rfile:
+            line = raw.decode('utf-8', 'replace').rstrip("\r\n")
+            if in_data:
+                if line == '.':
+                    in_data = False
+                    with server.lock:
+                        rejected = server.reject_messages > 0
+                        if rejected:
+                            server.reject_messages -= 1
+                        else:
+                            server.messages.append("\n".join(lines))
+                    lines = []
+                    self._reply("451 Temporary failure" if rejected else "250 OK")
+                else:
+                    lines.append(line[1:] if line.startswith('..') else line)
+                continue
+
+            command = line[:4].upper()
+            if command == 'EHLO':
+                self._reply("250 localhost")
+            elif command == 'DATA':
+                in_data = True
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == 'QUIT':
+                self._reply("221 Bye")
+                return
+            else:
+                # HELO / MAIL / RCPT / RSET / NOOP
+                self._reply("250 OK")
+
+
+class LocalSmtpServer(socketserver.ThreadingTCPServer):
+    """本地SMTP替身服务（不支持STARTTLS/AUTH），用于开发调试和测试（tests/test_notification_dispatcher.py）"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _SmtpHandler)
+        self.lock = threading.Lock()
+        self.messages: List[str] = []
+        self.connections = 0
+        # 接下来拒收（回复451）的邮件数，用于验证重试和死信
+        self.reject_messages = 0
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+# 使用示例：通过本地替身服务发送一批邮件，只建立一次SMTP连接
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    smtp_server = LocalSmtpServer().start()
+    dispatcher = NotificationDispatcher({
+        'email': 'bot@example.com', 'password': '', 'to_email': 'me@example.com',
+        'smtp_server': '127.0.0.1', 'smtp_port': smtp_server.port, 'use_tls': False,
+    })
+    for i in range(20):
+        dispatcher.enqueue_email(f"测试 {i}", "消息内容")
+    dispatcher.stop()
+
+    print(f"收到 {len(smtp_server.messages)} 封邮件，SMTP连接 {smtp_server.connections} 次")
+    print(dispatcher.format_metrics())
+    smtp_server.close()
@@ -0,0 +1,268 @@
+import json
+import math
+import time
+import heapq
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+QUERY_REQUESTS = REGISTRY.counter('query_api_requests_total', "本地查询接口的请求数", ['endpoint', 'status'])
+
+# 快照中保存的字段（detect_trend_reversal / detect_timeframe的输出）
+SNAPSHOT_FIELDS = ('signal', 'strength', 'price', 'rsi', 'volume_ratio')
+
+
+def _clean(value):
+    """NaN/inf不是合法的JSON，转为null"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class SignalBoard:
+    """最近一次检测结果的内存看板，由检测流程写入，查询接口只读
+
+    每个(交易对, 周期)保存一份不可变的快照，写入时整体替换，读取方拿到引用后在锁外序列化。
+    按强度排名由一个最小堆维护（键为-强度），更新时旧条目只做失效标记，失效条目过多时重建；
+    取前N名时从堆顶按“最好优先”遍历，不修改堆，复杂度取决于N和途经的失效或不符合筛选条件的条目，而不是交易对总数。
+    version在每次写入后加一，作为查询结果的ETag。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        self._sequence: Dict[Tuple[str, str], int] = {}
+        self._heap: List[Tuple[int, str, str, int]] = []
+        self._counter = 0
+        self.version = 0
+        self.updated_at: Optional[float] = None
+
+    def publish(self, symbol: str, interval: str, signal_data: Dict, now: float = None):
+        """记录一次检测结果（handle_signal调用），只做字典和堆操作，不阻塞检测流程"""
+        now = time.time() if now is None else now
+        snapshot = {'symbol': symbol, 'interval': interval}
+        for field in SNAPSHOT_FIELDS:
+            snapshot[field] = _clean(signal_data.get(field))
+        snapshot['strength'] = snapshot['strength'] or 0
+        snapshot['reasons'] = list(signal_data.get('reasons', []))
+        snapshot['indicators'] = {name: _clean(value) for name, value in signal_data.get('indicators', {}).items()}
+        snapshot['updated_at'] = now
+
+        key = (symbol, interval)
+        with self._lock:
+            self._counter += 1
+            self.version += 1
+            self.updated_at = now
+            snapshot['version'] = self.version
+            self._entries[key] = snapshot
+            self._sequence[key] = self._counter
+            heapq.heappush(self._heap, (-snapshot['strength'], symbol, interval, self._counter))
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(-entry['strength'], symbol, interval, self._sequence[(symbol, interval)])
+                      for (symbol, interval), entry in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def forget(self, symbols: Iterable[str]):
+        """删除不再监控的交易对（配置热加载时调用）"""
+        symbols = set(symbols)
+        with self._lock:
+            keys = [key for key in self._entries if key[0] in symbols]
+            if not keys:
+                return
+            for key in keys:
+                del self._entries[key]
+                del self._sequence[key]
+            self.version += 1
+            self._rebuild()
+
+    def top(self, n: int, signals: Optional[Iterable[str]] = ('BUY', 'SELL'),
+            interval: str = None) -> Tuple[int, List[Dict]]:
+        """按强度从高到低的前n个快照（强度相同按交易对名称），返回(version, 快照列表)"""
+        signals = set(signals) if signals is not None else None
+        result = []
+        with self._lock:
+            heap = self._heap
+            frontier = [(heap[0], 0)] if heap else []
+            while frontier and len(result) < n:
+                item, index = heapq.heappop(frontier)
+                _, symbol, entry_interval, sequence = item
+                if self._sequence.get((symbol, entry_interval)) == sequence:
+                    entry = self._entries[(symbol, entry_interval)]
+                    if (signals is None or entry['signal'] in signals) and interval in (None, entry_interval):
+                        result.append(entry)
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child], child))
+            return self.version, result
+
+    def snapshot(self, symbol: str = None, interval: str = None) -> Tuple[int, List[Dict]]:
+        """全部（或某个交易对/周期的）快照，按交易对和周期排序"""
+        with self._lock:
+            entries = [entry for (entry_symbol, entry_interval), entry in self._entries.items()
+                       if symbol in (None, entry_symbol) and interval in (None, entry_interval)]
+            version = self.version
+        entries.sort(key=lambda entry: (entry['symbol'], entry['interval']))
+        return version, entries
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'version': self.version, 'entries': len(self._entries),
+                    'symbols': len({symbol for symbol, _ in self._entries}), 'updated_at': self.updated_at}
+
+
+class QueryServer(ThreadingHTTPServer):
+    """本地只读查询接口（JSON），数据全部来自SignalBoard，不会向交易所发请求
+
+    GET /signals[?interval=1h&signal=BUY]  全部交易对的最新快照
+    GET /signals/<交易对>                   某个交易对各周期的快照
+    GET /top?n=10[&signal=BUY|SELL|ALL&interval=1h]  按强度排名（默认只含BUY/SELL）
+    GET /health                             版本号、交易对数量和最近更新时间
+
+    响应带ETag（看板版本号），请求带If-None-Match且没有新结果时返回304，轮询几乎没有开销。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, board: SignalBoard, host: str = '127.0.0.1', port: int = 9109):
+        super().__init__((host, port), _QueryHandler)
+        self.board = board
+        # 同一版本下相同查询的响应体只序列化一次
+        self._cache: Dict[str, Tuple[int, bytes]] = {}
+        self._cache_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        logger.info(f"查询接口已启动: {self.url}/signals")
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+    def cached(self, key: str, version: int, build) -> bytes:
+        with self._cache_lock:
+            hit = self._cache.get(key)
+            if hit is not None and hit[0] == version:
+                return hit[1]
+        body = json.dumps(build(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        with self._cache_lock:
+            if len(self._cache) >= 256:
+                self._cache.clear()
+            self._cache[key] = (version, body)
+        return body
+
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, endpoint: str, status: int, body: bytes = b'', etag: str = None):
+        QUERY_REQUESTS.inc(endpoint=endpoint, status=str(status))
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if status != 304:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def _error(self, endpoint: str, status: int, message: str):
+        self._send(endpoint, status, json.dumps({'error': message}, ensure_ascii=False).encode('utf-8'))
+
+    def do_GET(self):
+        server: QueryServer = self.server
+        board = server.board
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip('/') or '/'
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        interval = query.get('interval')
+        signal = query.get('signal', '').upper()
+
+        if path == '/health':
+            return self._send('health', 200, json.dumps(board.stats()).encode('utf-8'))
+
+        if path == '/top':
+            try:
+                n = max(1, min(int(query.get('n', 10)), 1000))
+            except ValueError:
+                return self._error('top', 400, "n必须是整数")
+            signals = None if signal == 'ALL' else [signal] if signal else ('BUY', 'SELL')
+            endpoint = 'top'
+
+            def build():
+                version, entries = board.top(n, signals, interval)
+                return {'version': version, 'signals': entries}
+        elif path == '/signals' or path.startswith('/signals/'):
+            symbol = unquote(path[len('/signals/'):]).upper() if path != '/signals' else None
+            endpoint = 'signals'
+            if symbol and not board.snapshot(symbol)[1]:
+                return self._error(endpoint, 404, f"没有{symbol}的检测结果")
+
+            def build():
+                version, entries = board.snapshot(symbol, interval)
+                if signal:
+                    entries = [entry for entry in entries if entry['signal'] == signal]
+                return {'version': version, 'signals': entries}
+        else:
+            return self._error('other', 404, "not found")
+
+        # 版本号在读取数据之前取得：读取期间若有新结果，下一次请求会拿到新的ETag，不会漏掉
+        version = board.version
+        etag = f'"{version}"'
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(endpoint, 304, etag=etag)
+        self._send(endpoint, 200, server.cached(self.path, version, build), etag)
+
+
+# 演示：写入一批模拟结果，启动查询接口，对比ETag命中前后的请求
+if __name__ == "__main__":
+    import random
+    import requests
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    board = SignalBoard()
+    rng = random.Random(3)
+    for i in range(2000):
+        strength = rng.randint(0, 12)
+        board.publish(f"SYM{i:04d}USDT", '1h', {
+            'signal': rng.choice(['BUY', 'SELL', 'HOLD']), 'strength': strength, 'price': 100.0,
+            'rsi': rng.uniform(0, 100), 'volume_ratio': 1.0, 'reasons': [], 'indicators': {'rsi': float('nan')}})
+
+    started = time.perf_counter()
+    for i in range(20000):
+        board.publish(f"SYM{i % 2000:04d}USDT", '1h', {'signal': 'BUY', 'strength': rng.randint(0, 12)})
+    print(f"publish: {(time.perf_counter() - started) / 20000 * 1e6:.1f} µs/次")
+    started = time.perf_counter()
+    for _ in range(2000):
+        board.top(10)
+    print(f"top(10)，2000个交易对: {(time.perf_counter() - started) / 2000 * 1e6:.1f} µs/次")
+
+    server = QueryServer(board, port=0).start()
+    try:
+        session = requests.Session()
+        response = session.get(f"{server.url}/top?n=3")
+        print(response.status_code, response.headers['ETag'], response.json()['signals'][0]['symbol'])
+        again = session.get(f"{server.url}/top?n=3", headers={'If-None-Match': response.headers['ETag']})
+        print("再次请求:", again.status_code, len(again.content), "字节")
+    finally:
+        server.close()
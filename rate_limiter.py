@@ -0,0 +1,102 @@
+import time
+import threading
+import logging
+from typing import Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# 币安现货接口默认的请求权重上限（每分钟）
+DEFAULT_WEIGHT_LIMIT = 6000
+# /api/v3/klines 单次请求权重
+KLINES_WEIGHT = 2
+# 不带symbol参数的/api/v3/ticker/24hr（全部交易对）和/api/v3/exchangeInfo的请求权重
+TICKER_24HR_ALL_WEIGHT = 80
+EXCHANGE_INFO_WEIGHT = 20
+# /api/v3/time 的请求权重
+SERVER_TIME_WEIGHT = 1
+
+
+class RequestWeightLimiter:
+    """币安请求权重预算器 - 按X-MBX-USED-WEIGHT响应头控制请求节奏"""
+
+    def __init__(self, weight_limit: int = DEFAULT_WEIGHT_LIMIT, window_seconds: int = 60,
+                 safety_ratio: float = 0.8):
+        self.weight_limit = weight_limit
+        self.window_seconds = window_seconds
+        self.budget = int(weight_limit * safety_ratio)  # 预留余量给其他程序
+
+        self._cond = threading.Condition()
+        self._window_start = self._current_window()
+        self._used = 0
+        self._blocked_until = 0.0
+
+    def _current_window(self) -> float:
+        now = time.time()
+        return now - now % self.window_seconds
+
+    def _roll_window(self):
+        window = self._current_window()
+        if window != self._window_start:
+            self._window_start = window
+            self._used = 0
+
+    @property
+    def used_weight(self) -> int:
+        with self._cond:
+            self._roll_window()
+            return self._used
+
+    def acquire(self, weight: int = KLINES_WEIGHT):
+        """预占请求权重，超出预算或处于退避期时阻塞到下一个窗口"""
+        with self._cond:
+            while True:
+                now = time.time()
+                if now < self._blocked_until:
+                    self._cond.wait(self._blocked_until - now)
+                    continue
+
+                self._roll_window()
+                if self._used + weight <= self.budget:
+                    self._used += weight
+                    return
+
+                wait = self._window_start + self.window_seconds - now
+                logger.info(f"请求权重已用 {self._used}/{self.budget}，等待 {wait:.1f} 秒")
+                self._cond.wait(max(wait, 0.05))
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """用服务端返回的已用权重校正本地计数"""
+        value = headers.get('X-MBX-USED-WEIGHT-1M') or headers.get('X-MBX-USED-WEIGHT')
+        if value is None:
+            return
+
+        try:
+            server_used = int(value)
+        except ValueError:
+            return
+
+        with self._cond:
+            self._roll_window()
+            # 服务端计数不含仍在途中的请求，取较大值
+            self._used = max(self._used, server_used)
+
+    def on_rate_limited(self, status_code: int, retry_after: Optional[str] = None):
+        """收到429/418后进入退避期"""
+        try:
+            delay = float(retry_after) if retry_after else 0.0
+        except ValueError:
+            delay = 0.0
+
+        with self._cond:
+            if delay <= 0:
+                # 没有Retry-After时退避到当前窗口结束；418表示IP已被封禁，至少等待2分钟
+                self._roll_window()
+                delay = self._window_start + self.window_seconds - time.time()
+                if status_code == 418:
+                    delay = max(delay, 120.0)
+
+            self._blocked_until = max(self._blocked_until, time.time() + delay)
+            self._used = self.budget
+            self._cond.notify_all()
+
+        logger.warning(f"触发币安限频({status_code})，退避 {delay:.1f} 秒")
@@ -0,0 +1,649 @@
+import ast
+import math
+import logging
+import operator
+import functools
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from live_state import PRICE_COLUMNS, INDICATOR_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_HOLD = 0
+SIGNAL_BUY = 1
+SIGNAL_SELL = -1
+SIGNAL_NAMES = {SIGNAL_HOLD: 'HOLD', SIGNAL_BUY: 'BUY', SIGNAL_SELL: 'SELL'}
+
+# 触发原因位掩码，按detect_trend_reversal中的判断顺序排列
+REASON_RSI_BUY = 1 << 0
+REASON_MA_BUY = 1 << 1
+REASON_MACD_BUY = 1 << 2
+REASON_BB_BUY = 1 << 3
+REASON_VOLUME_BUY = 1 << 4
+REASON_STOCH_BUY = 1 << 5
+REASON_MOMENTUM_BUY = 1 << 6
+REASON_RSI_SELL = 1 << 7
+REASON_MA_SELL = 1 << 8
+REASON_MACD_SELL = 1 << 9
+REASON_BB_SELL = 1 << 10
+REASON_VOLUME_SELL = 1 << 11
+REASON_STOCH_SELL = 1 << 12
+REASON_MOMENTUM_SELL = 1 << 13
+
+REASON_TEXT = {
+    REASON_RSI_BUY: "RSI从超卖区反弹",
+    REASON_MA_BUY: "短期均线上穿长期均线(金叉)",
+    REASON_MACD_BUY: "MACD金叉",
+    REASON_BB_BUY: "价格触及布林带下轨",
+    REASON_VOLUME_BUY: "成交量放大确认",
+    REASON_STOCH_BUY: "随机指标低位金叉",
+    REASON_MOMENTUM_BUY: "价格强势上涨 {change:.2%}",
+    REASON_RSI_SELL: "RSI进入超买区",
+    REASON_MA_SELL: "短期均线下穿长期均线(死叉)",
+    REASON_MACD_SELL: "MACD死叉",
+    REASON_BB_SELL: "价格触及布林带上轨",
+    REASON_VOLUME_SELL: "成交量放大确认",
+    REASON_STOCH_SELL: "随机指标高位死叉",
+    REASON_MOMENTUM_SELL: "价格快速下跌 {change:.2%}",
+}
+
+# 规则条件中可以引用的列（流式指标、批量指标和DataFrame路径都提供这些列）
+KNOWN_COLUMNS = PRICE_COLUMNS + INDICATOR_COLUMNS
+
+# 默认规则用到的列
+REQUIRED_COLUMNS = ['close', 'volume', 'rsi', 'ma_short', 'ma_long', 'macd', 'macd_signal',
+                    'bb_upper', 'bb_lower', 'volume_ma', 'stoch_k', 'stoch_d']
+
+
+def _shift(values: np.ndarray, periods: int) -> np.ndarray:
+    """沿最后一个轴（时间轴）后移，前面补NaN"""
+    out = np.full(values.shape, np.nan)
+    out[..., periods:] = values[..., :-periods]
+    return out
+
+
+def _tail(values, size: int) -> List[float]:
+    """最后size个值（Python float列表），不足时前面补NaN"""
+    out = np.asarray(values[-size:], dtype=np.float64).tolist()
+    if len(out) < size:
+        out = [math.nan] * (size - len(out)) + out
+    return out
+
+
+def _div(a: float, b: float) -> float:
+    """与NumPy一致的除法：除以0得到±inf或NaN，而不是抛出异常"""
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def _minimum(a: float, b: float) -> float:
+    """与np.minimum一致：任一为NaN时结果为NaN"""
+    if a != a or b != b:
+        return math.nan
+    return a if a <= b else b
+
+
+def _maximum(a: float, b: float) -> float:
+    if a != a or b != b:
+        return math.nan
+    return a if a >= b else b
+
+
+# ---- 声明式规则：在加载配置时把条件表达式编译成一个函数，所有规则共用同一批子表达式 ----
+
+# 规则条件中可以引用的阈值参数，配置中的同名参数覆盖这里的默认值
+DEFAULT_PARAMS = {
+    'rsi_oversold': 30, 'rsi_overbought': 70, 'volume_multiplier': 1.5,
+    'stoch_oversold': 20, 'stoch_overbought': 80, 'momentum_threshold': 0.03,
+    'min_strength': 4, 'min_reasons': 2,
+}
+
+# 与原先硬编码的七类规则等价；顺序即判断顺序，同一条规则买入优先（sell只在buy不成立时计入），
+# has_buy/has_sell表示此前的规则是否已经给出了买入/卖出原因
+DEFAULT_RULES = [
+    {'name': 'rsi', 'weight': 2,
+     'buy': 'cross_down(rsi, rsi_oversold)', 'buy_text': REASON_TEXT[REASON_RSI_BUY],
+     'sell': 'cross_up(rsi, rsi_overbought)', 'sell_text': REASON_TEXT[REASON_RSI_SELL]},
+    {'name': 'ma', 'weight': 3,
+     'buy': 'cross_up(ma_short, ma_long)', 'buy_text': REASON_TEXT[REASON_MA_BUY],
+     'sell': 'cross_down(ma_short, ma_long)', 'sell_text': REASON_TEXT[REASON_MA_SELL]},
+    {'name': 'macd', 'weight': 2,
+     'buy': 'cross_up(macd, macd_signal)', 'buy_text': REASON_TEXT[REASON_MACD_BUY],
+     'sell': 'cross_down(macd, macd_signal)', 'sell_text': REASON_TEXT[REASON_MACD_SELL]},
+    {'name': 'bollinger', 'weight': 1,
+     'buy': 'cross_down(close, bb_lower)', 'buy_text': REASON_TEXT[REASON_BB_BUY],
+     'sell': 'cross_up(close, bb_upper)', 'sell_text': REASON_TEXT[REASON_BB_SELL]},
+    {'name': 'volume', 'weight': 1,
+     'buy': 'volume > volume_ma * volume_multiplier and has_buy',
+     'buy_text': REASON_TEXT[REASON_VOLUME_BUY],
+     'sell': 'volume > volume_ma * volume_multiplier and not has_buy and has_sell',
+     'sell_text': REASON_TEXT[REASON_VOLUME_SELL]},
+    {'name': 'stochastic', 'weight': 1,
+     'buy': 'cross_up(stoch_k, stoch_d) and stoch_k < stoch_oversold',
+     'buy_text': REASON_TEXT[REASON_STOCH_BUY],
+     'sell': 'cross_down(stoch_k, stoch_d) and stoch_k > stoch_overbought',
+     'sell_text': REASON_TEXT[REASON_STOCH_SELL]},
+    {'name': 'momentum', 'weight': 1,
+     'buy': 'change(close, 2) > momentum_threshold and has_buy',
+     'buy_text': REASON_TEXT[REASON_MOMENTUM_BUY],
+     'sell': 'change(close, 2) < -momentum_threshold and has_sell',
+     'sell_text': REASON_TEXT[REASON_MOMENTUM_SELL]},
+]
+
+# 消息中价格变化的计算方式（REASON_TEXT中的{change}）
+PRICE_CHANGE_EXPR = 'change(close, 2)'
+
+# 买入原因占低位、卖出原因占高位，int64最多容纳31条规则
+MAX_RULES = 31
+
+_COMPARE = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!='}
+_ARITHMETIC = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/'}
+_FOLD = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv,
+    '<': operator.lt, '<=': operator.le, '==': operator.eq, '!=': operator.ne,
+}
+
+
+class _Compiler:
+    """把规则条件编译成两份直通代码：向量版对整段K线逐列运算，标量版只算最后一根K线
+
+    表达式先被改写成只含列、常量和基本运算的有向无环图：prev()下推到列上（prev(a - b, 1)即
+    a和b各自后移一根），交叉、变化率等函数展开成基本运算，比较统一成<和<=，可交换运算的操作数排序。
+    结构相同的子表达式只生成一次，例如cross_up(macd, macd_signal)和cross_down(macd, macd_signal)
+    共用两列的后移结果，多条规则引用的同一个放量条件也只计算一次。
+    """
+
+    def __init__(self, params: Mapping[str, float]):
+        self.params = params
+        self.slots: Dict[tuple, Tuple[str, str]] = {}
+        self.vector_lines: List[str] = []
+        self.scalar_lines: List[str] = []
+        self.lags: Dict[str, int] = {}  # 列名 -> 用到的最大后移
+        self.rule_index = 0
+        self.requested = 0  # 展开后的运算次数（未去重）
+
+    # 每个节点是(key, 向量代码引用, 标量代码引用, 类型)，类型为'num'或'bool'
+    def _emit(self, key: tuple, vector: str, scalar: str, kind: str) -> tuple:
+        self.requested += 1
+        if key not in self.slots:
+            name = f"v{len(self.slots)}"
+            self.slots[key] = (name, kind)
+            self.vector_lines.append(f"    {name} = {vector}")
+            self.scalar_lines.append(f"    {name} = {scalar}")
+        name, kind = self.slots[key]
+        return key, name, name, kind
+
+    @staticmethod
+    def _const(value) -> tuple:
+        if isinstance(value, bool):
+            return ('const', value), repr(value), repr(value), 'bool'
+        value = float(value)
+        if not math.isfinite(value):
+            raise ValueError(f"常量必须是有限的数: {value}")
+        return ('const', value), repr(value), repr(value), 'num'
+
+    def _column(self, name: str, lag: int) -> tuple:
+        self.lags[name] = max(self.lags.get(name, 0), lag)
+        current = self._emit(('col', name, 0), f"c[{name!r}]", f"t_{name}[-1]", 'num')
+        if lag == 0:
+            return current
+        return self._emit(('col', name, lag), f"shift({current[1]}, {lag})", f"t_{name}[{-1 - lag}]", 'num')
+
+    def _binary(self, op: str, a: tuple, b: tuple) -> tuple:
+        if op in ('<', '<=', '==', '!='):
+            expected = 'num'
+        elif op in ('and', 'or'):
+            expected = 'bool'
+        else:
+            expected = 'num'
+        if a[3] != expected or b[3] != expected:
+            raise ValueError(f"运算 {op} 的操作数类型不对（{'条件' if expected == 'bool' else '数值'}）")
+        kind = 'num' if op in _ARITHMETIC.values() else 'bool'
+
+        if a[0][0] == 'const' and b[0][0] == 'const':
+            try:
+                if op == 'and':
+                    return self._const(a[0][1] and b[0][1])
+                if op == 'or':
+                    return self._const(a[0][1] or b[0][1])
+                return self._const(_FOLD[op](a[0][1], b[0][1]))
+            except ZeroDivisionError:
+                pass
+        if op in ('+', '*', '==', '!=', 'and', 'or') and repr(b[0]) < repr(a[0]):
+            a, b = b, a
+
+        if op == 'and':
+            vector, scalar = f"{a[1]} & {b[1]}", f"{a[2]} and {b[2]}"
+        elif op == 'or':
+            vector, scalar = f"{a[1]} | {b[1]}", f"{a[2]} or {b[2]}"
+        elif op == '/':
+            vector, scalar = f"{a[1]} / {b[1]}", f"div({a[2]}, {b[2]})"
+        else:
+            vector, scalar = f"{a[1]} {op} {b[1]}", f"{a[2]} {op} {b[2]}"
+        return self._emit((op, a[0], b[0]), vector, scalar, kind)
+
+    def _unary(self, op: str, a: tuple) -> tuple:
+        expected = 'bool' if op == 'not' else 'num'
+        if a[3] != expected:
+            raise ValueError(f"运算 {op} 的操作数类型不对（{'条件' if expected == 'bool' else '数值'}）")
+        if a[0][0] == 'const':
+            return self._const(not a[0][1] if op == 'not' else -a[0][1] if op == 'neg' else abs(a[0][1]))
+        vector, scalar = {
+            'not': (f"~{a[1]}", f"not {a[2]}"),
+            'neg': (f"-{a[1]}", f"-{a[2]}"),
+            'abs': (f"np.abs({a[1]})", f"abs({a[2]})"),
+        }[op]
+        return self._emit((op, a[0]), vector, scalar, 'bool' if op == 'not' else 'num')
+
+    def _compare(self, op: str, a: tuple, b: tuple) -> tuple:
+        if op == '>':
+            return self._binary('<', b, a)
+        if op == '>=':
+            return self._binary('<=', b, a)
+        return self._binary(op, a, b)
+
+    def expression(self, text: str) -> tuple:
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"无法解析表达式 {text!r}: {e.msg}")
+        return self._node(tree.body, 0)
+
+    def _node(self, node: ast.AST, lag: int) -> tuple:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float)):
+            return self._const(node.value)
+        if isinstance(node, ast.Name):
+            return self._name(node.id, lag)
+        if isinstance(node, ast.UnaryOp):
+            operand = self._node(node.operand, lag)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            return self._unary('neg' if isinstance(node.op, ast.USub) else 'not', operand)
+        if isinstance(node, ast.BinOp):
+            a, b = self._node(node.left, lag), self._node(node.right, lag)
+            if isinstance(node.op, ast.BitAnd):
+                return self._binary('and', a, b)
+            if isinstance(node.op, ast.BitOr):
+                return self._binary('or', a, b)
+            if type(node.op) in _ARITHMETIC:
+                return self._binary(_ARITHMETIC[type(node.op)], a, b)
+        if isinstance(node, ast.BoolOp):
+            op = 'and' if isinstance(node.op, ast.And) else 'or'
+            result = self._node(node.values[0], lag)
+            for value in node.values[1:]:
+                result = self._binary(op, result, self._node(value, lag))
+            return result
+        if isinstance(node, ast.Compare):
+            # a < b < c 等价于 (a < b) and (b < c)
+            left = self._node(node.left, lag)
+            result = None
+            for op, comparator in zip(node.ops, node.comparators):
+                if type(op) not in _COMPARE:
+                    break
+                right = self._node(comparator, lag)
+                term = self._compare(_COMPARE[type(op)], left, right)
+                result = term if result is None else self._binary('and', result, term)
+                left = right
+            else:
+                return result
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            return self._call(node.func.id, node.args, lag)
+        raise ValueError(f"不支持的表达式: {ast.unparse(node)}")
+
+    def _name(self, name: str, lag: int) -> tuple:
+        if name in ('has_buy', 'has_sell'):
+            if lag:
+                raise ValueError(f"{name}不能出现在prev()、交叉或变化率函数中")
+            # 只反映此前的规则，key带上规则序号
+            side = name[4:]
+            return self._emit((name, self.rule_index), f"{side} != 0", f"{side} != 0", 'bool')
+        if name in self.params:
+            return self._const(self.params[name])
+        if name in KNOWN_COLUMNS:
+            return self._column(name, lag)
+        raise ValueError(f"未知的名称: {name}（可用的列: {', '.join(KNOWN_COLUMNS)}）")
+
+    def _periods(self, args: List[ast.AST], index: int, default: int = 1) -> int:
+        if len(args) <= index:
+            return default
+        arg = args[index]
+        if not (isinstance(arg, ast.Constant) and isinstance(arg.value, int) and arg.value >= 1):
+            raise ValueError(f"周期数必须是正整数: {ast.unparse(arg)}")
+        return arg.value
+
+    def _call(self, name: str, args: List[ast.AST], lag: int) -> tuple:
+        arity = {'prev': (1, 2), 'change': (1, 2), 'abs': (1, 1), 'min': (2, 2), 'max': (2, 2),
+                 'cross_up': (2, 2), 'cross_down': (2, 2)}
+        if name not in arity:
+            raise ValueError(f"未知的函数: {name}（可用: {', '.join(arity)}）")
+        low, high = arity[name]
+        if not low <= len(args) <= high:
+            raise ValueError(f"{name}()的参数个数不对")
+
+        if name == 'prev':
+            return self._node(args[0], lag + self._periods(args, 1))
+        if name == 'change':
+            periods = self._periods(args, 1)
+            current, previous = self._node(args[0], lag), self._node(args[0], lag + periods)
+            return self._binary('/', self._binary('-', current, previous), previous)
+        if name == 'abs':
+            return self._unary('abs', self._node(args[0], lag))
+        if name in ('min', 'max'):
+            a, b = self._node(args[0], lag), self._node(args[1], lag)
+            if a[3] != 'num' or b[3] != 'num':
+                raise ValueError(f"{name}()的参数必须是数值")
+            if a[0][0] == 'const' and b[0][0] == 'const':
+                return self._const(min(a[0][1], b[0][1]) if name == 'min' else max(a[0][1], b[0][1]))
+            if repr(b[0]) < repr(a[0]):
+                a, b = b, a
+            function = 'minimum' if name == 'min' else 'maximum'
+            return self._emit((name, a[0], b[0]), f"np.{function}({a[1]}, {b[1]})",
+                              f"{function}({a[2]}, {b[2]})", 'num')
+
+        # 交叉：本根K线在另一侧，上一根K线不在（常量的后移就是它本身）
+        a, b = self._node(args[0], lag), self._node(args[1], lag)
+        prev_a, prev_b = self._node(args[0], lag + 1), self._node(args[1], lag + 1)
+        if name == 'cross_up':
+            return self._binary('and', self._compare('>', a, b), self._compare('<=', prev_a, prev_b))
+        return self._binary('and', self._compare('<', a, b), self._compare('>=', prev_a, prev_b))
+
+
+class CompiledRules:
+    """编译后的规则集
+
+    evaluate(columns)对整段K线向量化评估（columns的每一列可以是一维(时间)或二维(交易对×时间)数组），
+    evaluate_last(columns)只评估最后一根K线，单个交易对的实时检测用它，不为几根K线的小数组支付NumPy的调用开销。
+    """
+
+    def __init__(self, rules: List[Dict], params: Dict[str, float], columns: List[str],
+                 vector_source: str, scalar_source: str, reason_text: Dict[int, str],
+                 operations: int, expanded: int):
+        self.rules = rules
+        self.params = params
+        self.columns = columns
+        self.vector_source = vector_source
+        self.scalar_source = scalar_source
+        self.reason_text = reason_text
+        self.operations = operations  # 去重后实际执行的运算数
+        self.expanded = expanded  # 逐条规则展开后的运算数
+        self.min_strength = params['min_strength']
+        self.min_reasons = params['min_reasons']
+
+        namespace = {'np': np, 'shift': _shift, 'tail': _tail, 'div': _div,
+                     'minimum': _minimum, 'maximum': _maximum}
+        exec(compile(vector_source + scalar_source, '<signal_rules>', 'exec'), namespace)
+        self._vector = namespace['_evaluate']
+        self._scalar = namespace['_evaluate_last']
+
+    def evaluate(self, columns: Mapping[str, np.ndarray], min_bars: int = 30) -> Dict[str, np.ndarray]:
+        """返回每根K线的signal(1买入/-1卖出/0观望)、strength、reasons(所选方向的原因位掩码)和price_change"""
+        c = {name: np.asarray(columns[name], dtype=np.float64) for name in self.columns}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            buy, sell, strength, buy_count, sell_count, price_change = self._vector(c)
+
+        is_buy = (buy_count >= self.min_reasons) & (strength >= self.min_strength)
+        is_sell = ~is_buy & (sell_count >= self.min_reasons) & (strength >= self.min_strength)
+
+        # K线数量不足min_bars的位置一律观望
+        enough = np.arange(buy.shape[-1]) >= min_bars - 1
+        is_buy &= enough
+        is_sell &= enough
+
+        signal = np.where(is_buy, SIGNAL_BUY, np.where(is_sell, SIGNAL_SELL, SIGNAL_HOLD)).astype(np.int8)
+        return {
+            'signal': signal,
+            'strength': np.where(enough, strength, 0),
+            'reasons': np.where(is_buy, buy, np.where(is_sell, sell, 0)),
+            'price_change': price_change,
+        }
+
+    def evaluate_last(self, columns: Mapping[str, np.ndarray]) -> Dict:
+        """只评估最后一根K线，结果与evaluate(columns)的最后一个元素相同（K线数量由调用方保证）"""
+        buy, sell, strength, buy_count, sell_count, price_change = self._scalar(columns)
+        if buy_count >= self.min_reasons and strength >= self.min_strength:
+            return {'signal': SIGNAL_BUY, 'strength': strength, 'reasons': buy, 'price_change': price_change}
+        if sell_count >= self.min_reasons and strength >= self.min_strength:
+            return {'signal': SIGNAL_SELL, 'strength': strength, 'reasons': sell, 'price_change': price_change}
+        return {'signal': SIGNAL_HOLD, 'strength': strength, 'reasons': 0, 'price_change': price_change}
+
+    def describe(self, mask: int, price_change: float = 0.0) -> List[str]:
+        """把原因位掩码还原为文字说明"""
+        return [text.format(change=price_change) for bit, text in self.reason_text.items() if mask & bit]
+
+
+def compile_rules(rules: Optional[List[Dict]] = None, params: Optional[Mapping[str, float]] = None) -> CompiledRules:
+    """编译规则集，rules省略时使用DEFAULT_RULES，params覆盖DEFAULT_PARAMS；配置有误时抛出ValueError
+
+    每条规则: {"name": 名称, "weight": 权重, "buy": 买入条件, "sell": 卖出条件, "buy_text"/"sell_text": 说明}，
+    buy和sell至少有一个。条件是Python语法的表达式，可以使用：
+    - 指标列（close、volume、rsi、ma_short、macd、bb_lower、stoch_k等）和params中的阈值参数
+    - 算术运算、比较、and/or/not
+    - prev(x, n=1)、change(x, n=1)、cross_up(a, b)、cross_down(a, b)、abs(x)、min(a, b)、max(a, b)
+    - has_buy/has_sell：此前的规则是否已给出买入/卖出原因（用于只起确认作用的规则）
+    """
+    rules = DEFAULT_RULES if rules is None else rules
+    merged = dict(DEFAULT_PARAMS)
+    for name, value in (params or {}).items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"参数{name}必须是数值: {value!r}")
+        merged[name] = value
+    if not rules:
+        raise ValueError("至少需要一条规则")
+    if len(rules) > MAX_RULES:
+        raise ValueError(f"规则最多{MAX_RULES}条，当前{len(rules)}条")
+
+    compiler = _Compiler(merged)
+    count = len(rules)
+    reason_text: Dict[int, str] = {}
+    vector_rules: List[str] = []
+    scalar_rules: List[str] = []
+    for index, rule in enumerate(rules):
+        if not isinstance(rule, Mapping) or not (rule.get('buy') or rule.get('sell')):
+            raise ValueError(f"第{index + 1}条规则需要buy或sell条件: {rule!r}")
+        name = rule.get('name', f"rule{index + 1}")
+        if not isinstance(name, str) or not name:
+            raise ValueError(f"第{index + 1}条规则的名称必须是非空字符串: {name!r}")
+        weight = rule.get('weight', 1)
+        if isinstance(weight, bool) or not isinstance(weight, int):
+            raise ValueError(f"规则{name}的权重必须是整数: {weight!r}")
+        buy_bit, sell_bit = 1 << index, 1 << (count + index)
+
+        compiler.rule_index = index
+        conditions = {}
+        for side in ('buy', 'sell'):
+            if not rule.get(side):
+                continue
+            if not isinstance(rule[side], str):
+                raise ValueError(f"规则{name}的{side}条件必须是字符串: {rule[side]!r}")
+            try:
+                condition = compiler.expression(rule[side])
+            except (ValueError, SyntaxError, TypeError, AttributeError, RecursionError) as e:
+                raise ValueError(f"规则{name}的{side}条件: {e}")
+            if condition[3] != 'bool' or condition[0][0] == 'const':
+                raise ValueError(f"规则{name}的{side}条件必须是随K线变化的比较或逻辑表达式: {rule[side]}")
+            conditions[side] = condition
+        for side, bit, default in (('buy', buy_bit, f"{name}买入"), ('sell', sell_bit, f"{name}卖出")):
+            text = rule.get(f'{side}_text', default)
+            if not isinstance(text, str):
+                raise ValueError(f"规则{name}的{side}_text必须是字符串: {text!r}")
+            # 说明文字只能引用{change}，在编译时检查，避免规则触发时describe()才报错
+            try:
+                text.format(change=0.0)
+            except (KeyError, IndexError, ValueError) as e:
+                raise ValueError(f"规则{name}的{side}_text无法格式化（只能使用{{change}}）: {text!r} ({e!r})")
+            reason_text[bit] = text
+
+        # 把截至这条规则的子表达式代码移到规则代码之前，has_buy/has_sell因此只看到此前的规则
+        vector_rules.extend(compiler.vector_lines)
+        scalar_rules.extend(compiler.scalar_lines)
+        compiler.vector_lines, compiler.scalar_lines = [], []
+        # 规则名称来自配置文件，只以repr写入注释（不会包含换行），不进入生成的代码
+        vector_rules.append(f"    # {name!r}")
+        scalar_rules.append(f"    # {name!r}")
+        buy, sell = conditions.get('buy'), conditions.get('sell')
+        if buy and sell:
+            vector_rules += [f"    b = {buy[1]}", f"    s = {sell[1]} & ~b",
+                             f"    buy |= b * {buy_bit}", f"    sell |= s * {sell_bit}",
+                             "    buy_count += b", "    sell_count += s",
+                             f"    strength += {weight} * (b | s)"]
+        elif buy:
+            vector_rules += [f"    b = {buy[1]}", f"    buy |= b * {buy_bit}", "    buy_count += b",
+                             f"    strength += {weight} * b"]
+        else:
+            vector_rules += [f"    s = {sell[1]}", f"    sell |= s * {sell_bit}", "    sell_count += s",
+                             f"    strength += {weight} * s"]
+        if buy:
+            scalar_rules += [f"    if {buy[2]}:", f"        buy |= {buy_bit}", "        buy_count += 1",
+                             f"        strength += {weight}"]
+        if sell:
+            scalar_rules += [f"    {'elif' if buy else 'if'} {sell[2]}:", f"        sell |= {sell_bit}",
+                             "        sell_count += 1", f"        strength += {weight}"]
+
+    price_change = compiler.expression(PRICE_CHANGE_EXPR)
+    vector_rules.extend(compiler.vector_lines)
+    scalar_rules.extend(compiler.scalar_lines)
+
+    columns = list(compiler.lags)
+    vector_source = "\n".join([
+        "def _evaluate(c):",
+        "    buy = np.zeros(np.shape(c['close']), dtype=np.int64)",
+        "    sell = np.zeros_like(buy)",
+        "    strength = np.zeros_like(buy)",
+        "    buy_count = np.zeros_like(buy)",
+        "    sell_count = np.zeros_like(buy)",
+        *vector_rules,
+        f"    return buy, sell, strength, buy_count, sell_count, {price_change[1]}",
+        "", "",
+    ])
+    scalar_source = "\n".join([
+        "def _evaluate_last(c):",
+        *[f"    t_{name} = tail(c[{name!r}], {lag + 1})" for name, lag in compiler.lags.items()],
+        "    buy = sell = strength = buy_count = sell_count = 0",
+        *scalar_rules,
+        f"    return buy, sell, strength, buy_count, sell_count, {price_change[2]}",
+        "",
+    ])
+    try:
+        return CompiledRules(list(rules), merged, columns, vector_source, scalar_source,
+                             reason_text, len(compiler.slots), compiler.requested)
+    except (SyntaxError, TypeError, AttributeError) as e:
+        raise ValueError(f"规则编译失败: {e}")
+
+
+# notification_settings中沿用原有键名的阈值 -> 规则参数名
+SETTINGS_PARAMS = (('rsi_oversold', 'rsi_oversold'), ('rsi_overbought', 'rsi_overbought'),
+                   ('volume_multiplier', 'volume_multiplier'), ('min_signal_strength', 'min_strength'))
+
+
+def rules_from_config(config: Mapping) -> Tuple[Optional[List[Dict]], Dict[str, float]]:
+    """从配置文件取(规则, 参数)，供compile_rules使用；检测和回测用同一套规则
+
+    notification_settings中的阈值沿用原有的键名，signal_rules.params可以覆盖并补充其他阈值。
+    """
+    settings = config.get('notification_settings', {})
+    rule_settings = config.get('signal_rules', {})
+    params = {name: settings[key] for key, name in SETTINGS_PARAMS if key in settings}
+    params.update(rule_settings.get('params', {}))
+    return rule_settings.get('rules'), params
+
+
+@functools.lru_cache(maxsize=256)
+def _default_rules(rsi_oversold: float, rsi_overbought: float, volume_multiplier: float,
+                   min_strength: int) -> CompiledRules:
+    return compile_rules(params={'rsi_oversold': rsi_oversold, 'rsi_overbought': rsi_overbought,
+                                 'volume_multiplier': volume_multiplier, 'min_strength': min_strength})
+
+
+def evaluate_signals(columns: Mapping[str, np.ndarray], min_bars: int = 30,
+                     rsi_oversold: float = 30, rsi_overbought: float = 70,
+                     volume_multiplier: float = 1.5, min_strength: int = 4) -> Dict[str, np.ndarray]:
+    """用默认的七类规则对每根K线评估（回测按参数组合调用，编译结果按参数缓存）
+
+    返回signal(1买入/-1卖出/0观望)、strength、reasons(所选方向的原因位掩码)和price_change。
+    """
+    rules = _default_rules(rsi_oversold, rsi_overbought, volume_multiplier, min_strength)
+    return rules.evaluate(columns, min_bars)
+
+
+def trend_direction(latest: Mapping[str, float]) -> int:
+    """一根K线（通常是最新一根）的趋势方向：短期均线和MACD都在上方为1，都在下方为-1，其余（含数据不足）为0"""
+    ma = float(latest['ma_short']) - float(latest['ma_long'])
+    macd = float(latest['macd']) - float(latest['macd_signal'])
+    if ma > 0 and macd > 0:
+        return SIGNAL_BUY
+    if ma < 0 and macd < 0:
+        return SIGNAL_SELL
+    return SIGNAL_HOLD
+
+
+def confirm_signal(signal: int, higher_direction: int) -> bool:
+    """跨周期确认：信号方向不能与更大周期的趋势相反"""
+    return signal == SIGNAL_HOLD or higher_direction != -signal
+
+
+def describe_reasons(mask: int, price_change: float = 0.0) -> List[str]:
+    """把默认规则的原因位掩码还原为文字说明"""
+    return [text.format(change=price_change) for bit, text in REASON_TEXT.items() if mask & bit]
+
+
+def _example_rules(count: int) -> List[Dict]:
+    """默认七条规则之外再生成一批自定义规则（不同阈值、周期和组合），用于测量规则数量对耗时的影响"""
+    rules = [dict(rule) for rule in DEFAULT_RULES]
+    templates = [
+        ('cross_down(rsi, {low})', 'cross_up(rsi, {high})'),
+        ('cross_up(ma_short, ma_long) and rsi < {high}', 'cross_down(ma_short, ma_long) and rsi > {low}'),
+        ('cross_up(macd, macd_signal) and macd < 0', 'cross_down(macd, macd_signal) and macd > 0'),
+        ('close < bb_lower and change(close, {n}) < -{pct}', 'close > bb_upper and change(close, {n}) > {pct}'),
+        ('cross_up(stoch_k, stoch_d) and stoch_k < {low} and has_buy',
+         'cross_down(stoch_k, stoch_d) and stoch_k > {high} and has_sell'),
+        ('volume > volume_ma * {mult} and close > prev(close, {n})',
+         'volume > volume_ma * {mult} and close < prev(close, {n})'),
+        ('prev(rsi, {n}) < {low} and rsi > prev(rsi) and has_buy',
+         'prev(rsi, {n}) > {high} and rsi < prev(rsi) and has_sell'),
+    ]
+    for i in range(count - len(rules)):
+        buy, sell = templates[i % len(templates)]
+        values = {'low': 25 + i % 4 * 5, 'high': 75 - i % 4 * 5, 'n': 1 + i % 3,
+                  'pct': 0.01 * (1 + i % 3), 'mult': 1.2 + 0.2 * (i % 3)}
+        rules.append({'name': f"custom{i + 1}", 'weight': 1,
+                      'buy': buy.format(**values), 'sell': sell.format(**values)})
+    return rules
+
+
+# 测量规则数量对评估耗时的影响：单个交易对只评估最后一根K线，以及二维数组一次评估全部交易对
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(3)
+    pairs, bars = 500, 100
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (pairs, bars)), axis=1))
+    columns = {name: close * (1 + rng.normal(0, 0.01, close.shape)) for name in KNOWN_COLUMNS}
+    columns.update({name: rng.uniform(0, 100, close.shape) for name in ('rsi', 'stoch_k', 'stoch_d')})
+    columns.update({'close': close, 'macd': rng.normal(0, 1, close.shape), 'macd_signal': rng.normal(0, 1, close.shape),
+                    'volume': rng.uniform(50, 200, close.shape), 'volume_ma': rng.uniform(50, 100, close.shape)})
+    symbols = [{name: values[i] for name, values in columns.items()} for i in range(pairs)]
+
+    def timed(fn, repeat: int = 5) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    print(f"{pairs}个交易对 × {bars}根K线")
+    for count in (len(DEFAULT_RULES), 14, MAX_RULES):
+        rules = compile_rules(_example_rules(count))
+        per_symbol_vector = timed(lambda: [rules.evaluate({name: data[name][-3:] for name in rules.columns}, min_bars=3)
+                                           for data in symbols]) / pairs
+        per_symbol_last = timed(lambda: [rules.evaluate_last(data) for data in symbols]) / pairs
+        batch = timed(lambda: rules.evaluate(columns))
+        print(f"  {count:2d}条规则（展开{rules.expanded:3d}次运算，去重后{rules.operations:3d}次）: "
+              f"单个交易对 最后三根K线向量评估 {per_symbol_vector * 1e6:6.1f} µs  只算最后一根 {per_symbol_last * 1e6:5.1f} µs  "
+              f"全部交易对一次评估 {batch * 1000:5.1f} ms")
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 每日统计保留的天数和最强信号条数
+DAILY_HISTORY_DAYS = 7
+TOP_SIGNALS = 5
+
+
+class SignalStateStore:
+    """信号状态存储 - 按(交易对, 周期)记录当前信号，按(交易对, 周期, 信号)记录上次通知时间
+
+    only_on_transition为True时，只有信号发生变化（如HOLD→BUY）才会通知；
+    同一方向的信号在cooldown_seconds内不会重复通知。状态保存在JSON文件中，重启后仍然有效。
+    """
+
+    def __init__(self, path: Optional[str] = 'signal_state.json', cooldown_seconds: float = 3600,
+                 only_on_transition: bool = True):
+        self.path = path
+        self.cooldown_seconds = cooldown_seconds
+        self.only_on_transition = only_on_transition
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict] = {}
+        self._notified: Dict[str, float] = {}
+        self._daily: Dict[str, Dict] = {}
+        self._summary_sent: Optional[str] = None  # 最近一次已发送每日总结的日期
+        self._dirty = False
+        self.load()
+
+    @staticmethod
+    def _key(*parts) -> str:
+        return "|".join(str(part) for part in parts)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with self._lock:
+                self._states = data.get('states', {})
+                self._notified = data.get('notified', {})
+                self._daily = data.get('daily', {})
+                self._summary_sent = data.get('summary_sent')
+            logger.info(f"加载信号状态: {len(self._states)} 个交易对/周期")
+        except Exception as e:
+            logger.error(f"读取信号状态文件失败: {e}")
+
+    def save(self):
+        """有变化时写入状态文件（先写临时文件再替换，避免中途退出损坏文件）"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({'states': self._states, 'notified': self._notified,
+                               'daily': self._daily, 'summary_sent': self._summary_sent},
+                              ensure_ascii=False, indent=1)
+            self._dirty = False
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"保存信号状态失败: {e}")
+
+    def update(self, symbol: str, interval: str, signal_data: Dict, eligible: bool,
+               now: float = None) -> bool:
+        """记录一次检测结果，返回是否应当通知
+
+        eligible表示该信号是否满足持仓/观察列表的通知条件（should_notify）。
+        """
+        now = time.time() if now is None else now
+        signal = signal_data['signal']
+        state_key = self._key(symbol, interval)
+
+        with self._lock:
+            previous = self._states.get(state_key)
+            transition = previous is None or previous['signal'] != signal
+            if transition:
+                self._states[state_key] = {'signal': signal, 'since': now}
+            self._states[state_key].update({
+                'strength': signal_data.get('strength', 0),
+                'price': signal_data.get('price'),
+                'updated': now,
+            })
+            self._record_daily(symbol, signal_data, transition, now)
+            self._dirty = True
+
+            if not eligible or signal == 'HOLD':
+                return False
+            if self.only_on_transition and not transition:
+                return False
+
+            notify_key = self._key(symbol, interval, signal)
+            last = self._notified.get(notify_key)
+            if last is not None and now - last < self.cooldown_seconds:
+                return False
+            self._notified[notify_key] = now
+            return True
+
+    def _record_daily(self, symbol: str, signal_data: Dict, transition: bool, now: float):
+        date = datetime.fromtimestamp(now).strftime('%Y-%m-%d')
+        daily = self._daily.get(date)
+        if daily is None:
+            daily = self._daily[date] = {'buy_signals': 0, 'sell_signals': 0, 'total_checks': 0,
+                                         'active_symbols': {}, 'top_signals': []}
+            for old in sorted(self._daily)[:-DAILY_HISTORY_DAYS]:
+                del self._daily[old]
+
+        daily['total_checks'] += 1
+        signal = signal_data['signal']
+        # 只统计新出现的信号，持续多轮的同一信号算一次
+        if signal == 'HOLD' or not transition:
+            return
+
+        daily['buy_signals' if signal == 'BUY' else 'sell_signals'] += 1
+        daily['active_symbols'][symbol] = daily['active_symbols'].get(symbol, 0) + 1
+
+        top = daily['top_signals']
+        top.append({'symbol': symbol, 'action': signal, 'strength': signal_data.get('strength', 0)})
+        top.sort(key=lambda item: item['strength'], reverse=True)
+        del top[TOP_SIGNALS:]
+
+    def current(self, symbol: str, interval: str) -> Optional[Dict]:
+        with self._lock:
+            state = self._states.get(self._key(symbol, interval))
+            return dict(state) if state else None
+
+    def daily_summary(self, date: str = None) -> Dict:
+        """返回send_daily_summary所需格式的统计，date格式为YYYY-MM-DD，默认当天"""
+        date = date or datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            daily = self._daily.get(date)
+            if daily is None:
+                return {'date': date, 'buy_signals': 0, 'sell_signals': 0, 'total_checks': 0,
+                        'active_symbols': {}, 'top_signals': []}
+            return {
+                'date': date,
+                'buy_signals': daily['buy_signals'],
+                'sell_signals': daily['sell_signals'],
+                'total_checks': daily['total_checks'],
+                'active_symbols': dict(sorted(daily['active_symbols'].items(),
+                                              key=lambda item: item[1], reverse=True)),
+                'top_signals': [dict(item) for item in daily['top_signals']],
+            }
+
+    def pending_summary(self, today: str = None) -> Optional[str]:
+        """今天之前最近一个有统计、尚未发送总结的日期；已发送的日期保存在状态文件中，单次运行之间也不会漏发或重发"""
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            dates = [date for date in self._daily if date < today]
+            if not dates:
+                return None
+            latest = max(dates)
+            if self._summary_sent is not None and latest <= self._summary_sent:
+                return None
+            return latest
+
+    def mark_summary_sent(self, date: str):
+        with self._lock:
+            self._summary_sent = date
+            self._dirty = True
+
+    def forget(self, symbols: List[str]):
+        """删除不再监控的交易对的状态"""
+        prefixes = tuple(f"{symbol}|" for symbol in symbols)
+        with self._lock:
+            self._states = {k: v for k, v in self._states.items() if not k.startswith(prefixes)}
+            self._notified = {k: v for k, v in self._notified.items() if not k.startswith(prefixes)}
+            self._dirty = True
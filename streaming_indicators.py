@@ -0,0 +1,308 @@
+import math
+import logging
+from collections import deque
+from typing import Dict, Optional, TYPE_CHECKING
+
+import numpy as np
+
+from live_state import LiveState
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+NAN = float('nan')
+
+
+class _RollingWindow:
+    """定长窗口的滚动和/平方和；保存已确认的前n-1个值，当前值只参与试算"""
+
+    # 每确认这么多个值后重新求和，消除浮点累积误差
+    RESUM_EVERY = 1000
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.nan_count = 0
+        self.commits = 0
+
+    def stats(self, x: float):
+        """包含当前值x的窗口均值和总体标准差，数据不足时返回NaN"""
+        if len(self.values) < self.size - 1:
+            return NAN, NAN
+        if self.nan_count or math.isnan(x):
+            return NAN, NAN
+
+        total = self.total + x
+        mean = total / self.size
+        variance = max((self.total_sq + x * x) / self.size - mean * mean, 0.0)
+        return mean, math.sqrt(variance)
+
+    def commit(self, x: float):
+        self.values.append(x)
+        if math.isnan(x):
+            self.nan_count += 1
+        else:
+            self.total += x
+            self.total_sq += x * x
+
+        if len(self.values) > self.size - 1:
+            old = self.values.popleft()
+            if math.isnan(old):
+                self.nan_count -= 1
+            else:
+                self.total -= old
+                self.total_sq -= old * old
+
+        self.commits += 1
+        if self.commits % self.RESUM_EVERY == 0:
+            finite = [v for v in self.values if not math.isnan(v)]
+            self.total = math.fsum(finite)
+            self.total_sq = math.fsum(v * v for v in finite)
+
+
+class _Ema:
+    """指数移动平均（adjust=False），首个值作为初始值"""
+
+    def __init__(self, alpha: float, min_periods: int):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.value = None
+        self.count = 0
+
+    def peek(self, x: float) -> float:
+        if self.value is None:
+            return x
+        return self.value + self.alpha * (x - self.value)
+
+    def output(self, value: float) -> float:
+        return value if self.count + 1 >= self.min_periods else NAN
+
+    def commit(self, value: float):
+        self.value = value
+        self.count += 1
+
+
+class _MonotonicExtreme:
+    """单调队列维护窗口最大值/最小值；保存已确认的前n-1个值"""
+
+    def __init__(self, size: int, maximum: bool):
+        self.size = size
+        self.maximum = maximum
+        self.items = deque()  # (序号, 值)，值单调
+        self.count = 0
+
+    def _better(self, a: float, b: float) -> bool:
+        return a >= b if self.maximum else a <= b
+
+    def peek(self, x: float) -> float:
+        if self.count < self.size - 1:
+            return NAN
+        if not self.items:
+            return x
+        best = self.items[0][1]
+        return x if self._better(x, best) else best
+
+    def commit(self, x: float):
+        while self.items and self._better(x, self.items[-1][1]):
+            self.items.pop()
+        self.items.append((self.count, x))
+        self.count += 1
+        # 只保留最近size-1个已确认值
+        while self.items and self.items[0][0] <= self.count - self.size:
+            self.items.popleft()
+
+
+class StreamingIndicators:
+    """单个交易对/周期的流式技术指标 - 每根新K线或未收盘K线的更新都是O(1)"""
+
+    def __init__(self, rsi_period: int = 14, ma_short: int = 9, ma_long: int = 21,
+                 volume_ma_period: int = 20, macd_fast: int = 12, macd_slow: int = 26,
+                 macd_signal: int = 9, bb_window: int = 20, bb_dev: float = 2.0,
+                 stoch_window: int = 14, stoch_smooth: int = 3, history: int = 30):
+        self.rsi_period = rsi_period
+        self.ma_short = ma_short
+        self.ma_long = ma_long
+        self.volume_ma_period = volume_ma_period
+        self.macd_fast = macd_fast
+        self.macd_slow = macd_slow
+        self.macd_signal = macd_signal
+        self.bb_window = bb_window
+        self.bb_dev = bb_dev
+        self.stoch_window = stoch_window
+        self.stoch_smooth = stoch_smooth
+        self.history_size = history
+        self.reset()
+
+    def reset(self):
+        """清空全部状态"""
+        # Wilder RSI: alpha = 1/period
+        self._rsi_up = _Ema(1.0 / self.rsi_period, self.rsi_period)
+        self._rsi_down = _Ema(1.0 / self.rsi_period, self.rsi_period)
+        self._prev_close = None
+
+        self._ma_short = _RollingWindow(self.ma_short)
+        self._ma_long = _RollingWindow(self.ma_long)
+        self._bollinger = _RollingWindow(self.bb_window)
+        self._volume_ma = _RollingWindow(self.volume_ma_period)
+
+        # MACD: span -> alpha = 2/(span+1)
+        self._ema_fast = _Ema(2.0 / (self.macd_fast + 1), self.macd_fast)
+        self._ema_slow = _Ema(2.0 / (self.macd_slow + 1), self.macd_slow)
+        self._macd_signal = _Ema(2.0 / (self.macd_signal + 1), self.macd_signal)
+
+        self._stoch_high = _MonotonicExtreme(self.stoch_window, maximum=True)
+        self._stoch_low = _MonotonicExtreme(self.stoch_window, maximum=False)
+        self._stoch_d = _RollingWindow(self.stoch_smooth)
+
+        self.bar_count = 0          # 已确认的K线数量
+        self.last_open_time = None  # 最近一次更新的K线开盘时间
+        self._pending = None        # 尚未收盘的K线
+        # 最近若干根K线的价格和指标（定长环形缓冲区，重置时复用）
+        if getattr(self, 'state', None) is None:
+            self.state = LiveState(self.history_size)
+        else:
+            self.state.clear()
+
+    def _step(self, bar: tuple, commit: bool) -> tuple:
+        """计算一根K线的指标，返回按live_state.LIVE_COLUMNS顺序的一行"""
+        open_time, open_, high, low, close, volume = bar
+
+        # RSI
+        diff = close - self._prev_close if self._prev_close is not None else 0.0
+        up = self._rsi_up.peek(diff if diff > 0 else 0.0)
+        down = self._rsi_down.peek(-diff if diff < 0 else 0.0)
+        if self._rsi_up.count + 1 < self._rsi_up.min_periods:
+            rsi = NAN
+        elif down == 0:
+            rsi = 100.0
+        else:
+            rsi = 100.0 - 100.0 / (1.0 + up / down)
+
+        # 均线和布林带
+        ma_short, _ = self._ma_short.stats(close)
+        ma_long, _ = self._ma_long.stats(close)
+        bb_middle, bb_std = self._bollinger.stats(close)
+        volume_ma, _ = self._volume_ma.stats(volume)
+
+        # MACD
+        fast = self._ema_fast.peek(close)
+        slow = self._ema_slow.peek(close)
+        macd_ready = self._ema_slow.count + 1 >= self._ema_slow.min_periods
+        macd = fast - slow if macd_ready else NAN
+        if macd_ready:
+            signal_value = self._macd_signal.peek(macd)
+            macd_signal = self._macd_signal.output(signal_value)
+        else:
+            signal_value = macd_signal = NAN
+
+        # 随机指标
+        highest = self._stoch_high.peek(high)
+        lowest = self._stoch_low.peek(low)
+        if math.isnan(highest) or highest == lowest:
+            stoch_k = NAN
+        else:
+            stoch_k = 100.0 * (close - lowest) / (highest - lowest)
+        stoch_d, _ = self._stoch_d.stats(stoch_k)
+
+        row = (open_time, open_, high, low, close, volume,
+               rsi, ma_short, ma_long, macd, macd_signal, macd - macd_signal,
+               bb_middle + self.bb_dev * bb_std, bb_middle - self.bb_dev * bb_std, bb_middle,
+               volume_ma, stoch_k, stoch_d)
+
+        if commit:
+            self._rsi_up.commit(up)
+            self._rsi_down.commit(down)
+            self._prev_close = close
+            self._ma_short.commit(close)
+            self._ma_long.commit(close)
+            self._bollinger.commit(close)
+            self._volume_ma.commit(volume)
+            self._ema_fast.commit(fast)
+            self._ema_slow.commit(slow)
+            if macd_ready:
+                self._macd_signal.commit(signal_value)
+            self._stoch_high.commit(high)
+            self._stoch_low.commit(low)
+            self._stoch_d.commit(stoch_k)
+            self.bar_count += 1
+
+        return row
+
+    def update(self, open_time: int, open_: float, high: float, low: float, close: float,
+               volume: float, closed: bool = True):
+        """输入一根K线；未收盘的K线可以用同一个open_time反复更新，不会改变已确认的状态"""
+        if self._pending is not None and open_time != self._pending[0]:
+            # 上一根未收盘K线已被新K线取代，按最后一次的数据确认
+            self._step(self._pending, commit=True)
+            self._pending = None
+
+        bar = (open_time, open_, high, low, close, volume)
+        row = self._step(bar, commit=closed)
+        self._pending = None if closed else bar
+
+        if len(self.state) and self.last_open_time == open_time:
+            self.state.replace_last(row)
+        else:
+            self.state.append(row)
+        self.last_open_time = open_time
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        return self.state.latest()
+
+    def feed_frame(self, df: 'pd.DataFrame', last_closed: bool = False) -> 'pd.DataFrame':
+        """输入get_klines返回的K线，只处理尚未处理过的K线；返回最近history根K线的指标"""
+        if df.empty:
+            return self.frame()
+
+        open_times = df.index.values.astype('datetime64[ms]').astype(np.int64)
+        self._feed(open_times, df['open'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(),
+                   df['close'].to_numpy(), df['volume'].to_numpy(), last_closed)
+        return self.frame()
+
+    def feed_rows(self, rows: np.ndarray, last_closed: bool = False):
+        """输入fetch_klines返回的行格式数组（列顺序见kline_store.KLINE_FIELDS），不需要先构建DataFrame"""
+        if len(rows) == 0:
+            return
+        self._feed(rows[:, 0].astype(np.int64), rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4], rows[:, 5],
+                   last_closed)
+
+    def _feed(self, open_times: np.ndarray, opens: np.ndarray, highs: np.ndarray, lows: np.ndarray,
+              closes: np.ndarray, volumes: np.ndarray, last_closed: bool):
+        if self.last_open_time is not None and open_times[0] > self.last_open_time:
+            # 数据出现断档，流式状态已不连续，重新预热
+            logger.info("K线数据不连续，重新初始化指标状态")
+            self.reset()
+
+        start = 0
+        if self.last_open_time is not None:
+            # 最后一根K线尚未收盘时从它开始重新输入，已收盘（已计入状态）时从下一根开始
+            side = 'left' if self._pending is not None else 'right'
+            start = int(np.searchsorted(open_times, self.last_open_time, side=side))
+
+        last = len(open_times) - 1
+        for i in range(start, len(open_times)):
+            # 最后一根K线通常尚未收盘
+            self.update(int(open_times[i]), float(opens[i]), float(highs[i]), float(lows[i]),
+                        float(closes[i]), float(volumes[i]), closed=(i < last or last_closed))
+
+    def frame(self) -> 'pd.DataFrame':
+        """把保留的最近K线和指标转换为DataFrame（检测信号时直接使用state，不需要DataFrame）"""
+        return self.state.frame()
+
+
+# 演示：逐根更新的耗时（与ta/批量计算的一致性见tests/test_indicator_parity.py）
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(7)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 20000)))
+    engine = StreamingIndicators()
+    started = time.perf_counter()
+    for i, price in enumerate(close):
+        engine.update(i * 3_600_000, price, price * 1.005, price * 0.995, price, 500.0, closed=True)
+    print(f"每根K线更新: {(time.perf_counter() - started) / len(close) * 1e6:.1f} µs")
+    print(engine.frame().tail(3))
@@ -0,0 +1,51 @@
+import os
+import sys
+import copy
+import json
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from binance_trend_detector import BinanceTrendDetector  # noqa: E402
+
+
+@pytest.fixture
+def config():
+    with open(os.path.join(ROOT, 'trading_config.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['timeframes']['enabled'] = True
+    return config
+
+
+def test_confirm_interval_must_be_detected(config):
+    """确认周期不在intervals中时没有它的K线汇总，配置被拒绝而不是静默关闭确认"""
+    detector = BinanceTrendDetector()
+    detector.apply_config(config)
+    assert detector.confirm_timeframe == '4h'
+
+    broken = copy.deepcopy(config)
+    broken['timeframes']['confirm_interval'] = '1d'
+    with pytest.raises(ValueError):
+        detector.apply_config(broken)
+    assert detector.confirm_timeframe == '4h'
+    assert detector.timeframes == config['timeframes']['intervals']
+
+
+@pytest.mark.parametrize('changes', [{'max_symbol': 10}, {'price_change_range': 5}])
+def test_invalid_screener_settings_keep_current_config(config, changes):
+    """初筛配置写错（未知的设置项或类型错误）时apply_config抛出ValueError，热加载继续使用当前配置"""
+    detector = BinanceTrendDetector()
+    config['screener']['enabled'] = True
+    detector.apply_config(config)
+    current = detector.screener
+    assert current is not None
+
+    broken = copy.deepcopy(config)
+    broken['screener'].update(changes)
+    broken['holding_list'] = ['XRPUSDT']
+    with pytest.raises(ValueError):
+        detector.apply_config(broken)
+    assert detector.screener is current
+    assert detector.holding_list == config['holding_list']
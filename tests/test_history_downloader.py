@@ -0,0 +1,105 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from binance_trend_detector import BinanceTrendDetector  # noqa: E402
+from history_downloader import HistoryDownloader, import_archives, validate_klines  # noqa: E402
+from kline_store import KlineStore, OPEN_TIME, rows_from_api  # noqa: E402
+from rate_limiter import RequestWeightLimiter  # noqa: E402
+from replay_server import ReplayServer  # noqa: E402
+from synthetic_data import generate_rows, to_api_klines  # noqa: E402
+
+HOUR_MS = 3_600_000
+END_MS = 1_700_000_000_000 - 1_700_000_000_000 % HOUR_MS
+BARS = 2500
+
+
+@pytest.fixture
+def server():
+    server = ReplayServer(['BTCUSDT'], bars=BARS, end_ms=END_MS).start()
+    yield server
+    server.close()
+
+
+def served_rows(server):
+    """替身服务返回的K线（价格按接口格式保留了有效位数）"""
+    return rows_from_api(to_api_klines(server.rows('BTCUSDT')))
+
+
+def make_downloader(server, store):
+    detector = BinanceTrendDetector()
+    detector.base_url = server.url
+    detector.rate_limiter = RequestWeightLimiter(weight_limit=10 ** 9)
+    return HistoryDownloader(detector, store, workers=4)
+
+
+def test_backfill_before_stored_bars(server, tmp_path):
+    """已有最近约100根K线（检测流程留下的）时，更早的开始日期仍要补齐之前的历史"""
+    store = KlineStore(str(tmp_path))
+    expected = served_rows(server)
+    store.upsert('BTCUSDT', '1h', expected[-100:])
+
+    start_ms = int(expected[0, OPEN_TIME])
+    report = make_downloader(server, store).download(['BTCUSDT'], '1h', start_ms, END_MS)
+
+    stored = np.asarray(store.load('BTCUSDT', '1h'))
+    assert report['BTCUSDT']['written'] == BARS - 100
+    assert np.array_equal(stored, expected)
+    assert validate_klines(stored, HOUR_MS)['gaps'] == []
+
+
+def test_backfill_resumes_head_after_failed_page(server, tmp_path, monkeypatch):
+    """补之前的历史时某页失败，已写入的部分与已存数据相连，再次运行补齐其余部分"""
+    store = KlineStore(str(tmp_path))
+    expected = served_rows(server)
+    store.upsert('BTCUSDT', '1h', expected[-100:])
+    start_ms = int(expected[0, OPEN_TIME])
+    downloader = make_downloader(server, store)
+
+    fetch_page = downloader._fetch_page
+
+    def flaky(symbol, interval, page_start, page_end):
+        if page_start <= start_ms <= page_end:
+            raise IOError("模拟超时")
+        return fetch_page(symbol, interval, page_start, page_end)
+
+    monkeypatch.setattr(downloader, '_fetch_page', flaky)
+    report = downloader.download(['BTCUSDT'], '1h', start_ms, END_MS)
+    assert 'failed_page' in report['BTCUSDT']
+    assert validate_klines(np.asarray(store.load('BTCUSDT', '1h')), HOUR_MS)['gaps'] == []
+
+    monkeypatch.setattr(downloader, '_fetch_page', fetch_page)
+    downloader.download(['BTCUSDT'], '1h', start_ms, END_MS)
+    assert np.array_equal(np.asarray(store.load('BTCUSDT', '1h')), expected)
+
+
+def test_download_into_empty_store(server, tmp_path):
+    store = KlineStore(str(tmp_path))
+    expected = served_rows(server)
+    start_ms = int(expected[-801, OPEN_TIME])
+    report = make_downloader(server, store).download(['BTCUSDT'], '1h', start_ms, END_MS)
+    assert report['BTCUSDT']['written'] == 801
+    assert np.array_equal(np.asarray(store.load('BTCUSDT', '1h')), expected[-801:])
+
+
+def test_import_skips_unsupported_intervals(tmp_path):
+    """目录中混有不支持周期（1s）的归档时跳过它，其余归档照常导入并生成报告"""
+    archives = tmp_path / 'archives'
+    archives.mkdir()
+    for interval, interval_ms in (('1h', HOUR_MS), ('1s', 1000)):
+        rows = generate_rows(0, 24, interval_ms=interval_ms, end_ms=END_MS)
+        lines = [",".join(str(value) for value in row) for row in to_api_klines(rows)]
+        (archives / f"BTCUSDT-{interval}-2023-11-14.csv").write_text("\n".join(lines) + "\n")
+
+    store = KlineStore(str(tmp_path / 'store'))
+    report = import_archives(str(archives), store)
+
+    assert list(report) == ['BTCUSDT 1h']
+    assert report['BTCUSDT 1h']['written'] == 24
+    assert len(store.load('BTCUSDT', '1s')) == 0
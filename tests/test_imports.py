@@ -0,0 +1,33 @@
+import os
+import sys
+import glob
+import importlib
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+MODULES = sorted(os.path.splitext(os.path.basename(path))[0]
+                 for path in glob.glob(os.path.join(ROOT, '*.py')) + glob.glob(os.path.join(ROOT, 'benchmarks', '*.py')))
+
+
+@pytest.mark.parametrize('name', MODULES)
+def test_import(name):
+    """每个模块都能单独导入（清理导入时不会漏掉其他模块对它的依赖）"""
+    importlib.import_module(name)
+
+
+def test_backtest_sweep_runs(tmp_path):
+    """回测（批量指标+规则+进程池）的最小冒烟测试"""
+    from synthetic_data import generate_rows
+    from kline_store import KlineStore
+    import backtest
+
+    store = KlineStore(str(tmp_path))
+    store.upsert('AAAUSDT', '1h', generate_rows(0, 500))
+    grid = {'rsi_period': [14], 'ma_short': [9], 'ma_long': [21], 'min_strength': [3, 4]}
+    report = backtest.run_parameter_sweep(['AAAUSDT'], '1h', grid, str(tmp_path), processes=1)
+    assert len(report) == 2
+    assert all(item['trades'] >= 0 for item in report)
@@ -0,0 +1,133 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import ta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from batch_indicators import compute_indicators  # noqa: E402
+from kline_store import OPEN, CLOSE_TIME  # noqa: E402
+from live_state import INDICATOR_COLUMNS  # noqa: E402
+from streaming_indicators import StreamingIndicators  # noqa: E402
+from timeframe_resampler import IncrementalResampler, resample_rows  # noqa: E402
+
+TOLERANCE = 1e-6
+RESAMPLE_INTERVALS = ['5m', '15m', '1h', '4h', '1d']
+
+
+def synthetic_frame(bars: int = 500, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    high = close * (1 + rng.uniform(0, 0.01, bars))
+    low = close * (1 - rng.uniform(0, 0.01, bars))
+    volume = rng.uniform(100, 1000, bars)
+    index = pd.date_range('2024-01-01', periods=bars, freq='h')
+    return pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close, 'volume': volume},
+                        index=index)
+
+
+def ta_reference(df: pd.DataFrame) -> pd.DataFrame:
+    """ta库的全量计算（detector.use_streaming_indicators = False时的算法）"""
+    expected = {
+        'rsi': ta.momentum.RSIIndicator(df['close'], window=14).rsi(),
+        'ma_short': ta.trend.SMAIndicator(df['close'], window=9).sma_indicator(),
+        'ma_long': ta.trend.SMAIndicator(df['close'], window=21).sma_indicator(),
+        'volume_ma': df['volume'].rolling(20).mean(),
+    }
+    macd = ta.trend.MACD(df['close'])
+    expected.update(macd=macd.macd(), macd_signal=macd.macd_signal(), macd_histogram=macd.macd_diff())
+    bollinger = ta.volatility.BollingerBands(df['close'])
+    expected.update(bb_upper=bollinger.bollinger_hband(), bb_lower=bollinger.bollinger_lband(),
+                    bb_middle=bollinger.bollinger_mavg())
+    stoch = ta.momentum.StochasticOscillator(df['high'], df['low'], df['close'])
+    expected.update(stoch_k=stoch.stoch(), stoch_d=stoch.stoch_signal())
+    return pd.DataFrame(expected)
+
+
+def assert_columns_match(actual, expected: pd.DataFrame):
+    for column in INDICATOR_COLUMNS:
+        a = np.asarray(actual[column], dtype=float)
+        b = expected[column].to_numpy(dtype=float)
+        assert np.array_equal(np.isnan(a), np.isnan(b)), f"{column}的NaN位置不一致"
+        mask = ~np.isnan(b)
+        assert np.allclose(a[mask], b[mask], rtol=0, atol=TOLERANCE), column
+
+
+def stream(df: pd.DataFrame, intrabar: bool = True) -> pd.DataFrame:
+    engine = StreamingIndicators(history=len(df))
+    for i, (timestamp, row) in enumerate(df.iterrows()):
+        open_time = int(timestamp.value // 1_000_000)
+        if intrabar:
+            # 先以未收盘状态更新一次，再以收盘数据确认，覆盖未收盘K线的更新路径
+            engine.update(open_time, row['open'], row['high'] * 0.999, row['low'] * 1.001,
+                          row['close'] * 1.002, row['volume'] / 2, closed=False)
+        engine.update(open_time, row['open'], row['high'], row['low'], row['close'],
+                      row['volume'], closed=True)
+    return engine.frame()
+
+
+def test_streaming_matches_ta():
+    df = synthetic_frame()
+    assert_columns_match(stream(df), ta_reference(df))
+
+
+def test_batch_matches_ta():
+    df = synthetic_frame()
+    columns = compute_indicators(*(df[name].to_numpy()[None, :] for name in ('close', 'high', 'low', 'volume')))
+    assert_columns_match({name: values[0] for name, values in columns.items()}, ta_reference(df))
+
+
+def minute_rows(days: int = 5, seed: int = 11) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    bars = days * 1440
+    base_ms = 60_000
+    open_time = 1_700_006_400_000 + np.arange(bars) * base_ms
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, bars)))
+    return np.column_stack([open_time, close, close * 1.001, close * 0.999, close,
+                            rng.uniform(1, 10, bars), open_time + base_ms - 1])
+
+
+def incremental_bars(rows: np.ndarray, intervals) -> dict:
+    """逐根（含未收盘更新）增量汇总，返回各周期 {开盘时间: K线}"""
+    resampler = IncrementalResampler('1m', intervals)
+    latest = {interval: {} for interval in intervals}
+    for row in rows:
+        resampler.update(int(row[0]), row[1], row[2] * 0.9995, row[3] * 1.0005, row[4] * 1.0001,
+                         row[5] / 2, closed=False)
+        for interval, bar, _ in resampler.update(int(row[0]), *row[1:6], closed=True):
+            latest[interval][bar[0]] = bar
+    return latest
+
+
+@pytest.mark.parametrize('interval', RESAMPLE_INTERVALS)
+def test_resampler_matches_pandas(interval):
+    rows = minute_rows()
+    latest = incremental_bars(rows, [interval])[interval]
+    df = pd.DataFrame(rows[:, 1:6], columns=['open', 'high', 'low', 'close', 'volume'],
+                      index=pd.to_datetime(rows[:, 0], unit='ms'))
+    expected = df.resample(interval.replace('m', 'min').replace('d', 'D'), closed='left', label='left').agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}).dropna().to_numpy()
+
+    incremental = np.array([latest[t][1:] for t in sorted(latest)])
+    vectorized = resample_rows(rows, interval)[:, OPEN:CLOSE_TIME]
+    assert np.allclose(incremental, expected, rtol=0, atol=1e-9)
+    assert np.allclose(vectorized, expected, rtol=0, atol=1e-9)
+
+
+def test_resampled_streaming_matches_ta():
+    """1m汇总为1h后逐根流式计算，与对汇总结果做ta全量计算一致（多周期检测的完整链路）"""
+    rows = minute_rows(days=10)
+    resampler = IncrementalResampler('1m', ['1h'])
+    engine = StreamingIndicators(history=500)
+    for row in rows:
+        for _, bar, closed in resampler.update(int(row[0]), *row[1:6], closed=True):
+            engine.update(*bar, closed=closed)
+
+    hourly = resample_rows(rows, '1h')
+    df = pd.DataFrame(hourly[:, 1:6], columns=['open', 'high', 'low', 'close', 'volume'],
+                      index=pd.to_datetime(hourly[:, 0], unit='ms'))
+    assert_columns_match(engine.frame(), ta_reference(df))
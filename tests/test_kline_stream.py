@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from binance_trend_detector import BinanceTrendDetector  # noqa: E402
+from kline_store import KlineStore, rows_from_api  # noqa: E402
+from kline_stream import KlineStreamClient, LocalKlineStreamServer  # noqa: E402
+from rate_limiter import RequestWeightLimiter  # noqa: E402
+from replay_server import ReplayServer  # noqa: E402
+from signal_state import SignalStateStore  # noqa: E402
+from streaming_indicators import StreamingIndicators  # noqa: E402
+from synthetic_data import to_api_klines  # noqa: E402
+
+HOUR_MS = 3_600_000
+END_MS = 1_700_000_000_000 - 1_700_000_000_000 % HOUR_MS
+SYMBOL = 'BTCUSDT'
+
+
+@pytest.fixture
+def servers():
+    rest = ReplayServer([SYMBOL], bars=300, end_ms=END_MS).start()
+    stream = LocalKlineStreamServer().start()
+    yield rest, stream
+    stream.close()
+    rest.close()
+
+
+def wait_until(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.02)
+
+
+def test_reconnect_backfills_missed_bars_over_rest(servers, tmp_path):
+    """推送连接中途断开，重连后通过REST补齐断线期间错过的K线（start_streaming的推送模式链路）"""
+    rest, stream = servers
+    # 替身服务返回的价格按接口格式保留了有效位数，推送同样使用接口格式
+    api_rows = to_api_klines(rest.rows(SYMBOL))
+    expected = rows_from_api(api_rows)
+
+    detector = BinanceTrendDetector()
+    detector.base_url = rest.url
+    detector.rate_limiter = RequestWeightLimiter(weight_limit=10 ** 9)
+    detector.signal_state = SignalStateStore(path=None)
+    detector.kline_store = KlineStore(str(tmp_path))
+    engine = detector.get_indicator_engine(SYMBOL, '1h')
+
+    client = KlineStreamClient(
+        [SYMBOL], '1h',
+        on_kline=lambda symbol, kline: detector._on_stream_kline(symbol, kline, '1h', False),
+        on_reconnect=lambda symbols: detector._warm_up(symbols, '1h'),
+        base_url=stream.url, reconnect_delay=0.1)
+    client.start()
+    try:
+        wait_until(lambda: stream.connection_count == 1)
+        pushed = api_rows[-100:-50]
+        for row in pushed:
+            stream.push_kline(SYMBOL, '1h', row, closed=True)
+        wait_until(lambda: engine.last_open_time == pushed[-1][0])
+        assert '/api/v3/klines' not in rest.request_counts
+
+        # 断线期间错过了最后50根K线，重连后只能从REST补齐
+        stream.drop_connections()
+        wait_until(lambda: engine.last_open_time == api_rows[-1][0])
+        assert stream.connection_count == 2
+        assert rest.request_counts.get('/api/v3/klines') == 1
+    finally:
+        client.stop()
+        detector.dispatcher.stop()
+
+    stored = np.asarray(detector.kline_store.load(SYMBOL, '1h'))
+    assert np.array_equal(stored, expected[-100:])
+    # 补齐后的流式状态与不断线、连续输入这100根K线的结果一致（没有因断档而重新初始化）
+    reference = StreamingIndicators(rsi_period=detector.rsi_period, ma_short=detector.ma_short,
+                                    ma_long=detector.ma_long, volume_ma_period=detector.volume_ma_period)
+    reference.feed_rows(expected[-100:], last_closed=True)
+    assert engine.latest() == reference.latest()
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from notification_dispatcher import LocalSmtpServer, NotificationDispatcher  # noqa: E402
+
+
+@pytest.fixture
+def smtp_server():
+    server = LocalSmtpServer().start()
+    yield server
+    server.close()
+
+
+def make_dispatcher(server, tmp_path, **kwargs):
+    config = {
+        'email': 'bot@example.com', 'password': '', 'to_email': 'me@example.com',
+        'smtp_server': '127.0.0.1', 'smtp_port': server.port, 'use_tls': False,
+    }
+    kwargs.setdefault('retry_delay', 0.01)
+    return NotificationDispatcher(config, dead_letter_file=str(tmp_path / 'dead_letter.jsonl'), **kwargs)
+
+
+def wait_until(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.01)
+
+
+def test_emails_reuse_one_connection(smtp_server, tmp_path):
+    dispatcher = make_dispatcher(smtp_server, tmp_path)
+    for i in range(20):
+        assert dispatcher.enqueue_email(f"测试 {i}", "消息内容")
+    dispatcher.stop()
+
+    assert len(smtp_server.messages) == 20
+    assert smtp_server.connections == 1
+    assert dispatcher.metrics()['sent'] == 20
+
+
+def test_rejected_email_is_retried(smtp_server, tmp_path):
+    """服务端临时拒收后按退避重试，最终送达且不写死信"""
+    smtp_server.reject_messages = 2
+    dispatcher = make_dispatcher(smtp_server, tmp_path)
+    dispatcher.enqueue_email("重试", "消息内容")
+    wait_until(lambda: dispatcher.metrics()['sent'] == 1)
+    dispatcher.stop()
+
+    metrics = dispatcher.metrics()
+    assert len(smtp_server.messages) == 1
+    assert metrics['retries'] == 2
+    assert metrics['dead_lettered'] == 0
+    assert not (tmp_path / 'dead_letter.jsonl').exists()
+
+
+def test_persistent_failure_ends_in_dead_letter(smtp_server, tmp_path):
+    """超过max_attempts次仍失败的通知写入死信文件，之后的通知照常发送"""
+    smtp_server.reject_messages = 3
+    dispatcher = make_dispatcher(smtp_server, tmp_path, max_attempts=3)
+    dispatcher.enqueue_email("失败", "消息内容")
+    wait_until(lambda: dispatcher.metrics()['dead_lettered'] == 1)
+    dispatcher.enqueue_email("之后", "消息内容")
+    dispatcher.stop()
+
+    with open(tmp_path / 'dead_letter.jsonl', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 1
+    assert records[0]['subject'] == "失败"
+    assert records[0]['attempt'] == 3
+    assert '451' in records[0]['error']
+
+    metrics = dispatcher.metrics()
+    assert metrics['retries'] == 2
+    assert metrics['sent'] == 1
+    assert len(smtp_server.messages) == 1
+
+
+def test_signal_falls_back_to_email_when_wechat_fails(smtp_server, tmp_path):
+    class FailingWechat:
+        def __init__(self):
+            self.calls = 0
+
+        def send_trading_signal(self, symbol, signal_data):
+            self.calls += 1
+            return False
+
+    wechat = FailingWechat()
+    dispatcher = make_dispatcher(smtp_server, tmp_path)
+    dispatcher.wechat_notifier = wechat
+    dispatcher.enqueue_signal('BTCUSDT', {'signal': 'BUY'}, "BTCUSDT 买入", "消息内容")
+    dispatcher.stop()
+
+    assert wechat.calls == 1
+    assert len(smtp_server.messages) == 1
+    assert dispatcher.metrics()['retries'] == 0
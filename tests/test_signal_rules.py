@@ -0,0 +1,51 @@
+import os
+import sys
+import copy
+import json
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from signal_rules import compile_rules, DEFAULT_RULES  # noqa: E402
+
+
+def rule(**changes):
+    spec = dict(DEFAULT_RULES[0])
+    spec.update(changes)
+    return spec
+
+
+def test_rule_name_is_not_executed(capfd):
+    """规则名称来自配置文件，不能进入exec的代码"""
+    compiled = compile_rules([rule(name="rsi\n    __import__('os').system('echo INJECTED')")])
+    compiled.evaluate_last({name: [1.0, 2.0, 3.0] for name in compiled.columns})
+    assert 'INJECTED' not in capfd.readouterr().out
+    assert compile_rules([rule(name="a\nb")]).columns
+
+
+@pytest.mark.parametrize('changes', [
+    {'buy': 5}, {'sell': ['rsi > 70']}, {'name': 5}, {'name': ''},
+    {'buy_text': '{ma}'}, {'sell_text': 7}, {'buy': 'rsi >'}, {'buy': 'unknown_column > 1'},
+])
+def test_invalid_rule_raises_value_error(changes):
+    with pytest.raises(ValueError):
+        compile_rules([rule(**changes)])
+
+
+def test_invalid_rules_keep_current_rules_on_reload():
+    from binance_trend_detector import BinanceTrendDetector
+
+    with open(os.path.join(ROOT, 'trading_config.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['query_api']['enabled'] = False
+    detector = BinanceTrendDetector()
+    detector.apply_config(config)
+    current = detector.signal_rules
+
+    for changes in ({'buy': 5}, {'sell': None, 'buy': ['rsi']}, {'buy_text': '{ma}'}):
+        broken = copy.deepcopy(config)
+        broken['signal_rules']['rules'][0].update(changes)
+        detector.apply_config(broken)
+        assert detector.signal_rules is current
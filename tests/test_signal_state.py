@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from binance_trend_detector import BinanceTrendDetector  # noqa: E402
+from signal_state import SignalStateStore  # noqa: E402
+
+DAY = 86400
+
+
+class RecordingWechat:
+    def __init__(self):
+        self.summaries = []
+
+    def send_daily_summary(self, summary):
+        self.summaries.append(summary)
+        return True
+
+
+def run_once(path: str) -> list:
+    """模拟一次cron单次运行：新进程从状态文件加载，检测结束时flush_notifications"""
+    detector = BinanceTrendDetector()
+    detector.signal_state = SignalStateStore(path)
+    wechat = detector.dispatcher.wechat_notifier = RecordingWechat()
+    detector.signal_state.update('BTCUSDT', '1h', {'signal': 'HOLD', 'strength': 0}, eligible=True)
+    detector.flush_notifications()
+    detector.dispatcher.stop()
+    return wechat.summaries
+
+
+def test_once_runs_send_previous_day_summary(tmp_path):
+    path = str(tmp_path / 'signal_state.json')
+    yesterday = time.time() - DAY
+    store = SignalStateStore(path)
+    store.update('BTCUSDT', '1h', {'signal': 'BUY', 'strength': 5}, eligible=True, now=yesterday)
+    store.save()
+
+    summaries = run_once(path)
+    assert [summary['date'] for summary in summaries] == [datetime.fromtimestamp(yesterday).strftime('%Y-%m-%d')]
+    assert summaries[0]['buy_signals'] == 1
+
+    # 同一天的后续运行不再重复发送
+    assert run_once(path) == []
+
+
+def test_first_run_without_history_sends_nothing(tmp_path):
+    assert run_once(str(tmp_path / 'signal_state.json')) == []
@@ -0,0 +1,151 @@
+import time
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from kline_store import interval_to_ms, ROW_WIDTH, OPEN_TIME, OPEN, HIGH, LOW, CLOSE, VOLUME, CLOSE_TIME
+
+logger = logging.getLogger(__name__)
+
+# 币安的周K线从周一00:00(UTC)开始，1970-01-01是周四
+WEEK_OFFSET_MS = 4 * 86_400_000
+
+Bar = Tuple[int, float, float, float, float, float]
+
+
+def bucket_start(open_time, interval: str):
+    """基础K线所属的大周期K线开盘时间（标量或数组）"""
+    step = interval_to_ms(interval)
+    offset = WEEK_OFFSET_MS if interval == '1w' else 0
+    return (open_time - offset) // step * step + offset
+
+
+def resample_rows(rows: np.ndarray, interval: str) -> np.ndarray:
+    """把按开盘时间排序的基础K线（KlineStore行格式）向量化汇总为更大周期，最后一根可能尚未走完"""
+    if len(rows) == 0:
+        return np.empty((0, ROW_WIDTH))
+
+    rows = np.asarray(rows)
+    buckets = bucket_start(rows[:, OPEN_TIME].astype(np.int64), interval)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(rows)] - 1
+
+    out = np.empty((len(starts), ROW_WIDTH))
+    out[:, OPEN_TIME] = buckets[starts]
+    out[:, OPEN] = rows[starts, OPEN]
+    out[:, HIGH] = np.maximum.reduceat(rows[:, HIGH], starts)
+    out[:, LOW] = np.minimum.reduceat(rows[:, LOW], starts)
+    out[:, CLOSE] = rows[ends, CLOSE]
+    out[:, VOLUME] = np.add.reduceat(rows[:, VOLUME], starts)
+    out[:, CLOSE_TIME] = out[:, OPEN_TIME] + interval_to_ms(interval) - 1
+    return out
+
+
+class _Bucket:
+    """一个大周期K线的汇总状态：committed只包含已收盘的基础K线"""
+
+    __slots__ = ('interval', 'step', 'start', 'committed')
+
+    def __init__(self, interval: str):
+        self.interval = interval
+        self.step = interval_to_ms(interval)
+        self.start = None
+        self.committed: Optional[list] = None
+
+    def merged(self, bar: Bar) -> Bar:
+        if self.committed is None:
+            return (self.start, bar[1], bar[2], bar[3], bar[4], bar[5])
+        open_, high, low, _, volume = self.committed
+        return (self.start, open_, max(high, bar[2]), min(low, bar[3]), bar[4], volume + bar[5])
+
+
+class IncrementalResampler:
+    """把一个交易对的基础周期K线逐根汇总为多个大周期K线
+
+    update()返回受影响的(周期, K线, 是否收盘)事件，可直接交给StreamingIndicators.update：
+    未收盘的大周期K线以同一开盘时间反复更新，最后一根基础K线收盘时该周期K线随之收盘。
+    """
+
+    def __init__(self, base_interval: str, intervals: Sequence[str]):
+        self.base_interval = base_interval
+        self.base_ms = interval_to_ms(base_interval)
+        for interval in intervals:
+            if interval_to_ms(interval) % self.base_ms:
+                raise ValueError(f"{interval} 不是基础周期 {base_interval} 的整数倍")
+        self.intervals = list(intervals)
+        self._buckets = {interval: _Bucket(interval) for interval in self.intervals}
+        self._pending: Optional[Bar] = None
+        self.last_open_time: Optional[int] = None
+
+    @property
+    def last_closed(self) -> bool:
+        """最近一根输入的基础K线是否已收盘（已收盘的K线再次输入会被重复汇总）"""
+        return self.last_open_time is not None and self._pending is None
+
+    def update(self, open_time: int, open_: float, high: float, low: float, close: float,
+               volume: float, closed: bool = True) -> List[Tuple[str, Bar, bool]]:
+        events = []
+        if self._pending is not None and self._pending[0] != open_time:
+            # 未收到收盘推送就出现了下一根基础K线，按最后一次的数据确认
+            events.extend(self._apply(self._pending, closed=True))
+        self._pending = None if closed else (open_time, open_, high, low, close, volume)
+        events.extend(self._apply((open_time, open_, high, low, close, volume), closed))
+        self.last_open_time = open_time
+        return events
+
+    def _apply(self, bar: Bar, closed: bool) -> List[Tuple[str, Bar, bool]]:
+        events = []
+        for interval, bucket in self._buckets.items():
+            start = bucket_start(bar[0], interval)
+            if bucket.start is not None and start != bucket.start and bucket.committed is not None:
+                # 上一个周期缺了最后几根基础K线（交易暂停等），在新周期开始时收盘
+                events.append((interval, (bucket.start, *bucket.committed), True))
+                bucket.committed = None
+            if start != bucket.start:
+                bucket.start = start
+                bucket.committed = None
+
+            merged = bucket.merged(bar)
+            complete = closed and bar[0] + self.base_ms >= start + bucket.step
+            events.append((interval, merged, complete))
+
+            if complete:
+                bucket.start = None
+                bucket.committed = None
+            elif closed:
+                bucket.committed = list(merged[1:])
+        return events
+
+    def seed(self, rows: np.ndarray, now_ms: float = None) -> List[Tuple[str, Bar, bool]]:
+        """用已有的基础K线恢复当前各周期未走完的部分，只回放最大周期当前这一根所需的K线"""
+        if len(rows) == 0:
+            return []
+        now_ms = time.time() * 1000 if now_ms is None else now_ms
+        largest = max(self.intervals, key=interval_to_ms)
+        first = bucket_start(int(rows[-1, OPEN_TIME]), largest)
+        events = []
+        for row in rows[np.searchsorted(rows[:, OPEN_TIME], first):]:
+            events.extend(self.update(int(row[OPEN_TIME]), float(row[OPEN]), float(row[HIGH]),
+                                      float(row[LOW]), float(row[CLOSE]), float(row[VOLUME]),
+                                      closed=row[OPEN_TIME] + self.base_ms <= now_ms))
+        self.last_open_time = int(rows[-1, OPEN_TIME])
+        return events
+
+
+# 演示：1分钟K线汇总为多个周期（与pandas resample的一致性见tests/test_indicator_parity.py）
+if __name__ == "__main__":
+    rng = np.random.default_rng(11)
+    open_time = 1_700_006_400_000 + np.arange(3 * 1440) * 60_000
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, len(open_time))))
+    rows = np.column_stack([open_time, close, close * 1.001, close * 0.999, close,
+                            rng.uniform(1, 10, len(open_time)), open_time + 59_999])
+
+    resampler = IncrementalResampler('1m', ['15m', '1h', '4h'])
+    started = time.perf_counter()
+    closed = {}
+    for row in rows:
+        for interval, bar, complete in resampler.update(int(row[0]), *row[1:6], closed=True):
+            closed[interval] = closed.get(interval, 0) + complete
+    print(f"逐根汇总: {(time.perf_counter() - started) / len(rows) * 1e6:.1f} µs/根, 收盘K线数: {closed}")
+    print(resample_rows(rows, '4h')[-2:])
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from metrics import REGISTRY
+
+try:
+    import fcntl
+except ImportError:
+    # Windows没有fcntl：只能保证进程内只刷新一次，多个进程之间仍然共享缓存文件
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_LOOKUPS = REGISTRY.counter('wechat_token_cache_total', "access_token缓存的查询结果", ['result'])
+
+# 令牌已失效或不正确，需要丢弃缓存重新获取
+INVALID_TOKEN_ERRCODES = (40001, 40014, 42001)
+
+# fetch返回(令牌, 有效秒数)，失败时返回None
+Fetcher = Callable[[], Optional[Tuple[str, float]]]
+
+
+def token_key(*parts) -> str:
+    """缓存键：由接口地址、corp_id和corp_secret计算摘要，缓存文件中不保存密钥"""
+    return hashlib.sha256("|".join(str(part) for part in parts).encode('utf-8')).hexdigest()[:16]
+
+
+class TokenCache:
+    """多进程共享的access_token缓存
+
+    令牌保存在JSON文件中（权限0600），同一台机器上的定时任务、分片工作进程和每日总结都先读文件，
+    只有令牌快过期时才调用gettoken。刷新时进程内用线程锁、进程之间用文件锁（fcntl.flock）保证只有
+    一个调用方请求接口，其余调用方等待后直接读取新令牌。
+
+    距离过期不足refresh_margin秒时提前刷新：抢到锁的调用方去刷新，其余调用方不等待，继续使用
+    尚未过期的旧令牌。令牌按expires_in提前expiry_margin秒视为过期。
+    """
+
+    def __init__(self, path: Optional[str] = 'wechat_token_cache.json', refresh_margin: float = 300,
+                 expiry_margin: float = 60):
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self.expiry_margin = expiry_margin
+        self._memory: Dict[str, Dict] = {}
+        self._refresh_lock = threading.Lock()
+
+    def _fresh(self, entry: Optional[Dict], now: float) -> bool:
+        return entry is not None and now < entry['expires_at'] - self.refresh_margin
+
+    @staticmethod
+    def _usable(entry: Optional[Dict], now: float) -> bool:
+        return entry is not None and now < entry['expires_at']
+
+    def get(self, key: str, fetch: Fetcher) -> Optional[str]:
+        """返回有效的令牌，必要时调用fetch刷新；刷新失败且没有未过期的旧令牌时返回None"""
+        now = time.time()
+        entry = self._memory.get(key)
+        if self._fresh(entry, now):
+            TOKEN_LOOKUPS.inc(result='hit')
+            return entry['access_token']
+
+        # 旧令牌仍可用时不排队：其他线程正在刷新就直接用旧令牌
+        stale = entry if self._usable(entry, now) else None
+        if not self._refresh_lock.acquire(blocking=stale is None):
+            TOKEN_LOOKUPS.inc(result='stale')
+            return stale['access_token']
+        try:
+            return self._refresh(key, fetch)
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self, key: str, fetch: Fetcher) -> Optional[str]:
+        now = time.time()
+        entry = self._adopt(key)
+        if self._fresh(entry, now):
+            TOKEN_LOOKUPS.inc(result='shared')
+            return entry['access_token']
+
+        stale = entry if self._usable(entry, now) else None
+        with self._file_lock(blocking=stale is None) as locked:
+            if not locked:
+                # 另一个进程正在提前刷新
+                TOKEN_LOOKUPS.inc(result='stale')
+                return stale['access_token']
+            # 等锁期间其他进程可能已经刷新
+            entry = self._adopt(key)
+            if self._fresh(entry, time.time()):
+                TOKEN_LOOKUPS.inc(result='shared')
+                return entry['access_token']
+
+            result = fetch()
+            if result is None:
+                TOKEN_LOOKUPS.inc(result='error')
+                return stale['access_token'] if self._usable(stale, time.time()) else None
+            token, expires_in = result
+            now = time.time()
+            entry = {'access_token': token, 'fetched_at': now,
+                     'expires_at': now + float(expires_in) - self.expiry_margin}
+            self._memory[key] = entry
+            self._save(key, entry)
+            TOKEN_LOOKUPS.inc(result='refresh')
+            return token
+
+    def invalidate(self, key: str, token: str):
+        """接口返回令牌失效时调用；只删除与token相同的缓存，避免误删其他调用方刚刷新的新令牌"""
+        removed = False
+        with self._refresh_lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry['access_token'] == token:
+                del self._memory[key]
+            with self._file_lock(blocking=True):
+                shared = self._read_file()
+                if shared.get(key, {}).get('access_token') == token:
+                    del shared[key]
+                    self._write_file(shared)
+                    removed = True
+        TOKEN_LOOKUPS.inc(result='invalidated')
+        if removed:
+            logger.warning("access_token已失效，已从缓存中删除")
+
+    def _adopt(self, key: str) -> Optional[Dict]:
+        """读取缓存文件，文件中的令牌比内存中的新时采用文件中的"""
+        entry = self._memory.get(key)
+        shared = self._read_file().get(key)
+        if shared and (entry is None or shared['expires_at'] > entry['expires_at']):
+            self._memory[key] = entry = shared
+        return entry
+
+    @contextmanager
+    def _file_lock(self, blocking: bool):
+        if not self.path or fcntl is None:
+            yield True
+            return
+        try:
+            handle = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            logger.error(f"无法打开令牌锁文件: {e}")
+            yield True
+            return
+        try:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            os.close(handle)
+
+    def _read_file(self) -> Dict[str, Dict]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"读取令牌缓存失败: {e}")
+            return {}
+
+    def _save(self, key: str, entry: Dict):
+        if not self.path:
+            return
+        shared = self._read_file()
+        now = time.time()
+        # 顺便清理已过期的令牌（如更换过corp_secret）
+        shared = {name: value for name, value in shared.items() if value.get('expires_at', 0) > now}
+        shared[key] = entry
+        self._write_file(shared)
+
+    def _write_file(self, data: Dict[str, Dict]):
+        """写临时文件再替换（调用方持有文件锁），读取方不会看到写了一半的内容"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            handle = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(handle, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"保存令牌缓存失败: {e}")
+
+
+_caches: Dict[Tuple[Optional[str], float], TokenCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_token_cache(path: Optional[str] = 'wechat_token_cache.json', refresh_margin: float = 300) -> TokenCache:
+    """获取进程内共享的令牌缓存（配置热加载重建通知器后仍复用同一个缓存），path为None时只缓存在内存中"""
+    with _caches_lock:
+        cache = _caches.get((path, refresh_margin))
+        if cache is None:
+            cache = _caches[(path, refresh_margin)] = TokenCache(path, refresh_margin)
+        return cache
+
+
+def _demo_worker(args):
+    path, counter_path, threads = args
+    cache = TokenCache(path)
+
+    def fetch():
+        # 模拟gettoken：每次调用在计数文件中追加一行
+        time.sleep(0.2)
+        with open(counter_path, 'a') as f:
+            f.write(f"{os.getpid()}\n")
+        return f"token-{os.getpid()}", 7200
+
+    workers = [threading.Thread(target=cache.get, args=('demo', fetch)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return cache.get('demo', fetch)
+
+
+# 演示：8个进程各8个线程同时取令牌，只调用一次gettoken；令牌失效后同样只刷新一次
+if __name__ == "__main__":
+    import tempfile
+    from multiprocessing import Pool
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'wechat_token_cache.json')
+        counter_path = os.path.join(directory, 'gettoken_calls')
+
+        def calls() -> int:
+            with open(counter_path) as f:
+                return len(f.readlines())
+
+        with Pool(8) as pool:
+            tokens = pool.map(_demo_worker, [(path, counter_path, 8)] * 8)
+        print(f"64个调用方拿到的令牌: {sorted(set(tokens))}，gettoken调用 {calls()} 次")
+
+        TokenCache(path).invalidate('demo', tokens[0])
+        with Pool(8) as pool:
+            tokens = pool.map(_demo_worker, [(path, counter_path, 8)] * 8)
+        print(f"失效后重新获取: {sorted(set(tokens))}，gettoken累计调用 {calls()} 次")
+
+        cache = TokenCache(path)
+        cache.get('demo', lambda: None)
+        started = time.perf_counter()
+        for _ in range(100000):
+            cache.get('demo', lambda: None)
+        print(f"命中内存缓存: {(time.perf_counter() - started) / 100000 * 1e6:.2f} µs/次")
@@ -1,39 +1,48 @@
-import requests
 import json
-import time
 from datetime import datetime
+from typing import Optional, Tuple
 import logging
+from http_transport import HttpTransport, get_transport
+from metrics import timed_call, WECHAT_ERRORS
+from token_cache import get_token_cache, token_key, INVALID_TOKEN_ERRCODES
 
 logger = logging.getLogger(__name__)
 
+WECHAT_API_BASE = "https://qyapi.weixin.qq.com"
+
 class WeChatNotifier:
     """微信通知类 - 支持企业微信和Server酱"""
     
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, transport: HttpTransport = None):
         self.config = config
-        self.access_token = None
-        self.token_expires_at = 0
+        self.transport = transport or get_transport()
+        # 可在配置中指向本地替身服务（基准测试/调试用）
+        self.api_base = config.get('api_base', WECHAT_API_BASE).rstrip('/')
+        # 令牌缓存在进程之间共享（文件+文件锁），token_cache_file设为null时只缓存在本进程内存中
+        self.token_cache = get_token_cache(config.get('token_cache_file', 'wechat_token_cache.json'),
+                                           config.get('token_refresh_margin', 300))
+        self._token_key = token_key(self.api_base, config.get('corp_id'), config.get('corp_secret'))
     
     def get_access_token(self) -> str:
-        """获取企业微信访问令牌"""
-        if self.access_token and time.time() < self.token_expires_at:
-            return self.access_token
-        
+        """获取企业微信访问令牌（先查共享缓存，快过期时只由一个调用方刷新）"""
+        return self.token_cache.get(self._token_key, self._fetch_access_token)
+    
+    def _fetch_access_token(self) -> Optional[Tuple[str, float]]:
         try:
-            url = "https://qyapi.weixin.qq.com/cgi-bin/gettoken"
+            url = f"{self.api_base}/cgi-bin/gettoken"
             params = {
                 'corpid': self.config.get('corp_id'),
                 'corpsecret': self.config.get('corp_secret')
             }
             
-            response = requests.get(url, params=params)
-            data = response.json()
+            with timed_call('gettoken'):
+                response = self.transport.get(url, params=params)
+                data = response.json()
             
             if data.get('errcode') == 0:
-                self.access_token = data['access_token']
-                self.token_expires_at = time.time() + data['expires_in'] - 60
-                return self.access_token
+                return data['access_token'], data['expires_in']
             else:
+                WECHAT_ERRORS.inc(call='gettoken')
                 logger.error(f"获取access_token失败: {data}")
                 return None
                 
@@ -44,12 +53,6 @@ class WeChatNotifier:
     def send_wechat_work_message(self, title: str, content: str) -> bool:
         """发送企业微信消息"""
         try:
-            access_token = self.get_access_token()
-            if not access_token:
-                return False
-            
-            url = f"https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={access_token}"
-            
             message_data = {
                 "touser": self.config.get('to_user', '@all'),
                 "msgtype": "text",
@@ -60,13 +63,25 @@ class WeChatNotifier:
                 "safe": 0
             }
             
-            response = requests.post(url, json=message_data)
-            result = response.json()
-            
-            if result.get('errcode') == 0:
-                logger.info("企业微信消息发送成功")
-                return True
-            else:
+            # 令牌被提前作废（如其他系统重置了secret）时，删除缓存后用新令牌重试一次
+            for attempt in range(2):
+                access_token = self.get_access_token()
+                if not access_token:
+                    return False
+                
+                url = f"{self.api_base}/cgi-bin/message/send?access_token={access_token}"
+                with timed_call('message_send'):
+                    response = self.transport.post(url, json=message_data)
+                    result = response.json()
+                
+                if result.get('errcode') == 0:
+                    logger.info("企业微信消息发送成功")
+                    return True
+                if result.get('errcode') in INVALID_TOKEN_ERRCODES and attempt == 0:
+                    logger.warning(f"access_token无效({result.get('errcode')})，刷新后重试")
+                    self.token_cache.invalidate(self._token_key, access_token)
+                    continue
+                WECHAT_ERRORS.inc(call='message_send')
                 logger.error(f"企业微信消息发送失败: {result}")
                 return False
                 
@@ -84,13 +99,15 @@ class WeChatNotifier:
                 'desp': content
             }
             
-            response = requests.post(url, data=data)
-            result = response.json()
+            with timed_call('server_chan'):
+                response = self.transport.post(url, data=data)
+                result = response.json()
             
             if result.get('code') == 0:
                 logger.info("Server酱消息发送成功")
                 return True
             else:
+                WECHAT_ERRORS.inc(call='server_chan')
                 logger.error(f"Server酱消息发送失败: {result}")
                 return False
                 
@@ -98,6 +115,21 @@ class WeChatNotifier:
             logger.error(f"Server酱消息发送异常: {e}")
             return False
     
+    def send_message(self, title: str, content: str) -> bool:
+        """优先企业微信，失败时尝试Server酱"""
+        success = False
+        
+        # 尝试企业微信
+        if self.config.get('corp_id'):
+            success = self.send_wechat_work_message(title, content)
+        
+        # 如果企业微信失败，尝试Server酱
+        if not success and self.config.get('server_chan_key'):
+            success = self.send_server_chan_message(title, content, 
+                                                  self.config['server_chan_key'])
+        
+        return success
+    
     def send_trading_signal(self, symbol: str, signal_data: dict) -> bool:
         """发送交易信号通知"""
         signal = signal_data['signal']
@@ -135,18 +167,25 @@ class WeChatNotifier:
             content += "\n\n💡 **建议**: 考虑减仓或止盈，注意趋势变化"
         
         # 发送通知
-        success = False
+        return self.send_message(title, content)
+    
+    def send_signal_digest(self, signals: list) -> bool:
+        """把同一轮检测出的多个信号合并成一条消息发送，signals为(symbol, signal_data)列表"""
+        buy_count = sum(1 for _, data in signals if data['signal'] == 'BUY')
+        sell_count = len(signals) - buy_count
+        title = f"📊 本轮交易信号: 买入 {buy_count} 个, 卖出 {sell_count} 个"
         
-        # 尝试企业微信
-        if self.config.get('corp_id'):
-            success = self.send_wechat_work_message(title, content)
+        content = ""
+        for symbol, data in signals:
+            action_emoji = "🟢" if data['signal'] == 'BUY' else "🔴"
+            action_text = "买入" if data['signal'] == 'BUY' else "卖出"
+            content += (f"\n{action_emoji} **{symbol}** {action_text} | 价格 ${data['price']:.6f} | "
+                        f"强度 {data['strength']}/10 | RSI {data.get('rsi', 0):.2f}\n")
+            content += f"   {'；'.join(data['reasons'])}\n"
         
-        # 如果企业微信失败，尝试Server酱
-        if not success and self.config.get('server_chan_key'):
-            success = self.send_server_chan_message(title, content, 
-                                                  self.config['server_chan_key'])
+        content += f"\n⏰ **时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         
-        return success
+        return self.send_message(title, content)
     
     def send_daily_summary(self, summary_data: dict) -> bool:
         """发送每日总结"""
@@ -154,7 +193,7 @@ class WeChatNotifier:
             title = "📊 每日交易信号总结"
             
             content = f"""
-📅 **日期**: {datetime.now().strftime('%Y-%m-%d')}
+📅 **日期**: {summary_data.get('date') or datetime.now().strftime('%Y-%m-%d')}
 
 📈 **今日信号统计**:
 • 买入信号: {summary_data.get('buy_signals', 0)} 个